@@ -0,0 +1,75 @@
+"""Micro-benchmark de la sérialisation des listes d'utilisateurs
+
+Compare l'ancien chemin (objets ORM User + to_dict() + json standard) au
+chemin rapide (requête projetée, tuples -> JSON via orjson) à 1k, 10k et 100k
+lignes, et vérifie que les deux produisent les mêmes octets.
+
+Usage (depuis backend-app/) : python -m benchmarks.bench_json --rows 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import time
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import insert, select
+
+
+def _best_of(repeat, func):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+    from src.json_provider import rows_response
+    from src.main import create_app
+    from src.models.user import User, db
+    from src.routes.user import USER_FIELDS
+
+    app = create_app()
+    stdlib = DefaultJSONProvider(app)
+    results = []
+    with app.app_context():
+        db.create_all()
+        for rows in args.rows:
+            db.session.execute(User.__table__.delete())
+            db.session.execute(insert(User), [
+                {'username': f'user{i}', 'email': f'user{i}@example.com'} for i in range(rows)
+            ])
+            db.session.commit()
+
+            def orm_path():
+                db.session.expunge_all()
+                users = db.session.query(User).order_by(User.id).all()
+                return stdlib.response([user.to_dict() for user in users]).data
+
+            def fast_path():
+                result = db.session.execute(select(User.id, User.username, User.email).order_by(User.id))
+                return rows_response(result.all(), USER_FIELDS).data
+
+            orm_time, orm_body = _best_of(args.repeat, orm_path)
+            fast_time, fast_body = _best_of(args.repeat, fast_path)
+            assert orm_body == fast_body, 'outputs differ'
+            results.append({
+                'rows': rows,
+                'orm_to_dict_ms': round(orm_time * 1000, 1),
+                'projected_orjson_ms': round(fast_time * 1000, 1),
+                'speedup': round(orm_time / fast_time, 2),
+            })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Surcoût de l'instrumentation SQL (src/sql_metrics.py)
+
+Mesure, instrumentation activée puis désactivée (SQL_INSTRUMENTATION) :
+- par requête SQL : boucle de SELECT par clé primaire sur le moteur ;
+- par requête HTTP : GET /api/users?limit=10 via le client de test Flask.
+
+Usage (depuis backend-app/) : python -m benchmarks.bench_sql_instrumentation --queries 20000 --requests 3000
+"""
+import argparse
+import json
+import os
+import time
+
+from sqlalchemy import insert, text
+
+
+def _best_of(repeat, func):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _measure(enabled, args):
+    os.environ['SQL_INSTRUMENTATION'] = '1' if enabled else '0'
+    from src.main import create_app
+    from src.models.user import User, db
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(User), [
+            {'username': f'user{i}', 'email': f'user{i}@example.com'} for i in range(100)
+        ])
+        db.session.commit()
+
+        def query_loop():
+            with db.engine.connect() as conn:
+                for i in range(args.queries):
+                    conn.execute(text('SELECT username FROM users WHERE id = :id'), {'id': i % 100 + 1}).all()
+
+        client = app.test_client()
+
+        def request_loop():
+            for _ in range(args.requests):
+                client.get('/api/users?limit=10')
+
+        per_query = _best_of(args.repeat, query_loop) / args.queries
+        per_request = _best_of(args.repeat, request_loop) / args.requests
+        db.drop_all()
+    return per_query, per_request
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--queries', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+    off_query, off_request = _measure(False, args)
+    on_query, on_request = _measure(True, args)
+    print(json.dumps({
+        'per_query_us': {'off': round(off_query * 1e6, 2), 'on': round(on_query * 1e6, 2),
+                         'overhead': round((on_query - off_query) * 1e6, 2)},
+        'per_request_us': {'off': round(off_request * 1e6, 1), 'on': round(on_request * 1e6, 1),
+                           'overhead': round((on_request - off_request) * 1e6, 1)},
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,365 @@
+"""Banc de charge de l'API utilisateurs : latences p50/p95/p99, débit, erreurs
+
+Modes :
+- inprocess-wsgi : l'application Flask appelée directement (interface WSGI) ;
+- inprocess-asgi : l'application Starlette appelée directement (interface ASGI) ;
+- wsgi / asgi    : gunicorn / uvicorn démarrés localement, requêtes sur de vrais sockets ;
+- external       : serveur déjà lancé (--target), lectures seules ou --path.
+
+Le mélange de requêtes (--mix list=60,get=25,create=5,update=5,delete=5) est
+tiré au hasard avec une graine fixe ; la base (SQLite temporaire, ou
+BENCH_DATABASE_URL pour un PostgreSQL local dédié : elle est vidée) est remplie avec
+--users lignes. Le rapport JSON peut être comparé à une référence : le code de
+sortie vaut 1 en cas d'erreurs ou de régression au-delà de --max-regression.
+La référence doit avoir été mesurée avec la même charge (base, --users,
+--requests, --mix) sur la même classe de machine (nombre de CPU,
+architecture) : sinon la comparaison échoue au lieu de comparer des chiffres
+sans rapport. benchmarks/baseline.json est une mesure d'exemple (1 CPU) ;
+chaque machine enregistre la sienne (baseline-local.json, non versionnée).
+
+Usage (depuis backend-app/) :
+    python -m benchmarks.loadtest --mode inprocess-wsgi wsgi --concurrency 1 16 --requests 2000
+    python -m benchmarks.loadtest --save-baseline benchmarks/baseline-local.json
+    python -m benchmarks.loadtest --baseline benchmarks/baseline-local.json --max-regression 0.5
+    python -m benchmarks.loadtest --mode external --target http://localhost:5000 --path /health
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from sqlalchemy import create_engine, text
+
+from benchmarks.bench_asgi_vs_wsgi import _free_port, seed, start_server
+
+MODES = ('inprocess-wsgi', 'inprocess-asgi', 'wsgi', 'asgi', 'external')
+OPERATIONS = ('list', 'get', 'create', 'update', 'delete')
+READ_ONLY = ('list', 'get')
+DEFAULT_MIX = 'list=60,get=25,create=5,update=5,delete=5'
+EXPECTED_STATUS = {'list': 200, 'get': 200, 'create': 201, 'update': 200, 'delete': 204, 'path': 200}
+
+
+def parse_mix(value):
+    """'list=60,get=40' -> {'list': 60.0, 'get': 40.0}"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f'unknown operation: {name}')
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError('mix has no positive weight')
+    return mix
+
+
+def percentile(sorted_values, p):
+    """Percentile au rang le plus proche, en millisecondes"""
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(p * len(sorted_values)) - 1)
+    return round(sorted_values[index] * 1000, 2)
+
+
+def summarize(samples):
+    latencies = sorted(latency for _, latency, _ in samples)
+    return {
+        'count': len(samples),
+        'errors': sum(1 for _, _, ok in samples if not ok),
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else None,
+    }
+
+
+def prepare_database(database_url, rows):
+    """Recrée le schéma avec `rows` utilisateurs ; SQLite passe en WAL
+
+    Le mode WAL est persistant dans le fichier : les lecteurs ne sont plus
+    bloqués par les écritures concurrentes, comme avec le MVCC de PostgreSQL.
+    """
+    seed(database_url, rows)
+    if database_url.startswith('sqlite'):
+        engine = create_engine(database_url)
+        with engine.connect() as conn:
+            conn.execute(text('PRAGMA journal_mode=WAL'))
+        engine.dispose()
+
+
+class Workload:
+    """Tire les opérations du mélange et fournit (méthode, chemin, corps)
+
+    Les ids 1..users servent aux lectures et mises à jour ; les suppressions
+    consomment une réserve d'ids seedés au-delà, puis les utilisateurs créés.
+    """
+
+    def __init__(self, mix, users, reserved, seed_value=42, path=None):
+        self.random = random.Random(seed_value)
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.users = users
+        self.path = path
+        self.deletable = deque(range(users + 1, users + reserved + 1))
+        self.counter = itertools.count()
+        self.run_id = f'{os.getpid()}-{int(time.time())}'
+        self.lock = threading.Lock()
+
+    def next(self):
+        if self.path:
+            return 'path', 'GET', self.path, None
+        with self.lock:
+            operation = self.random.choices(self.names, self.weights)[0]
+            user_id = self.random.randint(1, self.users)
+            n = next(self.counter)
+            if operation == 'delete':
+                if not self.deletable:
+                    operation = 'get'
+                else:
+                    user_id = self.deletable.popleft()
+        if operation == 'list':
+            return operation, 'GET', '/api/users?limit=20', None
+        if operation == 'get':
+            return operation, 'GET', f'/api/users/{user_id}', None
+        if operation == 'create':
+            name = f'load-{self.run_id}-{n}'
+            return operation, 'POST', '/api/users', {'username': name, 'email': f'{name}@example.com'}
+        if operation == 'update':
+            return operation, 'PUT', f'/api/users/{user_id}', {'username': f'upd-{self.run_id}-{n}'}
+        return operation, 'DELETE', f'/api/users/{user_id}', None
+
+    def created(self, operation, response):
+        if operation == 'create' and response.status_code == 201:
+            with self.lock:
+                self.deletable.append(response.json()['id'])
+
+
+class Target:
+    """Envoie une requête et renvoie la réponse httpx (async dans tous les modes)"""
+
+    def __init__(self, mode, args, database_url):
+        self.mode = mode
+        self.process = None
+        self.executor = None
+        if mode == 'inprocess-wsgi':
+            os.environ['DATABASE_URL'] = database_url
+            from src.main import create_app
+            app = create_app()
+            self.local = threading.local()
+            self.transport = httpx.WSGITransport(app=app)
+        elif mode == 'inprocess-asgi':
+            from src.asgi import create_asgi_app
+            self.asgi_app = create_asgi_app(database_url)
+            self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=self.asgi_app), base_url='http://bench')
+        else:
+            if mode == 'external':
+                base_url = args.target
+            else:
+                port = _free_port()
+                self.process = start_server(mode, port, database_url, args.workers, args.threads)
+                base_url = f'http://127.0.0.1:{port}'
+            limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+            self.client = httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30)
+
+    def _wsgi_request(self, method, path, body):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = httpx.Client(transport=self.transport, base_url='http://bench')
+        return client.request(method, path, json=body)
+
+    async def request(self, method, path, body):
+        if self.mode == 'inprocess-wsgi':
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self._wsgi_request, method, path, body)
+        return await self.client.request(method, path, json=body)
+
+    async def aclose(self):
+        if self.mode == 'inprocess-asgi':
+            await self.asgi_app.state.engine.dispose()
+        if self.mode != 'inprocess-wsgi':
+            await self.client.aclose()
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait(timeout=30)
+
+
+async def run_level(target, workload, concurrency, requests):
+    """Une passe de `requests` requêtes à `concurrency` requêtes simultanées"""
+    samples = []
+    remaining = iter(range(requests))
+    target.executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    async def worker():
+        for _ in remaining:
+            operation, method, path, body = workload.next()
+            start = time.perf_counter()
+            try:
+                response = await target.request(method, path, body)
+                ok = response.status_code == EXPECTED_STATUS[operation]
+            except httpx.HTTPError:
+                response, ok = None, False
+            samples.append((operation, time.perf_counter() - start, ok))
+            if response is not None:
+                workload.created(operation, response)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    target.executor.shutdown()
+
+    result = {'concurrency': concurrency, 'duration_s': round(elapsed, 3),
+              'throughput_rps': round(len(samples) / elapsed, 1)}
+    result.update(summarize(samples))
+    result['operations'] = {
+        name: summarize([sample for sample in samples if sample[0] == name])
+        for name in sorted({sample[0] for sample in samples})
+    }
+    return result
+
+
+GATES = ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps')
+
+
+# Champs du rapport qui doivent être identiques dans la référence
+WORKLOAD = ('database', 'users', 'requests', 'mix', 'runner')
+
+
+def runner_info():
+    """Classe de la machine qui mesure : les chiffres ne se comparent qu'entre machines semblables"""
+    return {'cpus': os.cpu_count(), 'machine': platform.machine()}
+
+
+def compare(report, baseline, max_regression, gates=('p95_ms', 'p99_ms', 'throughput_rps')):
+    """Liste des régressions de `report` par rapport à `baseline` (même mode et concurrence)
+
+    Avec une référence, une charge ou une machine différente, ou un mode / une
+    concurrence absents de la référence, sont signalés comme des problèmes.
+    """
+    problems = []
+    if baseline:
+        problems.extend(
+            f'baseline mismatch: {field} {report.get(field)!r} != baseline {baseline.get(field)!r}'
+            for field in WORKLOAD if report.get(field) != baseline.get(field)
+        )
+    reference = {
+        (run['mode'], level['concurrency']): level
+        for run in baseline.get('runs', []) for level in run['levels']
+    }
+    for run in report['runs']:
+        for level in run['levels']:
+            key = f"{run['mode']} c={level['concurrency']}"
+            if level['errors']:
+                problems.append(f"{key}: {level['errors']} errors")
+            previous = reference.get((run['mode'], level['concurrency']))
+            if previous is None:
+                if baseline:
+                    problems.append(f'{key}: missing from baseline')
+                continue
+            for metric in gates:
+                if metric != 'throughput_rps' and level[metric] > previous[metric] * (1 + max_regression):
+                    problems.append(f'{key}: {metric} {level[metric]} > baseline {previous[metric]}')
+            if 'throughput_rps' in gates and \
+                    level['throughput_rps'] < previous['throughput_rps'] * (1 - max_regression):
+                problems.append(
+                    f"{key}: throughput {level['throughput_rps']} < baseline {previous['throughput_rps']}"
+                )
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=MODES, nargs='+', default=['inprocess-wsgi', 'inprocess-asgi'])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16])
+    parser.add_argument('--requests', type=int, default=2000, help='requêtes par niveau de concurrence')
+    parser.add_argument('--users', type=int, default=10000,
+                        help='taille du jeu de données (mode external : ids 1..users existants)')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=2, help='processus serveur (modes wsgi/asgi)')
+    parser.add_argument('--threads', type=int, default=4, help='threads par worker gunicorn')
+    parser.add_argument('--database-url', default=os.environ.get('BENCH_DATABASE_URL'))
+    parser.add_argument('--target', help='URL du serveur (mode external)')
+    parser.add_argument('--path', help='GET sur ce chemin au lieu du mélange')
+    parser.add_argument('--output', help='fichier du rapport JSON (stdout sinon)')
+    parser.add_argument('--baseline', help='rapport de référence à comparer')
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help='dégradation tolérée des p95/p99 et du débit (0.25 = 25 %%)')
+    parser.add_argument('--gate', choices=GATES, nargs='+', default=['p95_ms', 'p99_ms', 'throughput_rps'],
+                        help='métriques comparées à la référence')
+    parser.add_argument('--save-baseline', help='enregistre aussi le rapport comme référence')
+    args = parser.parse_args(argv)
+
+    if 'external' in args.mode:
+        if not args.target:
+            parser.error('--mode external requires --target')
+        if not args.path and set(args.mix) - set(READ_ONLY):
+            parser.error('--mode external only supports read operations (list, get) or --path')
+
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    # Comme start_server : cache désactivé, chaque lecture va jusqu'à la base
+    os.environ['USER_CACHE_TTL'] = '0'
+    database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'loadtest.db')
+    deletes = args.mix.get('delete', 0) / sum(args.mix.values())
+    reserved = math.ceil(args.requests * len(args.concurrency) * deletes) + 1
+
+    report = {
+        'database': database_url.split(':', 1)[0].split('+', 1)[0],
+        'users': args.users,
+        'requests': args.requests,
+        'mix': args.mix if not args.path else {'path': args.path},
+        'runner': runner_info(),
+        'runs': [],
+    }
+    for mode in args.mode:
+        if mode != 'external':
+            prepare_database(database_url, args.users + reserved)
+        workload = Workload(args.mix, args.users, 0 if mode == 'external' else reserved, args.seed, args.path)
+        target = Target(mode, args, database_url)
+
+        async def run_mode():
+            try:
+                return [await run_level(target, workload, c, args.requests) for c in args.concurrency]
+            finally:
+                await target.aclose()
+
+        try:
+            levels = asyncio.run(run_mode())
+        finally:
+            target.stop()
+        report['runs'].append({'mode': mode, 'levels': levels})
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            f.write(output + '\n')
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    problems = compare(report, baseline, args.max_regression, args.gate)
+    for problem in problems:
+        print(f'REGRESSION {problem}', file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""Configuration gunicorn du backend (lancée par `flask serve`)
+
+Workers pré-forkés avec threads (gthread). L'application, et donc le moteur
+SQLAlchemy et son pool, sont créés dans chaque worker après le fork.
+SIGTERM déclenche un arrêt gracieux : le master arrête d'accepter des
+connexions et laisse GUNICORN_GRACEFUL_TIMEOUT secondes aux requêtes en cours.
+"""
+import multiprocessing
+import os
+import shutil
+import sys
+
+# Importé ici et non dans child_exit : un import dans un handler de signal du
+# master peut être réentrant (SIGCHLD pendant l'arrêt) et échouer
+from prometheus_client import multiprocess
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+worker_class = "gthread"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 0))
+preload_app = False
+accesslog = os.environ.get("GUNICORN_ACCESSLOG", "-") or None
+errorlog = "-"
+
+
+def on_starting(server):
+    # Les métriques multiprocess d'une exécution précédente faussent les totaux
+    multiproc_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if multiproc_dir:
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+        os.makedirs(multiproc_dir, exist_ok=True)
+
+
+def post_fork(server, worker):
+    # Contrôle d'admission : une requête en attente occupe un thread comme une
+    # requête en cours. Les deux ensemble restent sous threads - 1 - flux SSE
+    # (exemptés), pour qu'un thread reste libre pour /health ; au moins 1 place
+    streams = int(os.environ.get("CHANGE_FEED_MAX_STREAMS", 1))
+    budget = worker.cfg.threads - 1 - streams
+    os.environ.setdefault("ADMISSION_MAX_INFLIGHT", str(max(budget, 1)))
+    os.environ.setdefault("ADMISSION_MAX_QUEUE", str(max(budget - int(os.environ["ADMISSION_MAX_INFLIGHT"]), 0)))
+
+    # Si l'application a été préchargée dans le master, ne jamais réutiliser
+    # ses connexions dans le worker
+    if "src.wsgi" in sys.modules:
+        from src.models.user import db
+        from src.wsgi import app
+        with app.app_context():
+            db.engine.dispose(close=False)
+
+
+def worker_exit(server, worker):
+    if "src.wsgi" in sys.modules:
+        from src.models.user import db
+        from src.wsgi import app
+        with app.app_context():
+            db.engine.dispose()
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
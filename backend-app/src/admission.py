@@ -0,0 +1,199 @@
+"""Contrôle d'admission : limites de concurrence par route, débit par client, délestage"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, request
+from werkzeug.exceptions import ServiceUnavailable, TooManyRequests
+
+from src.metrics import ADMISSION_ADMITTED, ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_WAIT, ADMISSION_SHED
+
+
+class WaitQueue:
+    """Places d'attente bornées, partagées entre limiteurs : chaque requête en attente occupe un thread"""
+
+    def __init__(self, size=None):
+        self.size = size
+        self.waiting = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            if self.size is not None and self.waiting >= self.size:
+                return False
+            self.waiting += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.waiting -= 1
+
+
+class ConcurrencyLimiter:
+    """Nombre borné de requêtes simultanées, avec file d'attente bornée en temps et en taille"""
+
+    def __init__(self, limit, max_queue=None, queue=None):
+        self.limit = limit
+        self.queue = queue if queue is not None else WaitQueue(max_queue)
+        self.in_flight = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout):
+        """Prend une place ; renvoie None si la file est pleine ou le délai dépassé"""
+        start = time.monotonic()
+        with self._condition:
+            if self.in_flight < self.limit:
+                self.in_flight += 1
+                return 0.0
+            if not self.queue.enter():
+                return None
+            self.waiting += 1
+            try:
+                admitted = self._condition.wait_for(lambda: self.in_flight < self.limit, timeout)
+                if not admitted:
+                    return None
+                self.in_flight += 1
+                return time.monotonic() - start
+            finally:
+                self.waiting -= 1
+                self.queue.leave()
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+
+class TokenBucket:
+    """Seaux à jetons indexés par clé (client ou route), bornés en nombre (LRU)"""
+
+    def __init__(self, rate, burst, maxsize=10000, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Consomme un jeton ; renvoie 0 si admis, sinon le délai (s) avant le prochain jeton"""
+        now = self._clock()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+def parse_route_limits(value):
+    """'user.get_users=8,user.import_users=1' -> {'user.get_users': 8, 'user.import_users': 1}"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        endpoint, _, limit = item.partition('=')
+        limits[endpoint.strip()] = int(limit)
+    return limits
+
+
+class AdmissionController:
+    """Applique les limites avant chaque requête et libère les places à la fin"""
+
+    def __init__(self, max_inflight=0, route_limits=None, queue_timeout=0.25, max_queue=None,
+                 rate=0.0, burst=None, rate_key='client', exempt_paths=(), retry_after=1):
+        self.queue_timeout = queue_timeout
+        self.rate_key = rate_key
+        self.exempt_paths = frozenset(exempt_paths)
+        self.retry_after = retry_after
+        # Une seule file pour tous les limiteurs : ADMISSION_MAX_QUEUE borne le total des threads en attente
+        self.queue = WaitQueue(max_queue)
+        self.global_limiter = ConcurrencyLimiter(max_inflight, queue=self.queue) if max_inflight > 0 else None
+        self.route_limiters = {
+            endpoint: ConcurrencyLimiter(limit, queue=self.queue)
+            for endpoint, limit in (route_limits or {}).items() if limit > 0
+        }
+        self.buckets = TokenBucket(rate, burst or max(rate, 1)) if rate > 0 else None
+
+    def _bucket_key(self, route):
+        # remote_addr : l'adresse vue par le dernier proxy de confiance (ProxyFix, TRUSTED_PROXY_HOPS),
+        # jamais une entrée X-Forwarded-For choisie par le client
+        client = request.remote_addr
+        if self.rate_key == 'route':
+            return route
+        if self.rate_key == 'client_route':
+            return f'{client} {route}'
+        return client
+
+    def before_request(self):
+        if request.path in self.exempt_paths:
+            return
+        route = request.endpoint or 'unmatched'
+
+        if self.buckets is not None:
+            wait = self.buckets.take(self._bucket_key(route))
+            if wait:
+                ADMISSION_SHED.labels(route, 'rate_limited').inc()
+                raise TooManyRequests('Rate limit exceeded', retry_after=math.ceil(wait))
+
+        slots, waited = [], 0.0
+        deadline = time.monotonic() + self.queue_timeout
+        for limiter in (self.route_limiters.get(route), self.global_limiter):
+            if limiter is None:
+                continue
+            wait = limiter.acquire(max(deadline - time.monotonic(), 0))
+            if wait is None:
+                for slot in slots:
+                    slot.release()
+                ADMISSION_SHED.labels(route, 'overloaded').inc()
+                raise ServiceUnavailable('Server is overloaded, retry later', retry_after=self.retry_after)
+            slots.append(limiter)
+            waited += wait
+
+        g.admission_slots = slots
+        g.admission_route = route
+        ADMISSION_QUEUE_WAIT.labels(route).observe(waited)
+        ADMISSION_ADMITTED.labels(route).inc()
+        ADMISSION_IN_FLIGHT.labels(route).inc()
+
+    def teardown_request(self, exc=None):
+        slots = g.pop('admission_slots', None)
+        if slots is None:
+            return
+        for limiter in slots:
+            limiter.release()
+        ADMISSION_IN_FLIGHT.labels(g.pop('admission_route')).dec()
+
+
+def init_admission_control(app):
+    """Installe le contrôle d'admission (app.extensions['admission']) ; None si désactivé
+
+    Configuration : ADMISSION_CONTROL, ADMISSION_MAX_INFLIGHT (0 = illimité),
+    ADMISSION_ROUTE_LIMITS, ADMISSION_QUEUE_TIMEOUT_MS, ADMISSION_MAX_QUEUE
+    (requêtes en attente, tous limiteurs confondus, au-delà : 503),
+    ADMISSION_RATE_LIMIT (requêtes/s, 0 = désactivé), ADMISSION_RATE_BURST,
+    ADMISSION_RATE_KEY (client, route ou client_route), ADMISSION_EXEMPT_PATHS.
+    Le client est request.remote_addr, corrigé par ProxyFix selon TRUSTED_PROXY_HOPS.
+    """
+    if not app.config['ADMISSION_CONTROL']:
+        return None
+    controller = AdmissionController(
+        max_inflight=app.config['ADMISSION_MAX_INFLIGHT'],
+        route_limits=app.config['ADMISSION_ROUTE_LIMITS'],
+        queue_timeout=app.config['ADMISSION_QUEUE_TIMEOUT_MS'] / 1000,
+        max_queue=app.config['ADMISSION_MAX_QUEUE'],
+        rate=app.config['ADMISSION_RATE_LIMIT'],
+        burst=app.config['ADMISSION_RATE_BURST'],
+        rate_key=app.config['ADMISSION_RATE_KEY'],
+        exempt_paths=app.config['ADMISSION_EXEMPT_PATHS'],
+    )
+    app.before_request(controller.before_request)
+    app.teardown_request(controller.teardown_request)
+    app.extensions['admission'] = controller
+    return controller
@@ -0,0 +1,350 @@
+"""Variante ASGI (asynchrone) de l'API utilisateurs
+
+Lancement : uvicorn --factory src.asgi:create_asgi_app --host 0.0.0.0 --port 5000 --workers 4
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlencode
+
+from sqlalchemy import insert, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.exceptions import (
+    BadRequest, Gone, HTTPException, NotFound, PreconditionFailed, PreconditionRequired,
+)
+from werkzeug.http import parse_etags
+
+from src.cache import SYNC_LIMIT, LRUCache, UserCache
+from src.changes import (
+    CREATE, DEFAULT_CHANGES_LIMIT, DELETE, MAX_CHANGES_LIMIT, UPDATE, change_floor_statement,
+    change_log_head_statement, change_log_statement, change_rows, changes_payload, changes_statement,
+    check_cursor, sse_event,
+)
+from src.database import engine_options_from_env, env_bool
+from src.sql_metrics import InstrumentedAsyncAdaptedQueuePool, InstrumentedQueuePool
+from src.models.user import User, UserChange
+from src.pagination import decode_cursor, encode_cursor, parse_limit
+from src.user_import import validate_row
+from src.stats import (
+    DEFAULT_DAYS, DEFAULT_HOURS, MAX_DAYS, MAX_HOURS, set_gauges, stat_rows, stats_payload, stats_statement,
+    stats_upsert_statement, utcnow,
+)
+from src.routes.user import (
+    CREATE_CONFLICTS, UPDATE_CONFLICTS, USER_COLUMNS, if_match_versions, split_row, user_delete_statement,
+    user_insert_statement, user_list_statement, user_search_statement, user_update_statement, version_etag,
+    write_error,
+)
+
+
+def async_database_url(database_url):
+    """Convertit une URL synchrone (psycopg2, pysqlite) vers son pilote asynchrone"""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend == 'postgresql':
+        url = url.set(drivername='postgresql+asyncpg')
+    elif backend == 'sqlite':
+        url = url.set(drivername='sqlite+aiosqlite')
+    return url
+
+
+def create_engine_for(database_url):
+    url = async_database_url(database_url)
+    options = engine_options_from_env(database_url)
+    options.pop('connect_args', None)
+    # Un moteur asyncio refuse les pools synchrones : même mesure du checkout, pool asyncio
+    if options.get('poolclass') is InstrumentedQueuePool:
+        options['poolclass'] = InstrumentedAsyncAdaptedQueuePool
+    statement_timeout = os.environ.get('DB_STATEMENT_TIMEOUT_MS')
+    if url.get_backend_name() == 'postgresql' and statement_timeout:
+        options['connect_args'] = {'server_settings': {'statement_timeout': str(int(statement_timeout))}}
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        options.update(poolclass=StaticPool, connect_args={'check_same_thread': False})
+    return create_async_engine(url, **options)
+
+
+async def _json_body(request):
+    if request.headers.get('content-type', '').split(';')[0].strip() != 'application/json':
+        raise BadRequest('Request must be JSON')
+    try:
+        return await request.json()
+    except ValueError:
+        raise BadRequest('Failed to decode JSON object')
+
+
+async def _record_changes(session, op, user_ids):
+    await session.execute(insert(UserChange), change_rows(op, user_ids))
+
+
+async def _record_stats(session, op, created_ats):
+    await session.execute(stats_upsert_statement(session.bind.dialect.name), stat_rows(op, created_ats))
+
+
+class AsyncChangeNotifier:
+    """Réveille les flux SSE du processus après une écriture locale (sinon, sondage)"""
+
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def notify(self):
+        self._event.set()
+        self._event = asyncio.Event()
+
+    async def wait(self, event, timeout):
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    @property
+    def event(self):
+        return self._event
+
+
+async def _read_changes(app, since, limit):
+    async with app.state.sessionmaker() as session:
+        rows = (await session.execute(changes_statement(since, limit, app.state.engine.dialect.name))).all()
+        check_cursor(since, (await session.execute(change_floor_statement())).scalar())
+    return changes_payload(rows, since, limit)
+
+
+async def get_users(request):
+    """Get users, one keyset-paginated page at a time"""
+    stmt, fields, limit = user_list_statement(request.query_params)
+    async with request.app.state.sessionmaker() as session:
+        rows = (await session.execute(stmt)).all()
+    page = rows[:limit]
+    response = JSONResponse([{field: getattr(row, field) for field in fields} for row in page])
+    if len(rows) > limit:
+        cursor = encode_cursor(page[-1].id)
+        params = dict(request.query_params, after=cursor)
+        response.headers['Link'] = f'<{request.url.path}?{urlencode(params)}>; rel="next"'
+        response.headers['X-Next-Cursor'] = cursor
+    return response
+
+
+async def search_users(request):
+    """Type-ahead search on username and email (case-insensitive)"""
+    engine = request.app.state.engine
+    stmt, fields = user_search_statement(request.query_params, engine.dialect.name)
+    async with request.app.state.sessionmaker() as session:
+        rows = (await session.execute(stmt)).all()
+    return JSONResponse([dict(zip(fields, row)) for row in rows])
+
+
+async def get_user_changes(request):
+    """Users changed since the `since` cursor (all of them without it)"""
+    since = decode_cursor(request.query_params.get('since')) or 0
+    limit = parse_limit(request.query_params.get('limit'), default=DEFAULT_CHANGES_LIMIT, maximum=MAX_CHANGES_LIMIT)
+    return JSONResponse(await _read_changes(request.app, since, limit))
+
+
+async def stream_user_changes(request):
+    """Server-Sent Events stream of the change feed (resumes from Last-Event-ID)"""
+    since = decode_cursor(request.headers.get('last-event-id') or request.query_params.get('since')) or 0
+    app = request.app
+    async with app.state.sessionmaker() as session:
+        check_cursor(since, (await session.execute(change_floor_statement())).scalar())
+    config = app.state.change_feed
+
+    async def events(cursor):
+        yield f"retry: {int(config['poll_interval'] * 1000)}\n\n"
+        deadline = time.monotonic() + config['stream_seconds']
+        last_sent = time.monotonic()
+        while time.monotonic() < deadline:
+            event = app.state.change_notifier.event
+            try:
+                payload = await _read_changes(app, cursor, DEFAULT_CHANGES_LIMIT)
+            except Gone:
+                # Compacté pendant le flux : le client se reconnecte et reçoit le 410
+                return
+            if payload['changes']:
+                cursor = decode_cursor(payload['cursor'])
+                last_sent = time.monotonic()
+                yield sse_event(payload)
+                if payload['has_more']:
+                    continue
+            elif time.monotonic() - last_sent >= config['heartbeat']:
+                last_sent = time.monotonic()
+                yield ': keepalive\n\n'
+            await app.state.change_notifier.wait(
+                event, min(config['poll_interval'], max(deadline - time.monotonic(), 0))
+            )
+
+    return StreamingResponse(events(since), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+async def get_user_stats(request):
+    """User total and signups per UTC day / hour, from the user_stats aggregates"""
+    days = parse_limit(request.query_params.get('days'), default=DEFAULT_DAYS, maximum=MAX_DAYS, name='days')
+    hours = parse_limit(request.query_params.get('hours'), default=DEFAULT_HOURS, maximum=MAX_HOURS, name='hours')
+    now = utcnow()
+    async with request.app.state.sessionmaker() as session:
+        rows = (await session.execute(stats_statement(days, hours, now))).all()
+    stats = stats_payload(rows, days, hours, now)
+    set_gauges(stats)
+    return JSONResponse(stats)
+
+
+async def create_user(request):
+    """Create a new user (409 if the username or email is taken)"""
+    data = await _json_body(request)
+    checked = validate_row(data or {})
+    if isinstance(checked, str):
+        raise BadRequest(checked)
+
+    async with request.app.state.sessionmaker() as session:
+        try:
+            row = (await session.execute(user_insert_statement(data))).one()
+            await _record_changes(session, CREATE, [row.id])
+            await _record_stats(session, CREATE, [row.created_at])
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            raise write_error(e, CREATE_CONFLICTS, 'creating')
+
+    request.app.state.change_notifier.notify()
+    user, version = split_row(row)
+    return JSONResponse(user, status_code=201, headers={'ETag': f'"{version_etag(version)}"'})
+
+
+async def _sync_user_cache(app):
+    cache = app.state.user_cache
+    if not cache.sync_due():
+        return
+    dialect_name = app.state.engine.dialect.name
+    async with app.state.sessionmaker() as session:
+        if cache.sync_cursor is None:
+            cache.sync_cursor = (await session.execute(change_log_head_statement(dialect_name))).scalar()
+        else:
+            stmt = change_log_statement(cache.sync_cursor, SYNC_LIMIT, dialect_name)
+            cache.apply_changes((await session.execute(stmt)).all(), SYNC_LIMIT)
+
+
+async def get_user(request):
+    """Get a specific user by ID (cached, honours If-None-Match)"""
+    user_id = request.path_params['user_id']
+    cache = request.app.state.user_cache
+    await _sync_user_cache(request.app)
+    entry = cache.get(user_id)
+    if entry is None:
+        async with request.app.state.sessionmaker() as session:
+            row = (await session.execute(select(*USER_COLUMNS, User.version).where(User.id == user_id))).first()
+        if not row:
+            raise NotFound('User not found')
+        user, version = split_row(row)
+        entry = cache.set(user_id, user, etag=version_etag(version))
+
+    headers = {'ETag': f'"{entry.etag}"'}
+    if parse_etags(request.headers.get('if-none-match')).contains_weak(entry.etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(entry.data, headers=headers)
+
+
+async def update_user(request):
+    """Update a user by ID (If-Match: optimistic locking on the version)"""
+    user_id = request.path_params['user_id']
+    data = await _json_body(request)
+    if not data:
+        raise BadRequest('No data provided')
+    if_match = parse_etags(request.headers.get('if-match'))
+    if not if_match and request.app.state.require_if_match:
+        raise PreconditionRequired('If-Match header is required')
+
+    async with request.app.state.sessionmaker() as session:
+        try:
+            row = (await session.execute(user_update_statement(user_id, data, if_match_versions(if_match)))).first()
+            if row is not None:
+                await _record_changes(session, UPDATE, [user_id])
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            raise write_error(e, UPDATE_CONFLICTS, 'updating')
+
+        if row is None:
+            if (await session.execute(select(User.id).where(User.id == user_id))).first() is None:
+                raise NotFound('User not found')
+            raise PreconditionFailed('User was modified by another request')
+
+    request.app.state.user_cache.invalidate(user_id)
+    request.app.state.change_notifier.notify()
+    user, version = split_row(row)
+    return JSONResponse(user, headers={'ETag': f'"{version_etag(version)}"'})
+
+
+async def delete_user(request):
+    """Delete a user by ID"""
+    user_id = request.path_params['user_id']
+    async with request.app.state.sessionmaker() as session:
+        try:
+            row = (await session.execute(user_delete_statement(user_id))).first()
+            if row is not None:
+                await _record_changes(session, DELETE, [user_id])
+                await _record_stats(session, DELETE, [row.created_at])
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            raise BadRequest(f'Error deleting user: {str(e)}')
+
+    if row is None:
+        raise NotFound('User not found')
+    request.app.state.user_cache.invalidate(user_id)
+    request.app.state.change_notifier.notify()
+    return Response(status_code=204)
+
+
+async def http_error(request, exc):
+    """Les erreurs werkzeug (BadRequest, NotFound) gardent leur code et leur message"""
+    return PlainTextResponse(exc.description, status_code=exc.code)
+
+
+def create_asgi_app(database_url=None):
+    """Factory de l'application ASGI"""
+    database_url = database_url or os.environ.get('DATABASE_URL')
+    if not database_url:
+        raise RuntimeError('DATABASE_URL must be set in environment variables.')
+    engine = create_engine_for(database_url)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await engine.dispose()
+
+    app = Starlette(
+        routes=[
+            Route('/api/users', get_users, methods=['GET']),
+            Route('/api/users', create_user, methods=['POST']),
+            Route('/api/users/search', search_users, methods=['GET']),
+            Route('/api/users/changes', get_user_changes, methods=['GET']),
+            Route('/api/users/changes/stream', stream_user_changes, methods=['GET']),
+            Route('/api/users/{user_id:int}', get_user, methods=['GET']),
+            Route('/api/users/{user_id:int}', update_user, methods=['PUT']),
+            Route('/api/users/{user_id:int}', delete_user, methods=['DELETE']),
+            Route('/api/stats/users', get_user_stats, methods=['GET']),
+        ],
+        exception_handlers={HTTPException: http_error},
+        lifespan=lifespan,
+    )
+    app.state.engine = engine
+    app.state.sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+    app.state.require_if_match = env_bool('USER_UPDATE_REQUIRE_IF_MATCH', False)
+    app.state.user_cache = UserCache(
+        LRUCache(
+            maxsize=int(os.environ.get('USER_CACHE_SIZE', 10000)),
+            ttl=float(os.environ.get('USER_CACHE_TTL', 30)),
+        ),
+        sync_interval=float(os.environ.get('USER_CACHE_SYNC_INTERVAL', 1)),
+    )
+    app.state.change_notifier = AsyncChangeNotifier()
+    app.state.change_feed = {
+        'poll_interval': float(os.environ.get('CHANGE_FEED_POLL_INTERVAL', 1)),
+        'heartbeat': float(os.environ.get('CHANGE_FEED_HEARTBEAT', 15)),
+        'stream_seconds': float(os.environ.get('CHANGE_FEED_STREAM_SECONDS', 300)),
+    }
+    return app
@@ -0,0 +1,58 @@
+"""Threads de fond périodiques, démarrés une fois par processus"""
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicThread:
+    """Appelle `work` toutes les `interval` secondes dans un thread par processus
+
+    Avec run_first, la première itération a lieu dès le démarrage du thread
+    (jamais dans la requête qui le démarre) ; `on_start` est appelé avant
+    chaque démarrage. Les erreurs d'une itération sont journalisées.
+    """
+
+    def __init__(self, work, interval, name='periodic', run_first=False, on_start=None):
+        self.interval = interval
+        self.name = name
+        self._work = work
+        self._run_first = run_first
+        self._on_start = on_start
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def ensure_started(self):
+        """Démarre le thread (une fois par processus, donc après un fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stop.clear()
+            if self._on_start is not None:
+                self._on_start()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def stop(self):
+        self._stop.set()
+
+    def is_alive(self):
+        """Vrai si le thread tourne (quel que soit le résultat de ses itérations)"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        if not self._run_first and self._stop.wait(self.interval):
+            return
+        while True:
+            try:
+                self._work()
+            except Exception:
+                logger.exception('Background thread %s iteration failed', self.name)
+            if self._stop.wait(self.interval):
+                return
@@ -0,0 +1,578 @@
+"""Sauvegarde et restauration PostgreSQL parallèles (pg_dump / pg_restore -Fd -j N)
+
+Usage (depuis backend-app/) :
+    python -m src.backup backup --output-dir /backup --jobs 4 --compression zstd --retention-days 30
+    python -m src.backup restore --backup-dir /backup --jobs 4
+    python -m src.backup verify /backup/postgres_backup_20250101_020000
+    python -m src.backup prune --backup-dir /backup --retention-days 30
+"""
+import argparse
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlsplit, urlunsplit
+
+try:
+    import zstandard
+except ImportError:  # dépendance optionnelle
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:  # dépendance optionnelle
+    lz4 = None
+
+BACKUP_PREFIX = 'postgres_backup_'
+LEGACY_SUFFIX = '.sql.gz'
+PARTIAL_SUFFIX = '.partial'
+MANIFEST = 'manifest.json'
+MANIFEST_VERSION = 1
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# Compresseur -> (extension, niveau par défaut)
+COMPRESSORS = {
+    'gzip': ('.gz', 6),
+    'zstd': ('.zst', 3),
+    'lz4': ('.lz4', 0),
+    'none': ('', None),
+}
+
+
+def available_compressors():
+    """Compresseurs utilisables avec les paquets installés"""
+    return [
+        name for name in COMPRESSORS
+        if (name != 'zstd' or zstandard is not None) and (name != 'lz4' or lz4 is not None)
+    ]
+
+
+def _require(compression):
+    if compression not in COMPRESSORS:
+        raise RuntimeError(f'Unknown compression: {compression}')
+    if compression not in available_compressors():
+        package = 'zstandard' if compression == 'zstd' else compression
+        raise RuntimeError(f'{compression} compression requires the {package} package')
+
+
+def _open_writer(compression, level, fileobj):
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=level, mtime=0)
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=level).stream_writer(fileobj, closefd=False)
+    if compression == 'lz4':
+        return lz4.frame.LZ4FrameFile(fileobj, mode='wb', compression_level=level)
+    return _Uncloseable(fileobj)
+
+
+def _open_reader(compression, fileobj):
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=fileobj, mode='rb')
+    if compression == 'zstd':
+        return zstandard.ZstdDecompressor().stream_reader(fileobj, closefd=False)
+    if compression == 'lz4':
+        return lz4.frame.LZ4FrameFile(fileobj, mode='rb')
+    return _Uncloseable(fileobj)
+
+
+class _Uncloseable:
+    """Laisse le fichier sous-jacent ouvert (compression 'none')"""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+
+    def write(self, data):
+        return self.fileobj.write(data)
+
+    def read(self, size=-1):
+        return self.fileobj.read(size)
+
+    def close(self):
+        pass
+
+
+class _HashingFile:
+    """Fichier binaire qui calcule sha256 et taille de ce qui le traverse"""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.fileobj.write(data)
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.sha256.update(data)
+        self.size += len(data)
+        return data
+
+    def flush(self):
+        self.fileobj.flush()
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+
+def compress_file(source, destination, compression='gzip', level=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                  remove_source=False):
+    """Compresse `source` en flux (mémoire bornée à un bloc) ; renvoie l'entrée du manifeste"""
+    _require(compression)
+    if level is None:
+        level = COMPRESSORS[compression][1]
+    start = time.perf_counter()
+    with open(source, 'rb') as src, open(destination, 'wb') as dest:
+        raw = _HashingFile(src)
+        packed = _HashingFile(dest)
+        writer = _open_writer(compression, level, packed)
+        while True:
+            chunk = raw.read(chunk_size)
+            if not chunk:
+                break
+            writer.write(chunk)
+        writer.close()
+    if remove_source:
+        os.remove(source)
+    return {
+        'name': os.path.basename(source),
+        'file': os.path.basename(destination),
+        'size': raw.size,
+        'sha256': raw.sha256.hexdigest(),
+        'compressed_size': packed.size,
+        'compressed_sha256': packed.sha256.hexdigest(),
+        'seconds': round(time.perf_counter() - start, 4),
+    }
+
+
+def decompress_file(source, destination, entry, compression, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Décompresse `source` en flux en vérifiant les sommes du manifeste"""
+    _require(compression)
+    with open(source, 'rb') as src, open(destination, 'wb') as dest:
+        packed = _HashingFile(src)
+        raw = _HashingFile(dest)
+        reader = _open_reader(compression, packed)
+        while True:
+            chunk = reader.read(chunk_size)
+            if not chunk:
+                break
+            raw.write(chunk)
+        reader.close()
+        # Le décompresseur peut s'arrêter avant la fin du fichier compressé
+        while packed.read(chunk_size):
+            pass
+    if packed.sha256.hexdigest() != entry['compressed_sha256']:
+        raise RuntimeError(f"Checksum mismatch for {entry['file']} (compressed file is corrupt)")
+    if raw.sha256.hexdigest() != entry['sha256'] or raw.size != entry['size']:
+        raise RuntimeError(f"Checksum mismatch for {entry['name']} (decompressed data differs)")
+
+
+class TableTimer:
+    """Durée par table à partir des messages --verbose de pg_dump / pg_restore
+
+    Une table démarre sur « dumping contents of table » (pg_dump) ou
+    « processing data for table » (pg_restore) et se termine sur « finished
+    item N TABLE DATA » (mode parallèle) ou au démarrage de la suivante.
+    """
+
+    START = re.compile(r'(?:dumping contents of|processing data for) table "(?P<name>[^"]+)"')
+    FINISH = re.compile(r'finished item (?P<id>\d+) TABLE DATA (?P<table>\S+)')
+
+    def __init__(self, parallel, clock=time.monotonic):
+        self.parallel = parallel
+        self.clock = clock
+        self.started = {}
+        self.seconds = {}
+        self._current = None
+
+    def feed(self, line):
+        """Traite une ligne ; renvoie l'id de l'élément terminé, le cas échéant"""
+        now = self.clock()
+        match = self.START.search(line)
+        if match:
+            if not self.parallel:
+                self.close(now)
+                self._current = match.group('name')
+            self.started[match.group('name')] = now
+            return None
+        match = self.FINISH.search(line)
+        if match:
+            table = match.group('table')
+            name = next((n for n in self.started if n == table or n.endswith('.' + table)), None)
+            if name is not None and name not in self.seconds:
+                self.seconds[name] = now - self.started[name]
+            return int(match.group('id'))
+        return None
+
+    def close(self, now=None):
+        if self._current is not None and self._current not in self.seconds:
+            now = self.clock() if now is None else now
+            self.seconds[self._current] = now - self.started[self._current]
+        self._current = None
+
+
+def _tool(pg_bin, name):
+    return os.path.join(pg_bin, name) if pg_bin else name
+
+
+def _run_verbose(command, on_line):
+    """Lance une commande PostgreSQL en suivant sa sortie d'erreur ligne à ligne"""
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    tail = []
+    for line in process.stderr:
+        on_line(line)
+        tail = (tail + [line.rstrip()])[-20:]
+    if process.wait() != 0:
+        raise RuntimeError(f'{os.path.basename(command[0])} failed:\n' + '\n'.join(tail))
+
+
+def toc_tables(directory, pg_bin=None):
+    """{dump id: 'schema.table'} des données de tables d'un dump répertoire"""
+    listing = subprocess.run(
+        [_tool(pg_bin, 'pg_restore'), '--list', directory],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    tables = {}
+    for line in listing.splitlines():
+        match = re.match(r'^(\d+); \d+ \d+ TABLE DATA (\S+) (\S+) ', line)
+        if match:
+            tables[int(match.group(1))] = f'{match.group(2)}.{match.group(3)}'
+    return tables
+
+
+def _table_report(seconds, sizes):
+    report = []
+    for name in sorted(set(seconds) | set(sizes), key=lambda n: -seconds.get(n, 0)):
+        duration, size = seconds.get(name), sizes.get(name, 0)
+        report.append({
+            'table': name,
+            'seconds': round(duration, 3) if duration is not None else None,
+            'bytes': size,
+            'mb_per_s': round(size / duration / 1e6, 2) if duration else None,
+        })
+    return report
+
+
+def backup(conninfo, output_dir, jobs=4, compression='gzip', level=None, chunk_size=DEFAULT_CHUNK_SIZE,
+           retention_days=None, pg_bin=None):
+    """Sauvegarde parallèle ; renvoie le rapport (aussi enregistré dans le manifeste)"""
+    _require(compression)
+    os.makedirs(output_dir, exist_ok=True)
+    created_at = datetime.datetime.now(datetime.timezone.utc)
+    name = BACKUP_PREFIX + created_at.strftime('%Y%m%d_%H%M%S')
+    partial = os.path.join(output_dir, '.' + name + PARTIAL_SUFFIX)
+    raw_dir = os.path.join(partial, 'raw')
+    os.makedirs(partial)
+    try:
+        report = _dump(conninfo, partial, raw_dir, jobs, compression, level, chunk_size, pg_bin)
+    except BaseException:
+        # Pas de sauvegarde partielle laissée derrière (elle ne serait jamais restaurable)
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    files = report.pop('files')
+    report = {'backup': name, 'created_at': created_at.isoformat(), **report}
+    manifest = dict(report, version=MANIFEST_VERSION, files=files)
+    with open(os.path.join(partial, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    final = os.path.join(output_dir, name)
+    os.rename(partial, final)
+    report['path'] = final
+
+    if retention_days is not None:
+        report['pruned'] = prune(output_dir, retention_days)
+    return report
+
+
+def _dump(conninfo, partial, raw_dir, jobs, compression, level, chunk_size, pg_bin):
+    """pg_dump -Fd -j N avec compression de chaque table dès qu'elle est écrite"""
+    extension = COMPRESSORS[compression][0]
+    files, pending, lock = [], {}, threading.Lock()
+    start = time.perf_counter()
+    timer = TableTimer(parallel=jobs > 1)
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        def submit(filename):
+            with lock:
+                if filename in pending:
+                    return
+                pending[filename] = pool.submit(
+                    compress_file, os.path.join(raw_dir, filename), os.path.join(partial, filename + extension),
+                    compression, level, chunk_size, True,
+                )
+
+        def on_line(line):
+            finished = timer.feed(line)
+            if finished is not None and os.path.exists(os.path.join(raw_dir, f'{finished}.dat')):
+                submit(f'{finished}.dat')
+
+        _run_verbose([
+            _tool(pg_bin, 'pg_dump'), '--format=directory', f'--jobs={jobs}', '--compress=0',
+            '--verbose', f'--file={raw_dir}', f'--dbname={conninfo}',
+        ], on_line)
+        timer.close()
+        dump_seconds = time.perf_counter() - start
+
+        tables = toc_tables(raw_dir, pg_bin)
+        for filename in sorted(os.listdir(raw_dir)):
+            submit(filename)
+        for future in pending.values():
+            files.append(future.result())
+
+    shutil.rmtree(raw_dir)
+    sizes = {}
+    for entry in files:
+        dump_id = entry['name'].split('.', 1)[0]
+        if dump_id.isdigit() and int(dump_id) in tables:
+            sizes[tables[int(dump_id)]] = entry['size']
+
+    total = time.perf_counter() - start
+    raw_bytes = sum(entry['size'] for entry in files)
+    compressed_bytes = sum(entry['compressed_size'] for entry in files)
+    return {
+        'compression': compression,
+        'level': level if level is not None else COMPRESSORS[compression][1],
+        'jobs': jobs,
+        'seconds': round(total, 3),
+        'dump_seconds': round(dump_seconds, 3),
+        'raw_bytes': raw_bytes,
+        'compressed_bytes': compressed_bytes,
+        'ratio': round(raw_bytes / compressed_bytes, 2) if compressed_bytes else None,
+        'mb_per_s': round(raw_bytes / total / 1e6, 2) if total else None,
+        'tables': _table_report(timer.seconds, sizes),
+        'files': sorted(files, key=lambda entry: entry['name']),
+    }
+
+
+def load_manifest(path):
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise RuntimeError(f"Unsupported manifest version: {manifest.get('version')}")
+    return manifest
+
+
+def _unpack(path, destination, manifest, jobs, chunk_size):
+    """Décompresse et vérifie tous les fichiers du manifeste, en parallèle"""
+    os.makedirs(destination, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [
+            pool.submit(decompress_file, os.path.join(path, entry['file']), os.path.join(destination, entry['name']),
+                        entry, manifest['compression'], chunk_size)
+            for entry in manifest['files']
+        ]
+        for future in futures:
+            future.result()
+
+
+def verify(path, jobs=4, chunk_size=DEFAULT_CHUNK_SIZE, work_dir=None):
+    """Vérifie toutes les sommes d'une sauvegarde sans la restaurer"""
+    manifest = load_manifest(path)
+    scratch = os.path.join(work_dir or os.path.dirname(os.path.abspath(path)),
+                           '.verify-' + os.path.basename(os.path.normpath(path)))
+    start = time.perf_counter()
+    try:
+        _unpack(path, scratch, manifest, jobs, chunk_size)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return {'backup': manifest['backup'], 'files': len(manifest['files']), 'ok': True,
+            'seconds': round(time.perf_counter() - start, 3)}
+
+
+def restore(conninfo, path, jobs=4, clean=False, chunk_size=DEFAULT_CHUNK_SIZE, work_dir=None, pg_bin=None):
+    """Vérifie, décompresse puis restaure une sauvegarde avec pg_restore -j N"""
+    if path.endswith(LEGACY_SUFFIX):
+        return _restore_legacy(conninfo, path, chunk_size, pg_bin)
+
+    manifest = load_manifest(path)
+    scratch = os.path.join(work_dir or os.path.dirname(os.path.abspath(path)),
+                           '.restore-' + os.path.basename(os.path.normpath(path)))
+    start = time.perf_counter()
+    timer = TableTimer(parallel=jobs > 1)
+    try:
+        _unpack(path, scratch, manifest, jobs, chunk_size)
+        unpack_seconds = time.perf_counter() - start
+        command = [_tool(pg_bin, 'pg_restore'), '--format=directory', f'--jobs={jobs}', '--verbose',
+                   f'--dbname={conninfo}']
+        if clean:
+            command += ['--clean', '--if-exists']
+        _run_verbose(command + [scratch], timer.feed)
+        timer.close()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    total = time.perf_counter() - start
+    sizes = {table['table']: table['bytes'] for table in manifest.get('tables', [])}
+    return {
+        'backup': manifest['backup'],
+        'jobs': jobs,
+        'seconds': round(total, 3),
+        'unpack_seconds': round(unpack_seconds, 3),
+        'raw_bytes': manifest['raw_bytes'],
+        'mb_per_s': round(manifest['raw_bytes'] / total / 1e6, 2) if total else None,
+        'tables': _table_report(timer.seconds, sizes),
+    }
+
+
+def _restore_legacy(conninfo, path, chunk_size, pg_bin):
+    """Anciennes sauvegardes pg_dump | gzip : décompression en flux vers psql"""
+    start = time.perf_counter()
+    process = subprocess.Popen([_tool(pg_bin, 'psql'), '--quiet', '--set=ON_ERROR_STOP=1', f'--dbname={conninfo}'],
+                               stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+    with gzip.open(path, 'rb') as source:
+        shutil.copyfileobj(source, process.stdin, chunk_size)
+    process.stdin.close()
+    if process.wait() != 0:
+        raise RuntimeError(f'psql failed while restoring {path}')
+    return {'backup': os.path.basename(path), 'seconds': round(time.perf_counter() - start, 3)}
+
+
+def _backup_time(path):
+    """Date de création d'une sauvegarde (manifeste, sinon date de modification)"""
+    try:
+        return datetime.datetime.fromisoformat(load_manifest(path)['created_at']).timestamp()
+    except (OSError, ValueError, KeyError, RuntimeError):
+        return os.path.getmtime(path)
+
+
+def list_backups(output_dir):
+    """Sauvegardes complètes (répertoires et anciens .sql.gz), de la plus ancienne à la plus récente"""
+    if not os.path.isdir(output_dir):
+        return []
+    backups = [
+        os.path.join(output_dir, entry) for entry in os.listdir(output_dir)
+        if entry.startswith(BACKUP_PREFIX)
+        and (entry.endswith(LEGACY_SUFFIX) or os.path.exists(os.path.join(output_dir, entry, MANIFEST)))
+    ]
+    return sorted(backups, key=_backup_time)
+
+
+def latest_backup(output_dir):
+    backups = list_backups(output_dir)
+    if not backups:
+        raise RuntimeError(f'No backup found in {output_dir}')
+    return backups[-1]
+
+
+def prune(output_dir, retention_days, now=None):
+    """Supprime les sauvegardes de plus de `retention_days` jours (jamais la plus récente)"""
+    cutoff = (time.time() if now is None else now) - retention_days * 86400
+    backups = list_backups(output_dir)
+    candidates = [path for path in backups[:-1] if _backup_time(path) < cutoff]
+    candidates += [
+        os.path.join(output_dir, entry) for entry in os.listdir(output_dir)
+        if entry.startswith('.' + BACKUP_PREFIX) and entry.endswith(PARTIAL_SUFFIX)
+        and os.path.getmtime(os.path.join(output_dir, entry)) < cutoff
+    ]
+    for path in candidates:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    return [os.path.basename(path) for path in candidates]
+
+
+def conninfo_from_args(args):
+    """Chaîne de connexion libpq : URL (sans suffixe de driver SQLAlchemy) ou paramètres"""
+    if args.database_url:
+        return re.sub(r'^postgresql\+\w+://', 'postgresql://', args.database_url)
+    parts = {'host': args.host, 'port': args.port, 'user': args.user, 'dbname': args.dbname}
+    return ' '.join(f'{key}={value}' for key, value in parts.items() if value)
+
+
+def split_password(conninfo):
+    """(URL sans mot de passe, mot de passe ou None) : le mot de passe passe par PGPASSWORD, pas par argv (ps)"""
+    parts = urlsplit(conninfo)
+    if '://' not in conninfo or '@' not in parts.netloc:
+        return conninfo, None
+    userinfo, _, hostport = parts.netloc.rpartition('@')
+    user, colon, password = userinfo.partition(':')
+    if not colon:
+        return conninfo, None
+    return urlunsplit(parts._replace(netloc=f'{user}@{hostport}')), unquote(password)
+
+
+def connect_from_args(args):
+    """conninfo_from_args sans mot de passe ; celui de l'URL est placé dans PGPASSWORD pour pg_dump / pg_restore"""
+    conninfo, password = split_password(conninfo_from_args(args))
+    if password is not None:
+        os.environ['PGPASSWORD'] = password
+    return conninfo
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def connection(sub):
+        sub.add_argument('--database-url', default=os.environ.get('DATABASE_URL'))
+        sub.add_argument('--host', default=os.environ.get('DB_HOST'))
+        sub.add_argument('--port', default=os.environ.get('DB_PORT'))
+        sub.add_argument('--user', default=os.environ.get('DB_USER'))
+        sub.add_argument('--dbname', default=os.environ.get('DB_NAME'))
+        sub.add_argument('--pg-bin', default=os.environ.get('PG_BIN'), help='répertoire de pg_dump / pg_restore')
+
+    def tuning(sub):
+        sub.add_argument('--jobs', type=int, default=int(os.environ.get('BACKUP_JOBS', 4)))
+        sub.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='taille des blocs (octets)')
+
+    sub = commands.add_parser('backup', help='sauvegarde parallèle')
+    connection(sub)
+    tuning(sub)
+    sub.add_argument('--output-dir', default=os.environ.get('BACKUP_DIR', '/backup'))
+    sub.add_argument('--compression', choices=list(COMPRESSORS), default=os.environ.get('BACKUP_COMPRESSION', 'gzip'))
+    sub.add_argument('--level', type=int)
+    sub.add_argument('--retention-days', type=float, default=os.environ.get('BACKUP_RETENTION_DAYS'))
+
+    sub = commands.add_parser('restore', help='restauration parallèle (la plus récente par défaut)')
+    connection(sub)
+    tuning(sub)
+    sub.add_argument('path', nargs='?')
+    sub.add_argument('--backup-dir', default=os.environ.get('BACKUP_DIR', '/backup'))
+    sub.add_argument('--clean', action='store_true', help='supprime les objets existants avant restauration')
+    sub.add_argument('--work-dir')
+
+    sub = commands.add_parser('verify', help='vérifie les sommes de contrôle')
+    tuning(sub)
+    sub.add_argument('path')
+    sub.add_argument('--work-dir')
+
+    sub = commands.add_parser('prune', help='applique la rétention')
+    sub.add_argument('--backup-dir', default=os.environ.get('BACKUP_DIR', '/backup'))
+    sub.add_argument('--retention-days', type=float, default=float(os.environ.get('BACKUP_RETENTION_DAYS', 30)))
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == 'backup':
+            retention = float(args.retention_days) if args.retention_days is not None else None
+            report = backup(connect_from_args(args), args.output_dir, args.jobs, args.compression, args.level,
+                            args.chunk_size, retention, args.pg_bin)
+        elif args.command == 'restore':
+            path = args.path or latest_backup(args.backup_dir)
+            report = restore(connect_from_args(args), path, args.jobs, args.clean, args.chunk_size,
+                             args.work_dir, args.pg_bin)
+        elif args.command == 'verify':
+            report = verify(args.path, args.jobs, args.chunk_size, args.work_dir)
+        else:
+            report = {'pruned': prune(args.backup_dir, args.retention_days)}
+    except (RuntimeError, OSError, subprocess.CalledProcessError) as e:
+        print(f'error: {e}', file=sys.stderr)
+        return 1
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
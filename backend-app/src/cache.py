@@ -0,0 +1,204 @@
+"""Cache en lecture des utilisateurs (LRU + TTL en mémoire, backend partagé optionnel)"""
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from src.metrics import USER_CACHE_EVICTIONS, USER_CACHE_HITS, USER_CACHE_MISSES
+
+logger = logging.getLogger(__name__)
+
+CacheEntry = namedtuple('CacheEntry', ['data', 'etag'])
+
+# Changements lus par synchronisation ; au-delà, tout le niveau local est purgé
+SYNC_LIMIT = 1000
+
+
+def compute_etag(data):
+    """ETag fort calculé sur la représentation JSON canonique de l'entrée"""
+    payload = json.dumps(data, sort_keys=True, separators=(',', ':')).encode()
+    return hashlib.sha256(payload).hexdigest()[:32]
+
+
+class LRUCache:
+    """Cache LRU borné en taille, avec expiration (TTL) par entrée"""
+
+    def __init__(self, maxsize=10000, ttl=30.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= self._clock():
+                del self._data[key]
+                USER_CACHE_EVICTIONS.labels(reason='expired').inc()
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, self._clock() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                USER_CACHE_EVICTIONS.labels(reason='capacity').inc()
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SharedCacheBackend:
+    """Backend partagé entre réplicas, sur un client de type Redis (get / set(ex=) / delete)"""
+
+    def __init__(self, client, ttl=30, prefix='backend:user:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        try:
+            raw = self.client.get(self.prefix + str(key))
+        except Exception:
+            logger.warning('Shared user cache unavailable', exc_info=True)
+            return None
+        if raw is None:
+            return None
+        data, etag = json.loads(raw)
+        return CacheEntry(data, etag)
+
+    def set(self, key, entry):
+        if self.ttl <= 0:
+            return
+        try:
+            # Redis refuse ex=0 : expiration arrondie à la seconde supérieure
+            self.client.set(self.prefix + str(key), json.dumps(list(entry)), ex=max(math.ceil(self.ttl), 1))
+        except Exception:
+            logger.warning('Shared user cache unavailable', exc_info=True)
+
+    def delete(self, *keys):
+        if not keys:
+            return
+        try:
+            self.client.delete(*(self.prefix + str(key) for key in keys))
+        except Exception:
+            logger.warning('Shared user cache unavailable', exc_info=True)
+
+
+class UserCache:
+    """Cache read-through des utilisateurs, indexé par id
+
+    Le niveau local sert les lectures sans aller sur le réseau ; le backend
+    partagé (optionnel) évite à chaque réplica de recharger depuis PostgreSQL.
+    Une invalidation purge les deux niveaux dans le processus de l'écriture ;
+    les autres processus purgent de nouveau les deux niveaux à leur prochaine
+    synchronisation sur le journal (apply_changes), donc au plus
+    `sync_interval` secondes plus tard, plus la durée d'une transaction
+    PostgreSQL encore ouverte. Sans synchronisation, la borne est `ttl`.
+    """
+
+    def __init__(self, local, shared=None, sync_interval=None, clock=time.monotonic):
+        self.local = local
+        self.shared = shared
+        self.sync_interval = sync_interval
+        self.sync_cursor = None
+        self._clock = clock
+        self._next_sync = 0.0
+        self._sync_lock = threading.Lock()
+
+    def sync_due(self):
+        """Vrai si le journal doit être relu ; un seul appelant par intervalle obtient True"""
+        if self.sync_interval is None:
+            return False
+        now = self._clock()
+        with self._sync_lock:
+            if now < self._next_sync:
+                return False
+            self._next_sync = now + self.sync_interval
+            return True
+
+    def apply_changes(self, rows, limit=SYNC_LIMIT):
+        """Purge les utilisateurs du journal ((seq, user_id, settled), triés) des deux niveaux
+
+        Le backend partagé peut avoir reçu une version périmée (lecture avant
+        une écriture concurrente, ou sur un réplica en retard) : elle est
+        supprimée elle aussi. Un lot tronqué purge tout le niveau local. Le curseur s'arrête avant le
+        premier changement d'une transaction non terminée, relu la fois suivante.
+        """
+        if len(rows) > limit:
+            self.local.clear()
+            rows = rows[:limit]
+        for _, user_id, _ in rows:
+            self.local.delete(user_id)
+        if self.shared is not None:
+            self.shared.delete(*{user_id for _, user_id, _ in rows})
+        pending = next((seq for seq, _, done in rows if not done), None)
+        if pending is not None:
+            self.sync_cursor = pending - 1
+        elif rows:
+            self.sync_cursor = rows[-1][0]
+
+    def get(self, user_id):
+        entry = self.local.get(user_id)
+        if entry is not None:
+            USER_CACHE_HITS.labels(tier='local').inc()
+            return entry
+        if self.shared is not None:
+            entry = self.shared.get(user_id)
+            if entry is not None:
+                USER_CACHE_HITS.labels(tier='shared').inc()
+                self.local.set(user_id, entry)
+                return entry
+        USER_CACHE_MISSES.inc()
+        return None
+
+    def set(self, user_id, data, etag=None):
+        entry = CacheEntry(data, etag or compute_etag(data))
+        self.local.set(user_id, entry)
+        if self.shared is not None:
+            self.shared.set(user_id, entry)
+        return entry
+
+    def invalidate(self, user_id):
+        self.local.delete(user_id)
+        if self.shared is not None:
+            self.shared.delete(user_id)
+
+
+def init_user_cache(app, shared_client=None):
+    """Crée le cache utilisateurs de l'application (app.extensions['user_cache'])"""
+    ttl = app.config['USER_CACHE_TTL']
+    local = LRUCache(maxsize=app.config['USER_CACHE_SIZE'], ttl=ttl)
+
+    if shared_client is None and app.config.get('USER_CACHE_REDIS_URL'):
+        try:
+            import redis
+        except ImportError:
+            logger.warning('USER_CACHE_REDIS_URL is set but the redis package is not installed')
+        else:
+            shared_client = redis.Redis.from_url(app.config['USER_CACHE_REDIS_URL'])
+
+    shared = SharedCacheBackend(shared_client, ttl=ttl) if shared_client is not None else None
+    cache = UserCache(local, shared, sync_interval=app.config['USER_CACHE_SYNC_INTERVAL'])
+    app.extensions['user_cache'] = cache
+    return cache
@@ -0,0 +1,224 @@
+"""Flux de changements des utilisateurs (synchronisation incrémentale, SSE)"""
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import case, delete, func, insert, or_, select, true, update
+from werkzeug.exceptions import Gone
+
+from src.background import PeriodicThread
+from src.models.user import User, UserChange, UserChangeFloor
+from src.pagination import encode_cursor
+
+CREATE = 'create'
+UPDATE = 'update'
+DELETE = 'delete'
+
+DEFAULT_CHANGES_LIMIT = 500
+MAX_CHANGES_LIMIT = 5000
+
+CURSOR_EXPIRED = 'Cursor is older than the change log retention, sync again without since'
+
+
+def change_rows(op, user_ids):
+    """Paramètres d'INSERT dans user_changes (executemany)"""
+    return [{'user_id': user_id, 'op': op} for user_id in user_ids]
+
+
+def record_changes(session, op, user_ids):
+    """Journalise `op` pour `user_ids` dans la transaction en cours de `session`"""
+    rows = change_rows(op, user_ids)
+    if rows:
+        session.execute(insert(UserChange), rows)
+
+
+def settled(dialect_name):
+    """Vrai pour un changement dont la transaction est terminée (toujours hors PostgreSQL)"""
+    if dialect_name != 'postgresql':
+        return true()
+    return UserChange.txid < func.txid_snapshot_xmin(func.txid_current_snapshot())
+
+
+def changes_statement(since, limit, dialect_name):
+    """Changements après `since` (limit + 1 lignes) avec l'état courant de l'utilisateur"""
+    return (
+        select(UserChange.seq, UserChange.user_id, User.id, User.username, User.email, settled(dialect_name))
+        .outerjoin(User, User.id == UserChange.user_id)
+        .where(UserChange.seq > since)
+        .order_by(UserChange.seq)
+        .limit(limit + 1)
+    )
+
+
+def change_log_statement(since, limit, dialect_name):
+    """(seq, user_id, settled) des changements après `since` (limit + 1 lignes), sans jointure"""
+    return (
+        select(UserChange.seq, UserChange.user_id, settled(dialect_name))
+        .where(UserChange.seq > since)
+        .order_by(UserChange.seq)
+        .limit(limit + 1)
+    )
+
+
+def change_log_head_statement(dialect_name):
+    """Position de départ d'un lecteur du journal : juste avant le premier changement
+    d'une transaction non terminée, sinon le dernier seq (0 si le journal est vide)"""
+    pending = case((~settled(dialect_name), UserChange.seq - 1))
+    return select(func.coalesce(func.min(pending), func.max(UserChange.seq), 0))
+
+
+def change_floor_statement():
+    """Plancher du journal : les changements jusqu'à ce seq ont pu être compactés"""
+    return select(func.coalesce(func.max(UserChangeFloor.seq), 0))
+
+
+def check_cursor(since, floor):
+    """410 Gone si des changements après `since` ont été compactés (sans curseur, la table reste lisible)"""
+    if since and since < floor:
+        raise Gone(CURSOR_EXPIRED)
+
+
+def retention_cutoff(retention):
+    """Date (UTC naïve, comme changed_at) avant laquelle un changement peut être compacté"""
+    return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=retention)
+
+
+def prune_changes(session, before, dialect_name):
+    """Compacte le journal jusqu'au dernier changement terminé antérieur à `before`
+
+    Sous ce plancher ne reste que la dernière ligne de chaque utilisateur
+    existant : une synchronisation sans curseur voit encore toute la table,
+    mais les suppressions sont oubliées, d'où le 410 des curseurs plus
+    anciens. Renvoie (plancher, lignes supprimées) ; le commit revient à l'appelant.
+    """
+    old = select(func.max(UserChange.seq)).where(UserChange.changed_at < before, settled(dialect_name))
+    pending = select(func.min(UserChange.seq) - 1).where(~settled(dialect_name))
+    floor, before_pending = session.execute(select(old.scalar_subquery(), pending.scalar_subquery())).one()
+    if before_pending is not None:
+        floor = min(floor or 0, before_pending)
+    if not floor:
+        return session.execute(change_floor_statement()).scalar(), 0
+
+    latest = select(func.max(UserChange.seq)).group_by(UserChange.user_id)
+    present = select(User.id)
+    result = session.execute(
+        delete(UserChange)
+        .where(UserChange.seq <= floor, or_(UserChange.seq.not_in(latest), UserChange.user_id.not_in(present)))
+        .execution_options(synchronize_session=False)
+    )
+    session.execute(update(UserChangeFloor).where(UserChangeFloor.seq < floor).values(seq=floor))
+    return session.execute(change_floor_statement()).scalar(), result.rowcount
+
+
+def changes_payload(rows, since, limit):
+    """{'changes', 'cursor', 'has_more'} ; un seul élément par utilisateur, son dernier changement
+
+    `op` vaut 'upsert' (avec `user`) si l'utilisateur existe encore, 'delete'
+    sinon : appliquer les éléments dans l'ordre converge vers l'état courant.
+    La page s'arrête avant le premier changement d'une transaction non terminée.
+    """
+    page = rows[:limit]
+    has_more = len(rows) > limit
+    pending = next((index for index, row in enumerate(page) if not row[5]), None)
+    if pending is not None:
+        # La suite attend la fin de cette transaction : le client la relira plus tard
+        page, has_more = page[:pending], False
+    latest = {}
+    for row in page:
+        latest.pop(row[1], None)
+        latest[row[1]] = row
+    changes = []
+    for seq, user_id, present, username, email, _ in latest.values():
+        if present is None:
+            changes.append({'op': 'delete', 'id': user_id})
+        else:
+            user = {'id': user_id, 'username': username, 'email': email}
+            changes.append({'op': 'upsert', 'id': user_id, 'user': user})
+    return {
+        'changes': changes,
+        'cursor': encode_cursor(page[-1][0] if page else since),
+        'has_more': has_more,
+    }
+
+
+def sse_event(payload):
+    """Événement SSE `changes` dont l'id est le curseur atteint"""
+    data = json.dumps(payload, separators=(',', ':'))
+    return f"id: {payload['cursor']}\nevent: changes\ndata: {data}\n\n"
+
+
+class ChangeNotifier:
+    """Réveille les flux SSE du processus après une écriture locale
+
+    Les écritures des autres processus sont vues par sondage, toutes les
+    CHANGE_FEED_POLL_INTERVAL secondes. Le nombre de flux est borné : sous
+    gunicorn (gthread), chaque flux occupe un thread du worker.
+    """
+
+    def __init__(self, max_streams=1):
+        self.max_streams = max_streams
+        self.streams = 0
+        self._generation = 0
+        self._condition = threading.Condition()
+
+    def notify(self):
+        with self._condition:
+            self._generation += 1
+            self._condition.notify_all()
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def wait(self, generation, timeout):
+        """Attend une écriture postérieure à `generation` ; renvoie la génération courante"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._generation != generation, timeout)
+            return self._generation
+
+    def open_stream(self):
+        with self._condition:
+            if self.streams >= self.max_streams:
+                return False
+            self.streams += 1
+            return True
+
+    def close_stream(self):
+        with self._condition:
+            self.streams -= 1
+
+
+class ChangeLogPruner(PeriodicThread):
+    """Compacte le journal toutes les `interval` secondes, dans un thread par processus
+
+    Les changements de plus de `retention` secondes sont compactés ; chaque
+    processus le tente, une passe sans rien à compacter ne supprime rien.
+    """
+
+    def __init__(self, app, db, retention=604800.0, interval=3600.0):
+        super().__init__(self.run_once, interval, name='change-log-pruner')
+        self.app = app
+        self.db = db
+        self.retention = retention
+
+    def run_once(self):
+        with self.app.app_context():
+            session = self.db.session
+            prune_changes(session, retention_cutoff(self.retention), self.db.engine.dialect.name)
+            session.commit()
+
+
+def init_change_feed(app, db):
+    """Crée le notificateur du flux de changements (app.extensions['change_feed'])
+    et le compactage du journal (app.extensions['change_log_pruner'], démarré à la première requête)"""
+    notifier = ChangeNotifier(max_streams=app.config['CHANGE_FEED_MAX_STREAMS'])
+    app.extensions['change_feed'] = notifier
+    pruner = ChangeLogPruner(
+        app, db,
+        retention=app.config['CHANGE_FEED_RETENTION_SECONDS'],
+        interval=app.config['CHANGE_FEED_PRUNE_INTERVAL'],
+    )
+    app.extensions['change_log_pruner'] = pruner
+    if pruner.interval > 0:
+        app.before_request(pruner.ensure_started)
+    return notifier
@@ -0,0 +1,101 @@
+"""Commandes CLI Flask de l'application (flask <commande>)"""
+import os
+import sys
+import tempfile
+
+import click
+from flask.cli import with_appcontext
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@click.command('serve')
+@click.option('--bind', help='Adresse d\'écoute (GUNICORN_BIND, 0.0.0.0:5000 par défaut)')
+@click.option('--workers', type=int, help='Nombre de workers (GUNICORN_WORKERS)')
+@click.option('--threads', type=int, help='Threads par worker (GUNICORN_THREADS)')
+def serve(bind, workers, threads):
+    """Lance le serveur de production (gunicorn, workers pré-forkés)"""
+    overrides = {'GUNICORN_BIND': bind, 'GUNICORN_WORKERS': workers, 'GUNICORN_THREADS': threads}
+    for name, value in overrides.items():
+        if value is not None:
+            os.environ[name] = str(value)
+
+    # Les métriques doivent être agrégées entre workers : le répertoire
+    # multiprocess doit être connu avant que les workers n'importent prometheus_client
+    os.environ.setdefault(
+        'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'prometheus-multiproc')
+    )
+
+    # exec : gunicorn remplace ce processus et reçoit directement SIGTERM
+    os.execvp(sys.executable, [
+        sys.executable, '-m', 'gunicorn',
+        '--config', os.path.join(BACKEND_DIR, 'gunicorn.conf.py'),
+        '--chdir', BACKEND_DIR,
+        'src.wsgi:app',
+    ])
+
+
+@click.command('db-upgrade')
+@click.option('--target', type=int, help='Version maximale à appliquer (toutes par défaut)')
+@with_appcontext
+def db_upgrade(target):
+    """Applique les migrations de schéma en attente"""
+    from src import migrations
+    from src.models.user import db
+
+    applied = migrations.upgrade(db.engine, target=target)
+    for migration in applied:
+        click.echo(f'Applied {migration.version:04d} {migration.name}')
+    if not applied:
+        click.echo('Database schema is up to date')
+
+
+@click.command('db-status')
+@with_appcontext
+def db_status():
+    """Affiche les migrations appliquées et en attente"""
+    from src import migrations
+    from src.models.user import db
+
+    waiting = {migration.version for migration in migrations.pending(db.engine)}
+    for migration in migrations.discover():
+        state = 'pending' if migration.version in waiting else 'applied'
+        click.echo(f'{migration.version:04d} {migration.name} [{state}] {migration.description}')
+
+
+@click.command('stats-reconcile')
+@with_appcontext
+def stats_reconcile():
+    """Recalcule les statistiques des utilisateurs (user_stats) depuis la table users"""
+    from src.models.user import db
+    from src.stats import reconcile
+
+    result = reconcile(db.session)
+    db.session.commit()
+    click.echo(f"Reconciled user stats: {result['total']} users, {result['buckets']} buckets, drift {result['drift']}")
+
+
+@click.command('changes-prune')
+@click.option('--retention', type=float, help='Âge minimal des changements compactés, en secondes '
+              '(CHANGE_FEED_RETENTION_SECONDS par défaut)')
+@with_appcontext
+def changes_prune(retention):
+    """Compacte le journal user_changes (les curseurs plus anciens reçoivent 410 Gone)"""
+    from flask import current_app
+    from src.changes import prune_changes, retention_cutoff
+    from src.models.user import db
+
+    if retention is None:
+        retention = current_app.config['CHANGE_FEED_RETENTION_SECONDS']
+    floor, deleted = prune_changes(db.session, retention_cutoff(retention), db.engine.dialect.name)
+    db.session.commit()
+    click.echo(f'Pruned {deleted} changes, change log floor {floor}')
+
+
+def register_commands(app):
+    """Enregistre les commandes CLI sur l'application"""
+    app.cli.add_command(serve)
+    app.cli.add_command(db_upgrade)
+    app.cli.add_command(db_status)
+    app.cli.add_command(stats_reconcile)
+    app.cli.add_command(changes_prune)
@@ -0,0 +1,61 @@
+"""Configuration du moteur SQLAlchemy (pool de connexions) à partir des variables d'environnement"""
+import os
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+from src.sql_metrics import InstrumentedQueuePool
+
+
+def env_bool(name, default):
+    """Variable d'environnement booléenne (1/true/yes/on)"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def engine_options_from_env(database_url):
+    """Options passées à create_engine via SQLALCHEMY_ENGINE_OPTIONS
+
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING et DB_STATEMENT_TIMEOUT_MS (PostgreSQL uniquement).
+    SQLite garde le pool choisi par Flask-SQLAlchemy. Avec SQL_INSTRUMENTATION
+    (activé par défaut), le pool mesure l'attente au checkout.
+    """
+    if not database_url or database_url.startswith('sqlite'):
+        return {}
+
+    options = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': env_bool('DB_POOL_PRE_PING', True),
+    }
+    if env_bool('SQL_INSTRUMENTATION', True):
+        options['poolclass'] = InstrumentedQueuePool
+
+    statement_timeout = os.environ.get('DB_STATEMENT_TIMEOUT_MS')
+    if statement_timeout and database_url.startswith('postgresql'):
+        options['connect_args'] = {'options': f'-c statement_timeout={int(statement_timeout)}'}
+    return options
+
+
+def create_probe_engine(database_url, timeout):
+    """Moteur des sondes de santé : sans pool (aucune attente de checkout), délais courts
+
+    PostgreSQL : connect_timeout et statement_timeout ; SQLite : attente de verrou.
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() == 'postgresql':
+        connect_args = {
+            'connect_timeout': max(int(timeout), 1),
+            'options': f'-c statement_timeout={int(timeout * 1000)}',
+        }
+    elif url.get_backend_name() == 'sqlite':
+        connect_args = {'timeout': timeout}
+    else:
+        connect_args = {}
+    return create_engine(url, poolclass=NullPool, connect_args=connect_args)
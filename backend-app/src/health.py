@@ -0,0 +1,89 @@
+"""Vérification périodique des dépendances (base de données, ...) en arrière-plan"""
+import logging
+import time
+from collections import namedtuple
+
+from sqlalchemy import text
+
+from src.background import PeriodicThread
+from src.database import create_probe_engine
+from src.metrics import DEPENDENCY_LAST_CHECK, DEPENDENCY_PROBE_LATENCY, DEPENDENCY_UP
+
+logger = logging.getLogger(__name__)
+
+ProbeResult = namedtuple('ProbeResult', ['healthy', 'latency', 'checked_at', 'error'])
+
+
+class HealthChecker(PeriodicThread):
+    """Exécute les sondes enregistrées à intervalle régulier et garde le dernier résultat
+
+    Les sondes tournent dans le thread dès son démarrage : la requête qui le
+    démarre n'attend pas la base.
+    """
+
+    def __init__(self, interval=10.0):
+        super().__init__(self.check_now, interval, name='health-checker', run_first=True)
+        self._probes = {}
+        self._optional = set()
+        self._snapshot = {}
+
+    def add_probe(self, name, probe, critical=True):
+        """Enregistre une sonde : un callable qui lève une exception en cas d'échec
+
+        Une sonde non critique (réplica en lecture, ...) est exportée mais
+        n'intervient pas dans is_ready().
+        """
+        self._probes[name] = probe
+        if not critical:
+            self._optional.add(name)
+
+    def check_now(self):
+        """Exécute toutes les sondes et remplace l'instantané"""
+        snapshot = {}
+        for name, probe in list(self._probes.items()):
+            start = time.perf_counter()
+            try:
+                probe()
+                error = None
+            except Exception as e:
+                logger.warning('Health probe %s failed: %s', name, e)
+                error = str(e)
+            latency = time.perf_counter() - start
+            snapshot[name] = ProbeResult(error is None, latency, time.time(), error)
+
+            DEPENDENCY_UP.labels(dependency=name).set(1 if error is None else 0)
+            DEPENDENCY_PROBE_LATENCY.labels(dependency=name).set(latency)
+            DEPENDENCY_LAST_CHECK.labels(dependency=name).set(snapshot[name].checked_at)
+        self._snapshot = snapshot
+        return snapshot
+
+    def snapshot(self):
+        return self._snapshot
+
+    def is_ready(self):
+        return bool(self._snapshot) and all(
+            result.healthy for name, result in self._snapshot.items() if name not in self._optional
+        )
+
+
+def database_probe(app):
+    """Sonde SELECT 1 sur la base de l'application, par une connexion dédiée à délais courts"""
+    engines = []
+
+    def probe():
+        if not engines:
+            engines.append(create_probe_engine(
+                app.config['SQLALCHEMY_DATABASE_URI'], app.config['HEALTH_PROBE_TIMEOUT']
+            ))
+        with engines[0].connect() as conn:
+            conn.execute(text('SELECT 1'))
+    return probe
+
+
+def init_health_checker(app):
+    """Crée le vérificateur (app.extensions['health']) et le démarre à la première requête"""
+    checker = HealthChecker(interval=app.config['HEALTH_CHECK_INTERVAL'])
+    checker.add_probe('database', database_probe(app))
+    app.extensions['health'] = checker
+    app.before_request(checker.ensure_started)
+    return checker
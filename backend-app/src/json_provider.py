@@ -0,0 +1,60 @@
+"""Fournisseur JSON rapide de l'application (orjson si disponible, json sinon)"""
+import os
+
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider, _default
+
+try:
+    import orjson
+except ImportError:  # dépendance optionnelle
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """DefaultJSONProvider accéléré par orjson, octet pour octet compatible"""
+
+    if orjson is not None:
+        OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+    def dumps_bytes(self, obj):
+        """Sérialise `obj` en octets compacts, comme dumps() avec separators=(',', ':')"""
+        try:
+            data = orjson.dumps(obj, default=_default, option=self.OPTIONS)
+        except TypeError:
+            data = None
+        if data is None or not data.isascii() or b'\x7f' in data:
+            return super().dumps(obj, separators=(',', ':')).encode()
+        return data
+
+    def dumps(self, obj, **kwargs):
+        if kwargs and kwargs != {'separators': (',', ':')}:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
+
+
+def rows_response(rows, fields):
+    """Réponse JSON directement depuis des lignes projetées, sans objets ORM
+
+    `rows` sont des tuples dont les premières colonnes suivent `fields` ;
+    le résultat est identique à jsonify([user.to_dict() ...]) projeté sur `fields`.
+    """
+    return current_app.json.response([dict(zip(fields, row)) for row in rows])
+
+
+def init_json_provider(app):
+    """Sélectionne le fournisseur JSON (JSON_PROVIDER=orjson|stdlib, orjson par défaut)"""
+    choice = os.environ.get('JSON_PROVIDER', 'orjson')
+    if choice == 'orjson' and orjson is not None:
+        app.json = OrjsonProvider(app)
+    return app.json
@@ -1,12 +1,26 @@
 import os
 import sys
 from dotenv import load_dotenv
-from flask import Flask, jsonify
+from flask import Flask, abort, jsonify
 from flask_cors import CORS
-from prometheus_flask_exporter import PrometheusMetrics
-
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from src import migrations
+from src.admission import init_admission_control, parse_route_limits
+from src.cache import init_user_cache
+from src.changes import init_change_feed
+from src.commands import register_commands
+from src.database import engine_options_from_env, env_bool
+from src.health import init_health_checker
+from src.json_provider import init_json_provider
+from src.metrics import init_metrics
+from src.replicas import init_replicas
+from src.sql_metrics import init_sql_instrumentation
+from src.stats import init_user_stats
 from src.models.user import db
+from src.routes.stats import stats_bp
 from src.routes.user import user_bp
+from src.static_index import StaticIndex, static_response
 
 # Ajout du répertoire parent dans sys.path (ne pas modifier)
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
@@ -18,6 +32,9 @@ def create_app():
     """Factory de création de l'application Flask"""
     app = Flask(__name__)
 
+    # Sérialisation JSON rapide (orjson si installé)
+    init_json_provider(app)
+
     # Sécurité : forcer la présence d'une clé secrète en variable d'env
     if not os.environ.get("SECRET_KEY"):
         raise RuntimeError("SECRET_KEY must be set in environment variables.")
@@ -26,32 +43,144 @@ def create_app():
     # Configuration PostgreSQL (au lieu de SQLite)
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URL")
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options_from_env(app.config['SQLALCHEMY_DATABASE_URI'])
+
+    # Réplicas en lecture (optionnels, URLs séparées par des virgules) : équilibrage
+    # round_robin ou least_connections, fenêtre de lecture sur le primaire après une
+    # écriture et décalage maximal toléré (secondes)
+    app.config['DB_REPLICA_URLS'] = [
+        url.strip() for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(',') if url.strip()
+    ]
+    app.config['DB_REPLICA_BALANCING'] = os.environ.get("DB_REPLICA_BALANCING", "round_robin")
+    app.config['DB_REPLICA_STICKY_SECONDS'] = float(os.environ.get("DB_REPLICA_STICKY_SECONDS", 5))
+    app.config['DB_REPLICA_MAX_LAG_SECONDS'] = float(os.environ.get("DB_REPLICA_MAX_LAG_SECONDS", 10))
+
+    # Taille des lots pour l'import en masse (POST /api/users:batch)
+    app.config['USER_IMPORT_BATCH_SIZE'] = int(os.environ.get("USER_IMPORT_BATCH_SIZE", 1000))
+
+    # Cache des utilisateurs (TTL en secondes, 0 pour désactiver). Une écriture purge
+    # le cache de son worker ; les autres workers la voient au plus
+    # USER_CACHE_SYNC_INTERVAL secondes plus tard (relecture du journal user_changes)
+    app.config['USER_CACHE_TTL'] = float(os.environ.get("USER_CACHE_TTL", 30))
+    app.config['USER_CACHE_SYNC_INTERVAL'] = float(os.environ.get("USER_CACHE_SYNC_INTERVAL", 1))
+    app.config['USER_CACHE_SIZE'] = int(os.environ.get("USER_CACHE_SIZE", 10000))
+    app.config['USER_CACHE_REDIS_URL'] = os.environ.get("USER_CACHE_REDIS_URL")
+
+    # PUT /api/users/<id> sans If-Match refusé (428) si activé
+    app.config['USER_UPDATE_REQUIRE_IF_MATCH'] = env_bool("USER_UPDATE_REQUIRE_IF_MATCH", False)
+
+    # Intervalle (secondes) entre deux vérifications des dépendances
+    app.config['HEALTH_CHECK_INTERVAL'] = float(os.environ.get("HEALTH_CHECK_INTERVAL", 10))
+    # Délai max (secondes) de connexion et de requête d'une sonde
+    app.config['HEALTH_PROBE_TIMEOUT'] = float(os.environ.get("HEALTH_PROBE_TIMEOUT", 2))
+
+    # Instrumentation SQL (requêtes par endpoint, requêtes lentes en ms, seuil N+1)
+    app.config['SQL_INSTRUMENTATION'] = env_bool("SQL_INSTRUMENTATION", True)
+    app.config['SQL_SLOW_QUERY_MS'] = float(os.environ.get("SQL_SLOW_QUERY_MS", 200))
+    app.config['SQL_REPEATED_QUERY_THRESHOLD'] = int(os.environ.get("SQL_REPEATED_QUERY_THRESHOLD", 5))
+
+    # Contrôle d'admission : places simultanées (0 = illimité), attente max en file,
+    # requêtes en attente (vide = illimité ; sous gunicorn, le reste du budget de threads),
+    # débit par client (requêtes/s, 0 = désactivé) ; les chemins exemptés passent toujours
+    app.config['ADMISSION_CONTROL'] = env_bool("ADMISSION_CONTROL", True)
+    app.config['ADMISSION_MAX_INFLIGHT'] = int(os.environ.get("ADMISSION_MAX_INFLIGHT", 0))
+    app.config['ADMISSION_ROUTE_LIMITS'] = parse_route_limits(os.environ.get("ADMISSION_ROUTE_LIMITS"))
+    app.config['ADMISSION_QUEUE_TIMEOUT_MS'] = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT_MS", 250))
+    max_queue = os.environ.get("ADMISSION_MAX_QUEUE")
+    app.config['ADMISSION_MAX_QUEUE'] = int(max_queue) if max_queue else None
+    app.config['ADMISSION_RATE_LIMIT'] = float(os.environ.get("ADMISSION_RATE_LIMIT", 0))
+    rate_burst = os.environ.get("ADMISSION_RATE_BURST")
+    app.config['ADMISSION_RATE_BURST'] = float(rate_burst) if rate_burst else None
+    app.config['ADMISSION_RATE_KEY'] = os.environ.get("ADMISSION_RATE_KEY", "client")
+    # Proxys de confiance devant l'application (Traefik : 1) : l'adresse du client est
+    # prise à cette profondeur dans X-Forwarded-For ; 0 = adresse de la connexion
+    app.config['TRUSTED_PROXY_HOPS'] = int(os.environ.get("TRUSTED_PROXY_HOPS", 0))
+    app.config['ADMISSION_EXEMPT_PATHS'] = os.environ.get(
+        "ADMISSION_EXEMPT_PATHS", "/health,/metrics,/api/status,/api/users/changes/stream"
+    ).split(',')
+
+    # Flux SSE des changements : flux simultanés par processus, sondage et
+    # keepalive (secondes), durée max d'un flux avant reconnexion du client
+    app.config['CHANGE_FEED_MAX_STREAMS'] = int(os.environ.get("CHANGE_FEED_MAX_STREAMS", 1))
+    app.config['CHANGE_FEED_POLL_INTERVAL'] = float(os.environ.get("CHANGE_FEED_POLL_INTERVAL", 1))
+    app.config['CHANGE_FEED_HEARTBEAT'] = float(os.environ.get("CHANGE_FEED_HEARTBEAT", 15))
+    app.config['CHANGE_FEED_STREAM_SECONDS'] = float(os.environ.get("CHANGE_FEED_STREAM_SECONDS", 300))
+    # Compactage du journal user_changes : âge minimal des changements compactés et
+    # intervalle entre deux passes (secondes, 0 pour désactiver ; flask changes-prune sinon)
+    app.config['CHANGE_FEED_RETENTION_SECONDS'] = float(os.environ.get("CHANGE_FEED_RETENTION_SECONDS", 604800))
+    app.config['CHANGE_FEED_PRUNE_INTERVAL'] = float(os.environ.get("CHANGE_FEED_PRUNE_INTERVAL", 3600))
+
+    # Agrégats user_stats : rafraîchissement des jauges et recalcul complet depuis
+    # users (secondes, 0 pour désactiver ; le recalcul reste possible par flask stats-reconcile)
+    app.config['USER_STATS_REFRESH_SECONDS'] = float(os.environ.get("USER_STATS_REFRESH_SECONDS", 15))
+    app.config['USER_STATS_RECONCILE_SECONDS'] = float(os.environ.get("USER_STATS_RECONCILE_SECONDS", 3600))
+
+    if app.config['TRUSTED_PROXY_HOPS'] > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_HOPS'])
 
     # Initialisation Prometheus
-    PrometheusMetrics(app)
+    init_metrics(app)
+
+    # Délestage avant tout accès à la base (les refus restent comptés par /metrics)
+    init_admission_control(app)
+
+    # Cache read-through devant PostgreSQL pour GET /api/users/<id>
+    init_user_cache(app)
+
+    # Réveil des flux /api/users/changes/stream après chaque écriture, compactage du journal
+    init_change_feed(app, db)
 
     # Activer CORS
     CORS(app)
 
     # Initialisation de la base de données
     db.init_app(app)
+    init_sql_instrumentation(app, db)
+
+    # Sondes de santé en arrière-plan (servies par /health et /api/status)
+    health_checker = init_health_checker(app)
+
+    # Routage des lectures vers les réplicas, sondés par le même vérificateur
+    init_replicas(app, health_checker)
+
+    # Jauges des statistiques utilisateurs et recalcul périodique
+    init_user_stats(app, db)
+
+    # Commandes CLI (flask serve)
+    register_commands(app)
 
     # Enregistrement des routes
     app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(stats_bp, url_prefix='/api')
+
+    # Index du frontend compilé, construit une fois au démarrage
+    static_index = StaticIndex(app.static_folder)
 
     # === ROUTES DE L'APPLICATION ===
 
     @app.route('/api/status')
     def status():
-        """Statut de l'application"""
+        """Statut de l'application (readiness), depuis le dernier instantané des sondes"""
+        snapshot = health_checker.snapshot()
+        database = snapshot.get('database')
+        ready = health_checker.is_ready()
         return jsonify({
-            'status': 'operational',
+            'status': 'operational' if ready else 'degraded',
             'services': {
-                'database': 'connected',
+                'database': 'connected' if database and database.healthy else 'disconnected',
                 'api': 'running',
                 'version': '1.0.0'
+            },
+            'checks': {
+                name: {
+                    'healthy': result.healthy,
+                    'latency_ms': round(result.latency * 1000, 3),
+                    'checked_at': result.checked_at,
+                    'error': result.error
+                }
+                for name, result in snapshot.items()
             }
-        })
+        }), 200 if ready else 503
 
     @app.route('/api/infrastructure')
     def infrastructure():
@@ -77,14 +206,36 @@ def create_app():
 
     @app.route('/health')
     def health():
-        """Healthcheck pour Docker"""
+        """Healthcheck pour Docker (liveness) : le processus et ses sondes tournent"""
+        if not health_checker.is_alive():
+            return jsonify({"status": "unhealthy"}), 503
         return jsonify({"status": "healthy"}), 200
 
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        """Sert le frontend (SPA) et renvoie index.html pour les routes côté client"""
+        nonlocal static_index
+        static_folder = app.static_folder
+        if static_folder is None:
+            return "Static folder not configured", 404
+        if static_index.root != static_folder:
+            static_index = StaticIndex(static_folder)
+
+        entry = static_index.get(path) if path else None
+        if entry is None and path.startswith('api/'):
+            abort(404)
+        if entry is None:
+            entry = static_index.get('index.html')
+        if entry is None:
+            return "index.html not found", 404
+        return static_response(entry)
+
     return app
 
 # Point d'entrée pour le lancement local
 if __name__ == '__main__':  # pragma: no cover
     app = create_app()
     with app.app_context():
-        db.create_all()
+        migrations.upgrade(db.engine)
     app.run(host='0.0.0.0', port=5000, debug=True)
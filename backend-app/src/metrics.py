@@ -0,0 +1,119 @@
+"""Métriques Prometheus de l'application"""
+import os
+
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_flask_exporter import PrometheusMetrics
+from prometheus_flask_exporter.multiprocess import GunicornInternalPrometheusMetrics
+
+# En mode multiprocess, chaque métrique ouvre son fichier dès sa création
+if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+USER_CACHE_HITS = Counter(
+    'backend_user_cache_hits_total', 'User cache hits', ['tier']
+)
+USER_CACHE_MISSES = Counter(
+    'backend_user_cache_misses_total', 'User cache misses'
+)
+USER_CACHE_EVICTIONS = Counter(
+    'backend_user_cache_evictions_total', 'User cache evictions', ['reason']
+)
+
+DEPENDENCY_UP = Gauge(
+    'backend_dependency_up', 'Last health probe result (1 = up)', ['dependency'],
+    multiprocess_mode='livemin'
+)
+DEPENDENCY_PROBE_LATENCY = Gauge(
+    'backend_dependency_probe_latency_seconds', 'Last health probe latency', ['dependency'],
+    multiprocess_mode='livemax'
+)
+DEPENDENCY_LAST_CHECK = Gauge(
+    'backend_dependency_last_check_timestamp_seconds', 'Time of the last health probe', ['dependency'],
+    multiprocess_mode='livemax'
+)
+
+SQL_QUERIES_PER_REQUEST = Histogram(
+    'backend_sql_queries_per_request', 'SQL statements executed per request', ['endpoint'],
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100)
+)
+SQL_TIME_PER_REQUEST = Histogram(
+    'backend_sql_time_per_request_seconds', 'Total SQL time per request', ['endpoint']
+)
+SQL_SLOW_QUERIES = Counter(
+    'backend_sql_slow_queries_total', 'SQL statements slower than SQL_SLOW_QUERY_MS', ['endpoint']
+)
+SQL_REPEATED_STATEMENTS = Counter(
+    'backend_sql_repeated_statements_total', 'Statements repeated within a request (possible N+1)', ['endpoint']
+)
+
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    'backend_db_pool_checkout_wait_seconds', 'Time spent obtaining a pooled connection', ['pool'],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    'backend_db_pool_checked_out', 'Connections currently checked out', ['pool'],
+    multiprocess_mode='livesum'
+)
+DB_POOL_OVERFLOW = Gauge(
+    'backend_db_pool_overflow', 'Connections open beyond pool_size', ['pool'],
+    multiprocess_mode='livesum'
+)
+DB_POOL_SIZE = Gauge(
+    'backend_db_pool_size', 'Configured pool_size', ['pool'],
+    multiprocess_mode='livesum'
+)
+
+ADMISSION_ADMITTED = Counter(
+    'backend_admission_admitted_total', 'Requests admitted by admission control', ['route']
+)
+ADMISSION_SHED = Counter(
+    'backend_admission_shed_total', 'Requests rejected by admission control', ['route', 'reason']
+)
+ADMISSION_QUEUE_WAIT = Histogram(
+    'backend_admission_queue_wait_seconds', 'Time spent waiting for a concurrency slot', ['route'],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    'backend_admission_in_flight', 'Admitted requests currently being served', ['route'],
+    multiprocess_mode='livesum'
+)
+
+DB_REPLICA_LAG = Gauge(
+    'backend_db_replica_lag_seconds', 'Replication lag measured by the last replica probe', ['replica'],
+    multiprocess_mode='livemax'
+)
+DB_READ_ROUTING = Counter(
+    'backend_db_read_routing_total', 'Requests whose reads were routed to each database', ['target']
+)
+
+# Agrégats user_stats : chaque processus exporte sa dernière lecture, la plus récente l'emporte
+USERS_TOTAL = Gauge(
+    'backend_users_total', 'Users counted by the user_stats aggregates',
+    multiprocess_mode='mostrecent'
+)
+USER_SIGNUPS = Gauge(
+    'backend_user_signups', 'Signups in the current UTC day / hour', ['period'],
+    multiprocess_mode='mostrecent'
+)
+USER_STATS_DRIFT = Gauge(
+    'backend_user_stats_drift', 'Total users corrected by the last stats reconcile',
+    multiprocess_mode='mostrecent'
+)
+USER_STATS_RECONCILED = Gauge(
+    'backend_user_stats_last_reconcile_timestamp_seconds', 'Time of the last stats reconcile',
+    multiprocess_mode='mostrecent'
+)
+
+
+def init_metrics(app):
+    """Initialise l'exporteur Prometheus et le rend accessible via app.extensions
+
+    Sous gunicorn (PROMETHEUS_MULTIPROC_DIR défini), /metrics agrège les
+    valeurs de tous les workers.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        metrics = GunicornInternalPrometheusMetrics(app)
+    else:
+        metrics = PrometheusMetrics(app)
+    app.extensions['metrics'] = metrics
+    return metrics
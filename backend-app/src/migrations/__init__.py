@@ -0,0 +1,75 @@
+"""Migrations de schéma versionnées
+
+Chaque module `vNNNN_<nom>.py` de ce paquet est une migration : sa docstring
+la décrit et sa fonction `upgrade(conn)` l'applique. Les versions appliquées
+sont enregistrées dans la table `schema_migrations`. Chaque migration tourne
+dans sa propre transaction ; sur PostgreSQL un verrou consultatif évite que
+deux réplicas migrent en même temps.
+
+Usage : flask db-upgrade / flask db-status
+"""
+import importlib
+import pkgutil
+import re
+from collections import namedtuple
+
+from sqlalchemy import text
+
+MIGRATIONS_TABLE = 'schema_migrations'
+ADVISORY_LOCK_ID = 7_351_902_114
+
+Migration = namedtuple('Migration', ['version', 'name', 'description', 'upgrade'])
+
+_MODULE_NAME = re.compile(r'^v(\d{4})_(\w+)$')
+
+
+def discover():
+    """Liste des migrations du paquet, triées par version"""
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        match = _MODULE_NAME.match(module_info.name)
+        if not match:
+            continue
+        module = importlib.import_module(f'{__name__}.{module_info.name}')
+        description = (module.__doc__ or '').strip().splitlines()[0] if module.__doc__ else ''
+        migrations.append(Migration(int(match.group(1)), match.group(2), description, module.upgrade))
+    return sorted(migrations, key=lambda migration: migration.version)
+
+
+def _ensure_table(conn):
+    conn.execute(text(
+        f'CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} ('
+        'version INTEGER PRIMARY KEY, name VARCHAR(255) NOT NULL, '
+        'applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)'
+    ))
+
+
+def applied_versions(conn):
+    _ensure_table(conn)
+    return {row[0] for row in conn.execute(text(f'SELECT version FROM {MIGRATIONS_TABLE}'))}
+
+
+def pending(engine):
+    with engine.begin() as conn:
+        applied = applied_versions(conn)
+    return [migration for migration in discover() if migration.version not in applied]
+
+
+def upgrade(engine, target=None):
+    """Applique les migrations en attente (jusqu'à `target` inclus) et renvoie celles appliquées"""
+    applied_now = []
+    for migration in discover():
+        if target is not None and migration.version > target:
+            break
+        with engine.begin() as conn:
+            if conn.dialect.name == 'postgresql':
+                conn.execute(text('SELECT pg_advisory_xact_lock(:id)'), {'id': ADVISORY_LOCK_ID})
+            if migration.version in applied_versions(conn):
+                continue
+            migration.upgrade(conn)
+            conn.execute(
+                text(f'INSERT INTO {MIGRATIONS_TABLE} (version, name) VALUES (:version, :name)'),
+                {'version': migration.version, 'name': migration.name},
+            )
+        applied_now.append(migration)
+    return applied_now
@@ -0,0 +1,34 @@
+"""Table users conforme à postgres/init/init.sql (+ reprise de l'ancienne table "user")
+
+Les bases créées par db.create_all() avant cette migration ont une table
+"user" (nom par défaut de Flask-SQLAlchemy) sans created_at ; celles créées
+par init.sql ont une table users. On converge vers users et on reprend les
+lignes de l'ancienne table sans la supprimer.
+"""
+from sqlalchemy import inspect, text
+
+
+def upgrade(conn):
+    postgres = conn.dialect.name == 'postgresql'
+    id_column = 'id SERIAL PRIMARY KEY' if postgres else 'id INTEGER PRIMARY KEY AUTOINCREMENT'
+    conn.execute(text(
+        f'CREATE TABLE IF NOT EXISTS users ({id_column}, '
+        'username VARCHAR(100) NOT NULL, '
+        'email VARCHAR(255) UNIQUE NOT NULL, '
+        'created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)'
+    ))
+
+    inspector = inspect(conn)
+    columns = {column['name'] for column in inspector.get_columns('users')}
+    if 'created_at' not in columns:
+        # SQLite refuse un défaut non constant dans ALTER TABLE ADD COLUMN
+        default = ' DEFAULT CURRENT_TIMESTAMP' if postgres else ''
+        conn.execute(text(f'ALTER TABLE users ADD COLUMN created_at TIMESTAMP{default}'))
+
+    if 'user' in inspector.get_table_names():
+        if conn.execute(text('SELECT COUNT(*) FROM users')).scalar() == 0:
+            conn.execute(text('INSERT INTO users (id, username, email) SELECT id, username, email FROM "user"'))
+            if postgres:
+                conn.execute(text(
+                    "SELECT setval(pg_get_serial_sequence('users', 'id'), COALESCE(MAX(id), 1)) FROM users"
+                ))
@@ -0,0 +1,11 @@
+"""Unicité : username (comme le modèle) et email insensible à la casse
+
+Échoue si des doublons existent déjà : ils doivent être résolus à la main
+plutôt que supprimés silencieusement.
+"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    conn.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS uq_users_username ON users (username)'))
+    conn.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email_lower ON users (lower(email))'))
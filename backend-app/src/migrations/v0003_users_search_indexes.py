@@ -0,0 +1,28 @@
+"""Index de recherche par préfixe (et trigrammes sur PostgreSQL) sur username et email
+
+PostgreSQL : text_pattern_ops pour LIKE 'abc%' quelle que soit la collation,
+pg_trgm (GIN) pour les recherches par sous-chaîne. SQLite : index sur
+lower(...), utilisé par les requêtes par intervalle de /api/users/search
+(l'index unique ix_users_email_lower couvre déjà l'email).
+"""
+from sqlalchemy import text
+
+
+def upgrade(conn):
+    if conn.dialect.name != 'postgresql':
+        conn.execute(text('CREATE INDEX IF NOT EXISTS ix_users_username_prefix ON users (lower(username))'))
+        return
+
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_users_username_prefix ON users (lower(username) text_pattern_ops)'
+    ))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_users_email_prefix ON users (lower(email) text_pattern_ops)'
+    ))
+    conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_users_username_trgm ON users USING gin (lower(username) gin_trgm_ops)'
+    ))
+    conn.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_users_email_trgm ON users USING gin (lower(email) gin_trgm_ops)'
+    ))
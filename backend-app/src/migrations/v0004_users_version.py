@@ -0,0 +1,8 @@
+"""Colonne version des utilisateurs (verrouillage optimiste, ETag)"""
+from sqlalchemy import inspect, text
+
+
+def upgrade(conn):
+    columns = {column['name'] for column in inspect(conn).get_columns('users')}
+    if 'version' not in columns:
+        conn.execute(text('ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 1'))
@@ -0,0 +1,43 @@
+"""Flux de changements : users.updated_at et journal user_changes
+
+Le journal est amorcé avec une création par utilisateur existant, pour qu'un
+client qui synchronise depuis le début (sans curseur) reçoive toute la table.
+Sur PostgreSQL, txid reçoit l'identifiant de la transaction d'écriture : le
+flux ne lit que les transactions terminées (voir src/changes.py).
+"""
+from sqlalchemy import inspect, text
+
+
+def upgrade(conn):
+    postgres = conn.dialect.name == 'postgresql'
+    inspector = inspect(conn)
+
+    columns = {column['name'] for column in inspector.get_columns('users')}
+    if 'updated_at' not in columns:
+        # Sans défaut à l'ajout (SQLite refuse un défaut non constant), puis reprise de created_at
+        conn.execute(text('ALTER TABLE users ADD COLUMN updated_at TIMESTAMP'))
+        conn.execute(text('UPDATE users SET updated_at = created_at'))
+        if postgres:
+            conn.execute(text('ALTER TABLE users ALTER COLUMN updated_at SET DEFAULT now()'))
+
+    if 'user_changes' in inspector.get_table_names():
+        return
+    if postgres:
+        conn.execute(text(
+            'CREATE TABLE user_changes ('
+            'seq BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY, '
+            'user_id INTEGER NOT NULL, '
+            'op VARCHAR(10) NOT NULL, '
+            'changed_at TIMESTAMP DEFAULT now(), '
+            'txid BIGINT DEFAULT txid_current())'
+        ))
+    else:
+        conn.execute(text(
+            'CREATE TABLE user_changes ('
+            'seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'user_id INTEGER NOT NULL, '
+            'op VARCHAR(10) NOT NULL, '
+            'changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, '
+            'txid BIGINT)'
+        ))
+    conn.execute(text("INSERT INTO user_changes (user_id, op) SELECT id, 'create' FROM users ORDER BY id"))
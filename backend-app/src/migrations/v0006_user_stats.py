@@ -0,0 +1,36 @@
+"""Agrégats des utilisateurs : table user_stats (total, inscriptions par jour et par heure)
+
+La table est remplie depuis users : le total, puis un compteur par heure et
+par jour de created_at. Sous SQLite, les périodes sont écrites au format de
+stockage des DateTime de SQLAlchemy, pour que les UPSERT de l'application
+retrouvent les mêmes clés.
+"""
+from sqlalchemy import inspect, text
+
+
+def upgrade(conn):
+    if 'user_stats' in inspect(conn).get_table_names():
+        return
+    conn.execute(text(
+        'CREATE TABLE user_stats ('
+        'granularity VARCHAR(10) NOT NULL, '
+        'period TIMESTAMP NOT NULL, '
+        'users BIGINT NOT NULL DEFAULT 0, '
+        'PRIMARY KEY (granularity, period))'
+    ))
+
+    if conn.dialect.name == 'postgresql':
+        buckets = {'hour': "date_trunc('hour', created_at)", 'day': "date_trunc('day', created_at)"}
+        epoch = "TIMESTAMP '1970-01-01 00:00:00'"
+    else:
+        buckets = {
+            'hour': "strftime('%Y-%m-%d %H:00:00.000000', created_at)",
+            'day': "strftime('%Y-%m-%d 00:00:00.000000', created_at)",
+        }
+        epoch = "'1970-01-01 00:00:00.000000'"
+    conn.execute(text(f"INSERT INTO user_stats (granularity, period, users) SELECT 'total', {epoch}, COUNT(*) FROM users"))
+    for granularity, bucket in buckets.items():
+        conn.execute(text(
+            f"INSERT INTO user_stats (granularity, period, users) "
+            f"SELECT '{granularity}', {bucket}, COUNT(*) FROM users WHERE created_at IS NOT NULL GROUP BY {bucket}"
+        ))
@@ -0,0 +1,52 @@
+"""SQLite : users.id en AUTOINCREMENT, pour ne jamais réattribuer l'id d'un utilisateur supprimé
+
+Sans AUTOINCREMENT, SQLite reprend MAX(id) + 1 : un utilisateur créé après la
+suppression du dernier hériterait de son ETag, de ses entrées de cache et de
+son historique dans user_changes. La table est reconstruite (colonnes,
+contraintes d'unicité et index conservés) et le compteur part du plus grand
+id connu, y compris ceux des utilisateurs supprimés encore présents dans le
+journal. PostgreSQL (SERIAL) n'est pas concerné.
+"""
+from sqlalchemy import inspect, text
+
+
+def upgrade(conn):
+    if conn.dialect.name != 'sqlite':
+        return
+    table_sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'users'")).scalar()
+    if table_sql is None or 'AUTOINCREMENT' in table_sql.upper():
+        return
+
+    columns = conn.execute(text("PRAGMA table_info('users')")).all()
+    definitions = []
+    for _, name, type_, notnull, default, pk in columns:
+        definition = f'{name} {type_}'
+        if pk:
+            definition += ' PRIMARY KEY AUTOINCREMENT'
+        elif notnull:
+            definition += ' NOT NULL'
+        if default is not None:
+            definition += f' DEFAULT {default}'
+        definitions.append(definition)
+    # Contraintes UNIQUE de colonne (index sqlite_autoindex_*, sans SQL à rejouer)
+    for _, index_name, _, origin, _ in conn.execute(text("PRAGMA index_list('users')")).all():
+        if origin == 'u':
+            indexed = [row[2] for row in conn.execute(text(f"PRAGMA index_info('{index_name}')"))]
+            definitions.append(f"UNIQUE ({', '.join(indexed)})")
+    indexes = conn.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'users' AND sql IS NOT NULL"
+    )).scalars().all()
+
+    names = ', '.join(column[1] for column in columns)
+    conn.execute(text(f"CREATE TABLE users_autoincrement ({', '.join(definitions)})"))
+    conn.execute(text(f'INSERT INTO users_autoincrement ({names}) SELECT {names} FROM users'))
+    conn.execute(text('DROP TABLE users'))
+    conn.execute(text('ALTER TABLE users_autoincrement RENAME TO users'))
+    for index_sql in indexes:
+        conn.execute(text(index_sql))
+
+    floor = conn.execute(text('SELECT COALESCE(MAX(id), 0) FROM users')).scalar()
+    if 'user_changes' in inspect(conn).get_table_names():
+        floor = max(floor, conn.execute(text('SELECT COALESCE(MAX(user_id), 0) FROM user_changes')).scalar())
+    conn.execute(text("DELETE FROM sqlite_sequence WHERE name = 'users'"))
+    conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('users', :seq)"), {'seq': floor})
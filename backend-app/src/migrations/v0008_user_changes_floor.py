@@ -0,0 +1,14 @@
+"""Plancher du journal user_changes (table user_changes_floor, une ligne)
+
+Le compactage du journal (flask changes-prune, ou le thread de
+CHANGE_FEED_PRUNE_INTERVAL) y enregistre le dernier seq compacté : un curseur
+plus ancien reçoit 410 Gone. Le plancher part de 0, rien n'est encore compacté.
+"""
+from sqlalchemy import inspect, text
+
+
+def upgrade(conn):
+    if 'user_changes_floor' in inspect(conn).get_table_names():
+        return
+    conn.execute(text('CREATE TABLE user_changes_floor (id INTEGER PRIMARY KEY, seq BIGINT NOT NULL DEFAULT 0)'))
+    conn.execute(text('INSERT INTO user_changes_floor (id, seq) VALUES (1, 0)'))
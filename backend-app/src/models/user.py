@@ -1,11 +1,30 @@
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from src.replicas import RoutingSession
+
+# RoutingSession : les lectures des requêtes GET peuvent aller sur un réplica (src/replicas.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
+    # Schéma aligné sur postgres/init/init.sql, géré par src/migrations
+    __tablename__ = 'users'
+
     id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
+    username = db.Column(db.String(100), nullable=False)
+    email = db.Column(db.String(255), unique=True, nullable=False)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    # Renseignée par SQLAlchemy à chaque INSERT / UPDATE (y compris les UPDATE Core)
+    updated_at = db.Column(db.DateTime, default=db.func.now(), onupdate=db.func.now())
+    # Incrémentée à chaque mise à jour : sert d'ETag et de verrou optimiste (If-Match)
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+
+    __table_args__ = (
+        db.Index('uq_users_username', 'username', unique=True),
+        db.Index('ix_users_email_lower', db.func.lower(email), unique=True),
+        db.Index('ix_users_username_prefix', db.func.lower(username)),
+        # Comme l'identité PostgreSQL : SQLite ne réattribue pas l'id d'un utilisateur supprimé
+        {'sqlite_autoincrement': True},
+    )
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -16,3 +35,61 @@ class User(db.Model):
             'username': self.username,
             'email': self.email
         }
+
+
+class UserChange(db.Model):
+    # Journal des modifications des utilisateurs (flux /api/users/changes, voir src/changes.py),
+    # écrit dans la transaction de la modification ; seq croissant sert de curseur
+    __tablename__ = 'user_changes'
+
+    seq = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)
+    changed_at = db.Column(db.DateTime, server_default=db.func.now())
+    # PostgreSQL : txid_current() de la transaction d'écriture (défaut posé par la
+    # migration v0005, ou par l'événement after_create ci-dessous avec create_all)
+    txid = db.Column(db.BigInteger)
+
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    def __repr__(self):
+        return f'<UserChange {self.seq} {self.op} {self.user_id}>'
+
+
+db.event.listen(
+    UserChange.__table__,
+    'after_create',
+    db.DDL('ALTER TABLE user_changes ALTER COLUMN txid SET DEFAULT txid_current()').execute_if(dialect='postgresql'),
+)
+
+
+class UserChangeFloor(db.Model):
+    # Plancher du journal user_changes (une seule ligne, voir prune_changes dans src/changes.py) :
+    # les changements jusqu'à ce seq ont pu être compactés
+    __tablename__ = 'user_changes_floor'
+
+    id = db.Column(db.Integer, primary_key=True)
+    seq = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<UserChangeFloor {self.seq}>'
+
+
+db.event.listen(
+    UserChangeFloor.__table__,
+    'after_create',
+    db.DDL('INSERT INTO user_changes_floor (id, seq) VALUES (1, 0)'),
+)
+
+
+class UserStat(db.Model):
+    # Agrégats des utilisateurs (GET /api/stats/users, voir src/stats.py) : total,
+    # inscriptions par jour et par heure, tenus à jour dans la transaction de chaque écriture
+    __tablename__ = 'user_stats'
+
+    granularity = db.Column(db.String(10), primary_key=True)
+    period = db.Column(db.DateTime, primary_key=True)
+    users = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<UserStat {self.granularity} {self.period} {self.users}>'
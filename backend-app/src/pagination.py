@@ -0,0 +1,55 @@
+"""Pagination par curseur (keyset) pour les endpoints de liste"""
+import base64
+import json
+
+from flask import request, url_for
+from werkzeug.exceptions import BadRequest
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Plus grande valeur d'un BIGINT : au-delà, le driver lève OverflowError
+MAX_ID = 2 ** 63 - 1
+
+
+def encode_cursor(last_id):
+    """Encode la dernière clé vue en curseur opaque"""
+    raw = json.dumps({'id': last_id}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor):
+    """Décode un curseur opaque, ou renvoie None s'il est absent"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))['id']
+    except (ValueError, TypeError, KeyError):
+        raise BadRequest('Invalid cursor')
+    if not isinstance(last_id, int) or isinstance(last_id, bool) or not 0 <= last_id <= MAX_ID:
+        raise BadRequest('Invalid cursor')
+    return last_id
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE, name='limit'):
+    """Valide un paramètre de taille (`limit` par défaut) et le borne à `maximum`"""
+    if value is None or value == '':
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise BadRequest(f'{name} must be an integer')
+    if limit < 1:
+        raise BadRequest(f'{name} must be positive')
+    return min(limit, maximum)
+
+
+def set_next_page(response, last_id):
+    """Ajoute les en-têtes `Link` et `X-Next-Cursor` vers la page suivante"""
+    cursor = encode_cursor(last_id)
+    args = request.args.to_dict()
+    args['after'] = cursor
+    next_url = url_for(request.endpoint, **request.view_args, **args)
+    response.headers['Link'] = f'<{next_url}>; rel="next"'
+    response.headers['X-Next-Cursor'] = cursor
+    return response
@@ -0,0 +1,188 @@
+"""Répartition lecture / écriture : réplicas en lecture, routage par session, décalage"""
+import itertools
+import logging
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.sql import Select
+
+from src.database import create_probe_engine, engine_options_from_env
+from src.metrics import DB_READ_ROUTING, DB_REPLICA_LAG
+from src.sql_metrics import instrument_engine
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = frozenset(('GET', 'HEAD'))
+# Verbes qui écrivent : OPTIONS (preflight CORS) ne colle pas le client au primaire
+WRITE_METHODS = frozenset(('POST', 'PUT', 'PATCH', 'DELETE'))
+STICKY_COOKIE = 'db_primary_until'
+BALANCING = ('round_robin', 'least_connections')
+
+# Décalage de rejeu d'un standby PostgreSQL (0 s'il a tout rejoué ou s'il est primaire)
+POSTGRES_LAG = text(
+    'SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() '
+    'THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+)
+
+
+def replica_lag(conn):
+    """Décalage du réplica en secondes ; 0 hors PostgreSQL (pas de réplication à mesurer)"""
+    if conn.dialect.name != 'postgresql':
+        conn.execute(text('SELECT 1'))
+        return 0.0
+    return float(conn.execute(POSTGRES_LAG).scalar() or 0)
+
+
+class Replica:
+    """Un réplica : son moteur, son état de santé et ses requêtes en cours
+
+    `probe_engine` (délais courts, sans pool) sert aux sondes ; `engine` par défaut.
+    """
+
+    def __init__(self, name, engine, probe_engine=None):
+        self.name = name
+        self.engine = engine
+        self.probe_engine = probe_engine or engine
+        self.healthy = True
+        self.lag = 0.0
+        self.in_flight = 0
+
+
+class ReplicaRouter:
+    """Choisit le moteur des lectures et tient à jour l'état des réplicas"""
+
+    def __init__(self, replicas, balancing='round_robin', sticky_seconds=5.0, max_lag=10.0, lag_fn=replica_lag):
+        if balancing not in BALANCING:
+            raise ValueError(f'Unknown replica balancing: {balancing}')
+        self.replicas = list(replicas)
+        self.balancing = balancing
+        self.sticky_seconds = sticky_seconds
+        self.max_lag = max_lag
+        self.lag_fn = lag_fn
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Réplica sain choisi selon la stratégie (sa requête en cours est comptée), ou None"""
+        with self._lock:
+            healthy = [replica for replica in self.replicas if replica.healthy]
+            if not healthy:
+                return None
+            if self.balancing == 'least_connections':
+                replica = min(healthy, key=lambda r: r.in_flight)
+            else:
+                replica = healthy[next(self._turn) % len(healthy)]
+            replica.in_flight += 1
+            return replica
+
+    def release(self, replica):
+        with self._lock:
+            replica.in_flight -= 1
+
+    def eject(self, replica, reason):
+        if replica.healthy:
+            logger.warning('Replica %s ejected: %s', replica.name, reason)
+        replica.healthy = False
+
+    def probe(self, replica):
+        """Sonde du HealthChecker : mesure le décalage, écarte ou réintègre le réplica"""
+        def run():
+            try:
+                with replica.probe_engine.connect() as conn:
+                    lag = self.lag_fn(conn)
+            except Exception as e:
+                self.eject(replica, str(e))
+                raise
+            replica.lag = lag
+            DB_REPLICA_LAG.labels(replica.name).set(lag)
+            if lag > self.max_lag:
+                self.eject(replica, f'lag {lag:.1f}s > {self.max_lag:.1f}s')
+                raise RuntimeError(f'Replication lag {lag:.1f}s exceeds {self.max_lag:.1f}s')
+            if not replica.healthy:
+                logger.info('Replica %s back in rotation', replica.name)
+            replica.healthy = True
+        return run
+
+    def is_sticky(self):
+        try:
+            return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def read_engine(self):
+        """Moteur des lectures de la requête en cours (choisi au premier SELECT), None = primaire"""
+        if 'db_replica' not in g:
+            replica = None
+            if request.method in READ_METHODS and not self.is_sticky():
+                replica = self.acquire()
+            g.db_replica = replica
+            DB_READ_ROUTING.labels(replica.name if replica else 'primary').inc()
+        return g.db_replica.engine if g.db_replica is not None else None
+
+    def teardown_request(self, exc=None):
+        replica = g.pop('db_replica', None)
+        if replica is not None:
+            self.release(replica)
+
+    def after_request(self, response):
+        # Lire ses propres écritures : le client reste sur le primaire quelques secondes
+        if request.method in WRITE_METHODS and response.status_code < 400 and self.sticky_seconds > 0:
+            until = time.time() + self.sticky_seconds
+            response.set_cookie(STICKY_COOKIE, f'{until:.3f}', max_age=int(self.sticky_seconds) + 1,
+                                httponly=True, samesite='Lax')
+        return response
+
+
+class RoutingSession(Session):
+    """Session Flask-SQLAlchemy qui envoie les SELECT des requêtes en lecture vers un réplica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and isinstance(clause, Select) and not self._flushing and has_request_context():
+            router = current_app.extensions.get('db_router')
+            if router is not None:
+                engine = router.read_engine()
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def init_replicas(app, health_checker, lag_fn=replica_lag):
+    """Installe le routage vers les réplicas (app.extensions['db_router']) ; None sans réplica"""
+    urls = app.config['DB_REPLICA_URLS']
+    if not urls:
+        return None
+    replicas = [
+        Replica(
+            f'replica_{index}',
+            create_engine(url, **engine_options_from_env(url)),
+            probe_engine=create_probe_engine(url, app.config['HEALTH_PROBE_TIMEOUT']),
+        )
+        for index, url in enumerate(urls)
+    ]
+
+    router = ReplicaRouter(
+        replicas,
+        balancing=app.config['DB_REPLICA_BALANCING'],
+        sticky_seconds=app.config['DB_REPLICA_STICKY_SECONDS'],
+        max_lag=app.config['DB_REPLICA_MAX_LAG_SECONDS'],
+        lag_fn=lag_fn,
+    )
+    for replica in replicas:
+        if app.config['SQL_INSTRUMENTATION']:
+            instrument_engine(replica.engine, replica.name, app.config['SQL_SLOW_QUERY_MS'])
+        # Un réplica en retard ou injoignable n'empêche pas le pod d'être prêt
+        health_checker.add_probe(replica.name, router.probe(replica), critical=False)
+
+        def on_error(context, replica=replica):
+            if context.is_disconnect:
+                router.eject(replica, str(context.original_exception))
+
+        event.listen(replica.engine, 'handle_error', on_error)
+
+    app.teardown_request(router.teardown_request)
+    app.after_request(router.after_request)
+    app.extensions['db_router'] = router
+    return router
@@ -0,0 +1,19 @@
+from flask import Blueprint, jsonify, request
+from src.models.user import db
+from src.pagination import parse_limit
+from src.stats import DEFAULT_DAYS, DEFAULT_HOURS, MAX_DAYS, MAX_HOURS, read_stats, set_gauges
+
+stats_bp = Blueprint('stats', __name__)
+
+@stats_bp.route('/stats/users', methods=['GET'])
+def get_user_stats():
+    """User total and signups per UTC day / hour, read from the user_stats aggregates
+
+    `days` and `hours` size the series (one point per period, zeros included);
+    the cost does not depend on the size of the users table.
+    """
+    days = parse_limit(request.args.get('days'), default=DEFAULT_DAYS, maximum=MAX_DAYS, name='days')
+    hours = parse_limit(request.args.get('hours'), default=DEFAULT_HOURS, maximum=MAX_HOURS, name='hours')
+    stats = read_stats(db.session, days=days, hours=hours)
+    set_gauges(stats)
+    return jsonify(stats)
@@ -1,85 +1,410 @@
-from flask import Blueprint, jsonify, request
+import sys
+import time
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from src.cache import SYNC_LIMIT
+from src.changes import (
+    CREATE, DEFAULT_CHANGES_LIMIT, DELETE, MAX_CHANGES_LIMIT, UPDATE, change_floor_statement,
+    change_log_head_statement, change_log_statement, changes_payload, changes_statement, check_cursor,
+    record_changes, sse_event,
+)
 from src.models.user import User, db
-from werkzeug.exceptions import BadRequest, NotFound
+from src.stats import record_stats
+from src.json_provider import rows_response
+from src.pagination import MAX_ID, decode_cursor, parse_limit, set_next_page
+from src.user_import import CREATED, DUPLICATE, INVALID, MAX_BATCH_SIZE, import_users, iter_payload, validate_row
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import (
+    BadRequest, Conflict, Gone, NotFound, PreconditionFailed, PreconditionRequired, ServiceUnavailable,
+)
 
 user_bp = Blueprint('user', __name__)
 
+USER_FIELDS = ('id', 'username', 'email')
+USER_COLUMNS = tuple(getattr(User, field) for field in USER_FIELDS)
+
+# Contraintes d'unicité (noms PostgreSQL / messages SQLite) -> champ concerné
+UNIQUE_CONSTRAINTS = {
+    'ix_users_email_lower': 'email',
+    'users_email_key': 'email',
+    'users.email': 'email',
+    'uq_users_username': 'username',
+    'users.username': 'username',
+}
+CREATE_CONFLICTS = {'email': 'Email already exists', 'username': 'Username already exists'}
+UPDATE_CONFLICTS = {
+    'email': 'Email already in use by another user',
+    'username': 'Username already in use by another user',
+}
+
+def parse_fields(value):
+    """Parse the `fields` projection, keeping the to_dict() order"""
+    if not value:
+        return USER_FIELDS
+    requested = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = requested - set(USER_FIELDS)
+    if unknown:
+        raise BadRequest(f'Unknown fields: {", ".join(sorted(unknown))}')
+    return tuple(field for field in USER_FIELDS if field in requested)
+
+def user_list_statement(args):
+    """Build the keyset-paginated SELECT for a users listing
+
+    `args` is any mapping of query parameters; shared with the ASGI app.
+    Returns (statement, fields, limit); the statement fetches limit + 1 rows
+    so the caller can tell whether a next page exists.
+    """
+    limit = parse_limit(args.get('limit'))
+    after = decode_cursor(args.get('after'))
+    fields = parse_fields(args.get('fields'))
+
+    # Colonnes dans l'ordre de `fields` (id ajouté en fin pour le curseur)
+    columns = [getattr(User, field) for field in fields]
+    if 'id' not in fields:
+        columns.append(User.id)
+    stmt = select(*columns)
+    if after is not None:
+        stmt = stmt.where(User.id > after)
+    if args.get('username'):
+        stmt = stmt.where(User.username.startswith(args['username'], autoescape=True))
+    if args.get('email'):
+        stmt = stmt.where(User.email.startswith(args['email'], autoescape=True))
+    return stmt.order_by(User.id).limit(limit + 1), fields, limit
+
+SEARCH_MODES = ('prefix', 'contains')
+DEFAULT_SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+
+def _like_escape(value):
+    return value.replace('/', '//').replace('%', '/%').replace('_', '/_')
+
+def _prefix_match(column, prefix, dialect_name):
+    """`column` starts with `prefix`, written so the matching index is usable
+
+    PostgreSQL plans LIKE 'abc%' on the text_pattern_ops indexes; SQLite only
+    does so under case_sensitive_like, so it gets the equivalent range instead.
+    """
+    if dialect_name == 'postgresql':
+        return column.like(_like_escape(prefix) + '%', escape='/')
+    # The upper bound is the next string of the same length: trailing U+10FFFF
+    # cannot be incremented, and the surrogates (not encodable) are skipped.
+    stem = prefix.rstrip(chr(sys.maxunicode))
+    if not stem:
+        return column >= prefix
+    following = ord(stem[-1]) + 1
+    if 0xD800 <= following <= 0xDFFF:
+        following = 0xE000
+    return and_(column >= prefix, column < stem[:-1] + chr(following))
+
+def user_search_statement(args, dialect_name):
+    """Build the type-ahead SELECT: case-insensitive match on username or email
+
+    `mode=prefix` (default) is served by the ix_users_*_prefix indexes,
+    `mode=contains` by the pg_trgm indexes on PostgreSQL (a scan elsewhere).
+    Returns (statement, fields).
+    """
+    query = (args.get('q') or '').strip().lower()
+    if not query:
+        raise BadRequest('Missing required parameter: q')
+    mode = args.get('mode') or 'prefix'
+    if mode not in SEARCH_MODES:
+        raise BadRequest(f'Invalid mode: expected one of {", ".join(SEARCH_MODES)}')
+    limit = parse_limit(args.get('limit'), default=DEFAULT_SEARCH_LIMIT, maximum=MAX_SEARCH_LIMIT)
+    fields = parse_fields(args.get('fields'))
+
+    username, email = func.lower(User.username), func.lower(User.email)
+    if mode == 'contains':
+        pattern = '%' + _like_escape(query) + '%'
+        criteria = or_(username.like(pattern, escape='/'), email.like(pattern, escape='/'))
+    else:
+        criteria = or_(_prefix_match(username, query, dialect_name), _prefix_match(email, query, dialect_name))
+    stmt = select(*(getattr(User, field) for field in fields)).where(criteria)
+    return stmt.order_by(username, User.id).limit(limit), fields
+
+def unique_violation_field(error):
+    """Field whose unique constraint `error` (an IntegrityError) violated, or None"""
+    orig = getattr(error, 'orig', error)
+    diag = getattr(orig, 'diag', None)
+    name = getattr(diag, 'constraint_name', None)
+    if name in UNIQUE_CONSTRAINTS:
+        return UNIQUE_CONSTRAINTS[name]
+    message = str(orig)
+    for constraint, field in UNIQUE_CONSTRAINTS.items():
+        if constraint in message:
+            return field
+    return None
+
+def write_error(error, conflicts, action):
+    """HTTP error for a failed write: 409 on a unique violation, 400 otherwise"""
+    if isinstance(error, IntegrityError):
+        field = unique_violation_field(error)
+        if field is not None:
+            return Conflict(conflicts[field])
+    return BadRequest(f'Error {action} user: {str(error)}')
+
+def version_etag(version):
+    """ETag of a user representation, derived from its version column"""
+    return f'v{version}'
+
+def if_match_versions(if_match):
+    """Versions accepted by an If-Match header (werkzeug ETags)
+
+    None means no condition (header absent or `*`); weak tags never match,
+    nor do tags outside the BIGINT range (the update then fails with 412).
+    """
+    if not if_match or if_match.star_tag:
+        return None
+    versions = (tag[1:] for tag in if_match.as_set() if tag[:1] == 'v')
+    return [int(v) for v in versions if v.isascii() and v.isdigit() and int(v) <= MAX_ID]
+
+def split_row(row):
+    """(to_dict()-shaped data, version) from a row of USER_COLUMNS + version"""
+    return dict(zip(USER_FIELDS, row)), row[len(USER_FIELDS)]
+
+def user_insert_statement(data):
+    """INSERT ... RETURNING: uniqueness is left to the database constraints
+
+    created_at comes back last, for the signup counters.
+    """
+    stmt = insert(User).values(username=data['username'], email=data['email'])
+    return stmt.returning(*USER_COLUMNS, User.version, User.created_at)
+
+def user_update_statement(user_id, data, versions=None):
+    """UPDATE ... RETURNING that bumps the version, only if it is in `versions`
+
+    No row comes back when the user is missing or was modified meanwhile.
+    """
+    values = {field: data[field] for field in ('username', 'email') if field in data}
+    stmt = update(User).where(User.id == user_id)
+    if versions is not None:
+        stmt = stmt.where(User.version.in_(versions))
+    stmt = stmt.values(**values, version=User.version + 1).returning(*USER_COLUMNS, User.version)
+    return stmt.execution_options(synchronize_session=False)
+
+def user_delete_statement(user_id):
+    stmt = delete(User).where(User.id == user_id).returning(User.id, User.created_at)
+    return stmt.execution_options(synchronize_session=False)
+
+def notify_changes():
+    """Wake this process's change streams after a committed write"""
+    current_app.extensions['change_feed'].notify()
+
+def read_changes(since, limit):
+    """One page of the change feed after cursor position `since` (410 once it has been pruned)"""
+    rows = db.session.execute(changes_statement(since, limit, db.engine.dialect.name)).all()
+    # Plancher lu après la page : un compactage concurrent ne cause au pire qu'un 410 de trop
+    check_cursor(since, db.session.execute(change_floor_statement()).scalar())
+    return changes_payload(rows, since, limit)
+
+def sync_user_cache(cache):
+    """Evict users written by other workers since the last sync (user_changes journal)"""
+    if not cache.sync_due():
+        return
+    dialect_name = db.engine.dialect.name
+    if cache.sync_cursor is None:
+        cache.sync_cursor = db.session.execute(change_log_head_statement(dialect_name)).scalar()
+    else:
+        rows = db.session.execute(change_log_statement(cache.sync_cursor, SYNC_LIMIT, dialect_name)).all()
+        cache.apply_changes(rows, SYNC_LIMIT)
+
 @user_bp.route('/users', methods=['GET'])
 def get_users():
-    """Get all users"""
-    users = db.session.query(User).all()
-    return jsonify([user.to_dict() for user in users]), 200
+    """List users one page at a time (keyset pagination on id)
+
+    The next page is advertised through the `Link` and `X-Next-Cursor`
+    headers; they are absent on the last page.
+    """
+    stmt, fields, limit = user_list_statement(request.args)
+    rows = db.session.execute(stmt).all()
+    page = rows[:limit]
+    response = rows_response(page, fields)
+    if len(rows) > limit:
+        set_next_page(response, page[-1].id)
+    return response, 200
+
+@user_bp.route('/users/search', methods=['GET'])
+def search_users():
+    """Type-ahead search on username and email (case-insensitive)"""
+    stmt, fields = user_search_statement(request.args, db.engine.dialect.name)
+    return rows_response(db.session.execute(stmt).all(), fields), 200
+
+@user_bp.route('/users/changes', methods=['GET'])
+def get_user_changes():
+    """Users changed since the `since` cursor (all of them without it)
+
+    Each user appears once, as an `upsert` with its current state or as a
+    `delete`; pass the returned `cursor` as `since` to get the next changes.
+    A cursor older than the pruned part of the journal gets 410 Gone.
+    """
+    since = decode_cursor(request.args.get('since')) or 0
+    limit = parse_limit(request.args.get('limit'), default=DEFAULT_CHANGES_LIMIT, maximum=MAX_CHANGES_LIMIT)
+    return jsonify(read_changes(since, limit)), 200
+
+@user_bp.route('/users/changes/stream', methods=['GET'])
+def stream_user_changes():
+    """Server-Sent Events stream of the change feed
+
+    Resumes from `Last-Event-ID` (or `since`). The stream ends after
+    CHANGE_FEED_STREAM_SECONDS; EventSource clients reconnect on their own.
+    """
+    since = decode_cursor(request.headers.get('Last-Event-ID') or request.args.get('since')) or 0
+    check_cursor(since, db.session.execute(change_floor_statement()).scalar())
+    config = current_app.config
+    feed = current_app.extensions['change_feed']
+    if not feed.open_stream():
+        raise ServiceUnavailable('Too many change streams, retry later', retry_after=1)
+
+    def events(cursor):
+        try:
+            yield f"retry: {int(config['CHANGE_FEED_POLL_INTERVAL'] * 1000)}\n\n"
+            deadline = time.monotonic() + config['CHANGE_FEED_STREAM_SECONDS']
+            last_sent = time.monotonic()
+            while time.monotonic() < deadline:
+                generation = feed.generation
+                try:
+                    payload = read_changes(cursor, DEFAULT_CHANGES_LIMIT)
+                except Gone:
+                    # Compacté pendant le flux : le client se reconnecte et reçoit le 410
+                    return
+                finally:
+                    # Pas de connexion gardée pendant l'attente
+                    db.session.remove()
+                if payload['changes']:
+                    cursor = decode_cursor(payload['cursor'])
+                    last_sent = time.monotonic()
+                    yield sse_event(payload)
+                    if payload['has_more']:
+                        continue
+                elif time.monotonic() - last_sent >= config['CHANGE_FEED_HEARTBEAT']:
+                    last_sent = time.monotonic()
+                    yield ': keepalive\n\n'
+                feed.wait(generation, min(config['CHANGE_FEED_POLL_INTERVAL'], max(deadline - time.monotonic(), 0)))
+        finally:
+            feed.close_stream()
+
+    response = Response(stream_with_context(events(since)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @user_bp.route('/users', methods=['POST'])
 def create_user():
-    """Create a new user"""
+    """Create a new user (409 if the username or email is taken)"""
     if not request.is_json:
         raise BadRequest('Request must be JSON')
 
     data = request.get_json()
-    if not data or 'username' not in data or 'email' not in data:
-        raise BadRequest('Missing required fields: username and email')
-
-    if db.session.query(User).filter_by(email=data['email']).first():
-        raise BadRequest('Email already exists')
+    checked = validate_row(data or {})
+    if isinstance(checked, str):
+        raise BadRequest(checked)
 
     try:
-        user = User(username=data['username'], email=data['email'])
-        db.session.add(user)
+        row = db.session.execute(user_insert_statement(data)).one()
+        record_changes(db.session, CREATE, [row.id])
+        record_stats(db.session, CREATE, [row.created_at])
         db.session.commit()
-        return jsonify(user.to_dict()), 201
     except Exception as e:
         db.session.rollback()
-        raise BadRequest(f'Error creating user: {str(e)}')
+        raise write_error(e, CREATE_CONFLICTS, 'creating')
+
+    notify_changes()
+    user, version = split_row(row)
+    response = jsonify(user)
+    response.set_etag(version_etag(version))
+    return response, 201
+
+@user_bp.route('/users:batch', methods=['POST'])
+def create_users_batch():
+    """Create users in bulk from a JSON array or an NDJSON stream
+
+    Rows are inserted in batches of `batch_size`, one transaction per batch;
+    each row gets its own status (created / duplicate / invalid).
+    """
+    batch_size = parse_limit(
+        request.args.get('batch_size'),
+        default=current_app.config['USER_IMPORT_BATCH_SIZE'],
+        maximum=MAX_BATCH_SIZE,
+        name='batch_size',
+    )
+    results = import_users(iter_payload(), batch_size=batch_size)
+    notify_changes()
+    summary = {status: 0 for status in (CREATED, DUPLICATE, INVALID)}
+    for result in results:
+        summary[result['status']] += 1
+    return jsonify({'summary': summary, 'results': results}), 200
 
 @user_bp.route('/users/<int:user_id>', methods=['GET'])
 def get_user(user_id):
-    """Get a specific user by ID"""
-    user = db.session.get(User, user_id)
-    if not user:
-        raise NotFound('User not found')
-    return jsonify(user.to_dict()), 200
+    """Get a specific user by ID (served from the user cache, honours If-None-Match)"""
+    cache = current_app.extensions['user_cache']
+    sync_user_cache(cache)
+    entry = cache.get(user_id)
+    if entry is None:
+        row = db.session.execute(select(*USER_COLUMNS, User.version).where(User.id == user_id)).first()
+        if not row:
+            raise NotFound('User not found')
+        user, version = split_row(row)
+        entry = cache.set(user_id, user, etag=version_etag(version))
+
+    if request.if_none_match.contains_weak(entry.etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(entry.data)
+    response.set_etag(entry.etag)
+    return response
 
 @user_bp.route('/users/<int:user_id>', methods=['PUT'])
 def update_user(user_id):
-    """Update a user by ID"""
+    """Update a user by ID
+
+    With `If-Match: <ETag>` the update only applies to that version of the
+    user (412 otherwise), so concurrent editors cannot overwrite each other.
+    """
     if not request.is_json:
         raise BadRequest('Request must be JSON')
 
-    user = db.session.get(User, user_id)
-    if not user:
-        raise NotFound('User not found')
-
     data = request.get_json()
     if not data:
         raise BadRequest('No data provided')
+    if not request.if_match and current_app.config['USER_UPDATE_REQUIRE_IF_MATCH']:
+        raise PreconditionRequired('If-Match header is required')
 
     try:
-        if 'username' in data:
-            user.username = data['username']
-        if 'email' in data:
-            existing_user = db.session.query(User).filter(User.id != user_id, User.email == data['email']).first()
-            if existing_user:
-                raise BadRequest('Email already in use by another user')
-            user.email = data['email']
-
+        row = db.session.execute(user_update_statement(user_id, data, if_match_versions(request.if_match))).first()
+        if row is not None:
+            record_changes(db.session, UPDATE, [user_id])
         db.session.commit()
-        return jsonify(user.to_dict()), 200
     except Exception as e:
         db.session.rollback()
-        raise BadRequest(f'Error updating user: {str(e)}')
+        raise write_error(e, UPDATE_CONFLICTS, 'updating')
+
+    if row is None:
+        if db.session.execute(select(User.id).where(User.id == user_id)).first() is None:
+            raise NotFound('User not found')
+        raise PreconditionFailed('User was modified by another request')
+
+    current_app.extensions['user_cache'].invalidate(user_id)
+    notify_changes()
+    user, version = split_row(row)
+    response = jsonify(user)
+    response.set_etag(version_etag(version))
+    return response, 200
 
 @user_bp.route('/users/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
     """Delete a user by ID"""
-    user = db.session.get(User, user_id)
-    if not user:
-        raise NotFound('User not found')
-
     try:
-        db.session.delete(user)
+        row = db.session.execute(user_delete_statement(user_id)).first()
+        if row is not None:
+            record_changes(db.session, DELETE, [user_id])
+            record_stats(db.session, DELETE, [row.created_at])
         db.session.commit()
-        return '', 204
     except Exception as e:
         db.session.rollback()
         raise BadRequest(f'Error deleting user: {str(e)}')
+
+    if row is None:
+        raise NotFound('User not found')
+    current_app.extensions['user_cache'].invalidate(user_id)
+    notify_changes()
+    return '', 204
@@ -0,0 +1,156 @@
+"""Instrumentation SQL : requêtes par endpoint, requêtes lentes, N+1 et pool de connexions"""
+import logging
+import re
+import time
+from collections import Counter
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from src.metrics import (
+    DB_POOL_CHECKED_OUT, DB_POOL_CHECKOUT_WAIT, DB_POOL_OVERFLOW, DB_POOL_SIZE,
+    SQL_QUERIES_PER_REQUEST, SQL_REPEATED_STATEMENTS, SQL_SLOW_QUERIES, SQL_TIME_PER_REQUEST,
+)
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%\(\w+\)s|%s|\$\d+|(?<!:):\w+|\?')
+_IN_LIST = re.compile(r'\bIN \(\?(?:, \?)*\)', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+
+
+def normalize_sql(statement):
+    """Forme normalisée d'une requête : littéraux et paramètres remplacés par ?"""
+    statement = _STRING.sub('?', statement)
+    statement = _PLACEHOLDER.sub('?', statement)
+    statement = _NUMBER.sub('?', statement)
+    statement = _SPACE.sub(' ', statement).strip()
+    return _IN_LIST.sub('IN (?)', statement)
+
+
+class RequestSQLStats:
+    """Requêtes exécutées pendant une requête HTTP"""
+
+    __slots__ = ('count', 'duration', 'statements')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool qui mesure le temps d'obtention d'une connexion, sous le nom `metric_name`"""
+
+    metric_name = 'primary'
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(self.metric_name).observe(time.perf_counter() - start)
+
+    def recreate(self):
+        # engine.dispose() remplace le pool : le nouveau garde le nom
+        pool = super().recreate()
+        pool.metric_name = self.metric_name
+        return pool
+
+
+class InstrumentedAsyncAdaptedQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """Variante asyncio (create_async_engine) de InstrumentedQueuePool"""
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+def instrument_engine(engine, name='primary', slow_query_ms=200):
+    """Pose les écouteurs de requêtes et de pool sur `engine`"""
+    slow_query_seconds = slow_query_ms / 1000 if slow_query_ms > 0 else None
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        engine.pool.metric_name = name
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        in_request = has_request_context()
+        stats = g.get('sql_stats') if in_request else None
+        if stats is not None:
+            stats.count += 1
+            stats.duration += elapsed
+            stats.statements[statement] += 1
+        if slow_query_seconds is not None and elapsed >= slow_query_seconds:
+            endpoint = _endpoint() if in_request else 'background'
+            SQL_SLOW_QUERIES.labels(endpoint).inc()
+            logger.warning('Slow query (%.1f ms) on %s: %s', elapsed * 1000, endpoint, normalize_sql(statement))
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(context):
+        # La requête a échoué : after_cursor_execute ne sera pas appelé
+        starts = context.connection.info.get('query_start') if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    def update_pool_gauges(returning):
+        pool = engine.pool
+        if not isinstance(pool, QueuePool):
+            return
+        checked_out, overflow = pool.checkedout(), pool.overflow()
+        if returning:
+            # L'événement checkin précède le retour effectif au pool : la connexion
+            # compte encore, et elle sera fermée (overflow - 1) si la file est pleine
+            checked_out -= 1
+            if pool.checkedin() >= pool.size():
+                overflow -= 1
+        DB_POOL_CHECKED_OUT.labels(name).set(checked_out)
+        DB_POOL_OVERFLOW.labels(name).set(max(overflow, 0))
+        DB_POOL_SIZE.labels(name).set(pool.size())
+
+    event.listen(engine, 'checkout', lambda *args: update_pool_gauges(False))
+    event.listen(engine, 'checkin', lambda *args: update_pool_gauges(True))
+
+
+def _start_request():
+    g.sql_stats = RequestSQLStats()
+
+
+def _finish_request(response, repeated_threshold):
+    stats = g.pop('sql_stats', None)
+    if stats is None or not stats.count:
+        return response
+    endpoint = _endpoint()
+    SQL_QUERIES_PER_REQUEST.labels(endpoint).observe(stats.count)
+    SQL_TIME_PER_REQUEST.labels(endpoint).observe(stats.duration)
+    for statement, count in stats.statements.items():
+        if count >= repeated_threshold:
+            SQL_REPEATED_STATEMENTS.labels(endpoint).inc()
+            logger.warning('Possible N+1 on %s: %d executions of %s', endpoint, count, normalize_sql(statement))
+    response.headers.add('Server-Timing', f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"')
+    return response
+
+
+def init_sql_instrumentation(app, db):
+    """Instrumente les moteurs de `db` et branche les compteurs sur le cycle de requête
+
+    Configuration : SQL_INSTRUMENTATION, SQL_SLOW_QUERY_MS (0 désactive le
+    journal des requêtes lentes), SQL_REPEATED_QUERY_THRESHOLD.
+    """
+    if not app.config['SQL_INSTRUMENTATION']:
+        return False
+    with app.app_context():
+        for name, engine in db.engines.items():
+            instrument_engine(engine, name or 'primary', app.config['SQL_SLOW_QUERY_MS'])
+
+    threshold = app.config['SQL_REPEATED_QUERY_THRESHOLD']
+    app.before_request(_start_request)
+    app.after_request(lambda response: _finish_request(response, threshold))
+    return True
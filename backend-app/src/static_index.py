@@ -0,0 +1,121 @@
+"""Index en mémoire du frontend compilé (SPA) servi par le backend"""
+import gzip
+import mimetypes
+import os
+import re
+from collections import namedtuple
+
+from flask import current_app, request, send_file
+
+try:
+    import brotli
+except ImportError:  # dépendance optionnelle
+    brotli = None
+
+# Fichiers produits par Vite dans assets/ avec un hash de contenu : nom-<hash>.ext
+HASHED_ASSET = re.compile(r'(^|/)assets/.+-[A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$')
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/xml',
+                      'image/svg+xml', 'application/wasm', 'application/manifest+json')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+Variant = namedtuple('Variant', ['path', 'data', 'etag'])
+StaticFile = namedtuple('StaticFile', ['path', 'size', 'mtime', 'etag', 'mimetype', 'cache_control', 'variants'])
+
+
+def _is_compressible(mimetype):
+    return mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+class StaticIndex:
+    """Chemin relatif -> StaticFile pour tout le contenu de `root`"""
+
+    def __init__(self, root, min_compress_size=512, max_compress_size=4 * 1024 * 1024):
+        self.root = root
+        self.min_compress_size = min_compress_size
+        self.max_compress_size = max_compress_size
+        self.files = {}
+        if root is not None:
+            self._build()
+
+    def _build(self):
+        files = {}
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                full_path = os.path.join(dirpath, filename)
+                rel_path = os.path.relpath(full_path, self.root).replace(os.sep, '/')
+                stat = os.stat(full_path)
+                files[rel_path] = (full_path, stat)
+
+        index = {}
+        for rel_path, (full_path, stat) in files.items():
+            mimetype = mimetypes.guess_type(rel_path)[0] or 'application/octet-stream'
+            etag = f'{stat.st_size:x}-{stat.st_mtime_ns:x}'
+            cache_control = IMMUTABLE_CACHE if HASHED_ASSET.search(rel_path) else REVALIDATE_CACHE
+            index[rel_path] = StaticFile(
+                full_path, stat.st_size, stat.st_mtime, etag, mimetype, cache_control,
+                self._variants(rel_path, full_path, stat, etag, mimetype, files),
+            )
+        self.files = index
+
+    def _variants(self, rel_path, full_path, stat, etag, mimetype, files):
+        variants = {}
+        for encoding, suffix in ENCODINGS:
+            sibling = files.get(rel_path + suffix)
+            if sibling is not None:
+                variants[encoding] = Variant(sibling[0], None, f'{etag}-{encoding}')
+
+        if not _is_compressible(mimetype) or not (self.min_compress_size <= stat.st_size <= self.max_compress_size):
+            return variants
+        if 'gzip' in variants and ('br' in variants or brotli is None):
+            return variants
+
+        with open(full_path, 'rb') as f:
+            data = f.read()
+        if 'gzip' not in variants:
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(compressed) < len(data) * 0.9:
+                variants['gzip'] = Variant(None, compressed, f'{etag}-gzip')
+        if 'br' not in variants and brotli is not None:
+            compressed = brotli.compress(data)
+            if len(compressed) < len(data) * 0.9:
+                variants['br'] = Variant(None, compressed, f'{etag}-br')
+        return variants
+
+    def get(self, rel_path):
+        return self.files.get(rel_path)
+
+
+def negotiate_encoding(entry, accept_encodings):
+    """Choisit la meilleure variante acceptée par le client (br, puis gzip)"""
+    for encoding, _ in ENCODINGS:
+        if encoding in entry.variants and accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def static_response(entry):
+    """Réponse pour une entrée de l'index : négociation, ETag, Cache-Control, sendfile"""
+    encoding = negotiate_encoding(entry, request.accept_encodings)
+    variant = entry.variants.get(encoding)
+    etag = variant.etag if variant else entry.etag
+
+    if variant is not None and variant.data is not None:
+        response = current_app.response_class(variant.data, mimetype=entry.mimetype)
+        response.set_etag(etag)
+        response.last_modified = entry.mtime
+        response.make_conditional(request)
+    else:
+        # Fichier sur disque : wsgi.file_wrapper, donc sendfile() sous gunicorn
+        response = send_file(variant.path if variant else entry.path, mimetype=entry.mimetype,
+                             etag=etag, last_modified=entry.mtime, max_age=None, conditional=True)
+
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if entry.variants:
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = entry.cache_control
+    return response
+
@@ -0,0 +1,224 @@
+"""Statistiques des utilisateurs précalculées (GET /api/stats/users, jauges Prometheus)"""
+import logging
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, delete, func, insert, literal_column, or_, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from src.background import PeriodicThread
+from src.changes import CREATE
+from src.metrics import USER_SIGNUPS, USER_STATS_DRIFT, USER_STATS_RECONCILED, USERS_TOTAL
+from src.models.user import User, UserStat
+
+logger = logging.getLogger(__name__)
+
+TOTAL = 'total'
+DAY = 'day'
+HOUR = 'hour'
+# Ligne du dernier recalcul : period = date du recalcul, users = dérive corrigée
+RECONCILED = 'reconciled'
+# Période de la ligne du total
+EPOCH = datetime(1970, 1, 1)
+
+DEFAULT_DAYS = 30
+MAX_DAYS = 366
+DEFAULT_HOURS = 48
+MAX_HOURS = 24 * 31
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def hour_of(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def day_of(moment):
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def stat_rows(op, created_ats):
+    """Paramètres d'UPSERT dans user_stats pour des utilisateurs créés (CREATE) ou supprimés
+
+    Triés par clé : des transactions concurrentes verrouillent les lignes dans
+    le même ordre et ne peuvent pas s'interbloquer.
+    """
+    step = 1 if op == CREATE else -1
+    deltas = Counter()
+    for created_at in created_ats:
+        deltas[(TOTAL, EPOCH)] += step
+        if created_at is not None:
+            deltas[(HOUR, hour_of(created_at))] += step
+            deltas[(DAY, day_of(created_at))] += step
+    return [
+        {'granularity': granularity, 'period': period, 'users': users}
+        for (granularity, period), users in sorted(deltas.items())
+    ]
+
+
+def stats_upsert_statement(dialect_name):
+    """INSERT ... ON CONFLICT DO UPDATE qui ajoute `users` au compteur existant"""
+    stmt = (pg_insert if dialect_name == 'postgresql' else sqlite_insert)(UserStat)
+    return stmt.on_conflict_do_update(
+        index_elements=[UserStat.granularity, UserStat.period],
+        set_={'users': UserStat.users + stmt.excluded.users},
+    )
+
+
+def record_stats(session, op, created_ats):
+    """Met à jour les agrégats pour des utilisateurs créés ou supprimés, dans la transaction de `session`"""
+    rows = stat_rows(op, created_ats)
+    if rows:
+        session.execute(stats_upsert_statement(session.get_bind().dialect.name), rows)
+
+
+def stats_statement(days, hours, now):
+    """Total, dernier recalcul et compteurs des `days` derniers jours / `hours` dernières heures"""
+    return select(UserStat.granularity, UserStat.period, UserStat.users).where(or_(
+        UserStat.granularity.in_((TOTAL, RECONCILED)),
+        and_(UserStat.granularity == DAY, UserStat.period >= day_of(now) - timedelta(days=days - 1)),
+        and_(UserStat.granularity == HOUR, UserStat.period >= hour_of(now) - timedelta(hours=hours - 1)),
+    ))
+
+
+def _series(counts, last, step, size):
+    """Série continue (périodes sans inscription à 0), de la plus ancienne à `last`"""
+    periods = [last - step * offset for offset in reversed(range(size))]
+    return [{'period': period.isoformat(), 'signups': counts.get(period, 0)} for period in periods]
+
+
+def stats_payload(rows, days, hours, now):
+    """{'total', 'signups': {'day', 'hour'}, 'reconciled_at'} depuis les lignes de stats_statement"""
+    counts = {DAY: {}, HOUR: {}}
+    total, reconciled_at = 0, None
+    for granularity, period, users in rows:
+        if granularity == TOTAL:
+            total = users
+        elif granularity == RECONCILED:
+            reconciled_at = period.isoformat()
+        else:
+            counts[granularity][period] = users
+    return {
+        'total': total,
+        'signups': {
+            DAY: _series(counts[DAY], day_of(now), timedelta(days=1), days),
+            HOUR: _series(counts[HOUR], hour_of(now), timedelta(hours=1), hours),
+        },
+        'reconciled_at': reconciled_at,
+    }
+
+
+def set_gauges(payload):
+    """Exporte le total et les inscriptions du jour et de l'heure en cours"""
+    USERS_TOTAL.set(payload['total'])
+    for granularity in (DAY, HOUR):
+        USER_SIGNUPS.labels(granularity).set(payload['signups'][granularity][-1]['signups'])
+
+
+def _hour_bucket(dialect_name):
+    if dialect_name == 'postgresql':
+        # Littéral (pas de paramètre) : l'expression du SELECT et du GROUP BY doit être identique
+        return func.date_trunc(literal_column("'hour'"), User.created_at)
+    return func.strftime('%Y-%m-%d %H:00:00', User.created_at)
+
+
+def reconcile(session, min_interval=0):
+    """Recalcule user_stats depuis users ; {'total', 'drift', 'buckets'}, ou None si ignoré
+
+    Le recalcul est ignoré (transaction annulée) si le précédent date de moins
+    de `min_interval` secondes. L'appelant valide la transaction.
+    """
+    dialect_name = session.get_bind().dialect.name
+    if dialect_name == 'postgresql':
+        # Les écritures concurrentes attendent la fin du recalcul : aucune ne se glisse
+        # entre le comptage et le remplacement, et deux recalculs ne se chevauchent pas
+        session.execute(text('LOCK TABLE user_stats IN EXCLUSIVE MODE'))
+    # Écriture d'abord : sous SQLite, elle prend le verrou d'écriture avant le comptage
+    markers = session.execute(
+        delete(UserStat)
+        .where(UserStat.granularity.in_((TOTAL, RECONCILED)))
+        .returning(UserStat.granularity, UserStat.period, UserStat.users)
+        .execution_options(synchronize_session=False)
+    ).all()
+    previous = {granularity: (period, users) for granularity, period, users in markers}
+    now = utcnow()
+    if min_interval and RECONCILED in previous and previous[RECONCILED][0] > now - timedelta(seconds=min_interval):
+        session.rollback()
+        return None
+
+    session.execute(delete(UserStat).execution_options(synchronize_session=False))
+    bucket = _hour_bucket(dialect_name)
+    counts = Counter()
+    total = 0
+    for hour, users in session.execute(select(bucket, func.count()).group_by(bucket)):
+        total += users
+        if hour is None:
+            continue
+        if isinstance(hour, str):
+            hour = datetime.fromisoformat(hour)
+        counts[(HOUR, hour)] += users
+        counts[(DAY, day_of(hour))] += users
+    buckets = len(counts)
+    drift = total - previous.get(TOTAL, (EPOCH, 0))[1]
+    counts[(TOTAL, EPOCH)] = total
+    counts[(RECONCILED, now)] = drift
+    session.execute(insert(UserStat), [
+        {'granularity': granularity, 'period': period, 'users': users}
+        for (granularity, period), users in counts.items()
+    ])
+
+    USER_STATS_DRIFT.set(drift)
+    USER_STATS_RECONCILED.set(now.replace(tzinfo=timezone.utc).timestamp())
+    if drift:
+        logger.warning('User stats drifted by %d (total %d), reconciled', drift, total)
+    return {'total': total, 'drift': drift, 'buckets': buckets}
+
+
+def read_stats(session, days=DEFAULT_DAYS, hours=DEFAULT_HOURS):
+    now = utcnow()
+    return stats_payload(session.execute(stats_statement(days, hours, now)).all(), days, hours, now)
+
+
+class StatsScheduler(PeriodicThread):
+    """Rafraîchit les jauges et lance le recalcul périodique, dans un thread par processus
+
+    Chaque processus tente un recalcul toutes les USER_STATS_RECONCILE_SECONDS ;
+    celui qui suit de trop près le recalcul d'un autre processus est ignoré.
+    """
+
+    def __init__(self, app, db, refresh_interval=15.0, reconcile_interval=3600.0):
+        super().__init__(self.run_once, refresh_interval, name='user-stats', on_start=self._schedule_reconcile)
+        self.app = app
+        self.db = db
+        self.reconcile_interval = reconcile_interval
+        self._next_reconcile = None
+
+    def _schedule_reconcile(self):
+        self._next_reconcile = time.monotonic() + self.reconcile_interval
+
+    def run_once(self):
+        """Recalcul s'il est dû, puis rafraîchissement des jauges"""
+        with self.app.app_context():
+            session = self.db.session
+            if self.reconcile_interval and time.monotonic() >= self._next_reconcile:
+                self._next_reconcile = time.monotonic() + self.reconcile_interval
+                if reconcile(session, min_interval=self.reconcile_interval) is not None:
+                    session.commit()
+            set_gauges(read_stats(session, days=1, hours=1))
+
+
+def init_user_stats(app, db):
+    """Crée le planificateur (app.extensions['user_stats']), démarré à la première requête"""
+    scheduler = StatsScheduler(
+        app, db,
+        refresh_interval=app.config['USER_STATS_REFRESH_SECONDS'],
+        reconcile_interval=app.config['USER_STATS_RECONCILE_SECONDS'],
+    )
+    app.extensions['user_stats'] = scheduler
+    if scheduler.interval > 0:
+        app.before_request(scheduler.ensure_started)
+    return scheduler
@@ -0,0 +1,152 @@
+"""Import en masse d'utilisateurs par lots (un INSERT et un COMMIT par lot)"""
+import json
+from itertools import islice
+
+from flask import request
+from sqlalchemy import func, insert, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import BadRequest
+
+from src.changes import CREATE, record_changes
+from src.models.user import User, db
+from src.stats import record_stats
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 10000
+
+CREATED = 'created'
+DUPLICATE = 'duplicate'
+INVALID = 'invalid'
+
+
+def iter_payload():
+    """Itère sur les lignes d'un tableau JSON ou d'un flux NDJSON"""
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        return _iter_ndjson(request.stream)
+    if not request.is_json:
+        raise BadRequest('Request must be JSON or NDJSON')
+    rows = request.get_json()
+    if not isinstance(rows, list):
+        raise BadRequest('Request body must be a JSON array')
+    return iter(rows)
+
+
+def _iter_ndjson(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def validate_row(row):
+    """Renvoie (username, email) ou un message d'erreur"""
+    if not isinstance(row, dict):
+        return 'Row must be a JSON object'
+    username, email = row.get('username'), row.get('email')
+    if not isinstance(username, str) or not isinstance(email, str) or not username or not email:
+        return 'Missing required fields: username and email'
+    if len(username) > User.username.type.length or len(email) > User.email.type.length:
+        return 'Field too long'
+    if '@' not in email:
+        return 'Invalid email'
+    return username, email
+
+
+def import_users(rows, batch_size=DEFAULT_BATCH_SIZE):
+    """Importe les lignes par lots et renvoie un résultat par ligne"""
+    results = []
+    indexed = enumerate(rows)
+    while True:
+        chunk = list(islice(indexed, batch_size))
+        if not chunk:
+            break
+        results.extend(_import_batch(chunk))
+    return results
+
+
+def _import_batch(chunk):
+    results = {}
+    pending = {}
+    seen_usernames = set()
+    for index, row in chunk:
+        checked = validate_row(row)
+        if isinstance(checked, str):
+            results[index] = {'index': index, 'status': INVALID, 'error': checked}
+        elif checked[1].lower() in pending or checked[0] in seen_usernames:
+            results[index] = {'index': index, 'status': DUPLICATE}
+        else:
+            # L'unicité de l'email est insensible à la casse (ix_users_email_lower)
+            pending[checked[1].lower()] = (index, checked)
+            seen_usernames.add(checked[0])
+
+    if pending:
+        values = [{'username': username, 'email': email} for _, (username, email) in pending.values()]
+        try:
+            created = _insert_rows(values)
+            record_changes(db.session, CREATE, [user_id for user_id, _ in created.values()])
+            record_stats(db.session, CREATE, [created_at for _, created_at in created.values()])
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            created = _insert_rows_one_by_one(values)
+        for email, (index, _) in pending.items():
+            if email in created:
+                results[index] = {'index': index, 'status': CREATED, 'id': created[email][0]}
+            else:
+                results[index] = {'index': index, 'status': DUPLICATE}
+
+    return [results[index] for index, _ in chunk]
+
+
+def _insert_rows(values):
+    """Insère un lot et renvoie {email en minuscules: (id, created_at)} pour les lignes réellement créées"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        stmt = pg_insert(User).on_conflict_do_nothing().returning(User.id, User.email, User.created_at)
+        rows = db.session.execute(stmt, values)
+        return {email.lower(): (user_id, created_at) for user_id, email, created_at in rows}
+
+    # Repli générique (SQLite, ...) : on écarte les doublons existants en une requête
+    emails = [value['email'].lower() for value in values]
+    usernames = [value['username'] for value in values]
+    existing = db.session.execute(
+        select(User.email, User.username).where(
+            or_(func.lower(User.email).in_(emails), User.username.in_(usernames))
+        )
+    ).all()
+    taken_emails = {email.lower() for email, _ in existing}
+    taken_usernames = {username for _, username in existing}
+    fresh = [
+        value for value in values
+        if value['email'].lower() not in taken_emails and value['username'] not in taken_usernames
+    ]
+    if not fresh:
+        return {}
+    db.session.execute(insert(User), fresh)
+    inserted = db.session.execute(
+        select(User.id, User.email, User.created_at)
+        .where(func.lower(User.email).in_([value['email'].lower() for value in fresh]))
+    )
+    return {email.lower(): (user_id, created_at) for user_id, email, created_at in inserted}
+
+
+def _insert_rows_one_by_one(values):
+    """Rejoue un lot ligne par ligne quand un doublon concurrent l'a fait échouer"""
+    created = {}
+    for value in values:
+        try:
+            with db.session.begin_nested():
+                user_id, created_at = db.session.execute(
+                    insert(User).values(**value).returning(User.id, User.created_at)
+                ).one()
+                record_changes(db.session, CREATE, [user_id])
+                record_stats(db.session, CREATE, [created_at])
+            created[value['email'].lower()] = (user_id, created_at)
+        except IntegrityError:
+            pass
+    db.session.commit()
+    return created
@@ -0,0 +1,4 @@
+"""Point d'entrée WSGI de production (gunicorn -c gunicorn.conf.py src.wsgi:app)"""
+from src.main import create_app
+
+app = create_app()
@@ -0,0 +1,151 @@
+import threading
+import pytest
+from src.admission import ConcurrencyLimiter, TokenBucket, parse_route_limits
+from src.main import create_app
+from src.metrics import ADMISSION_ADMITTED, ADMISSION_IN_FLIGHT, ADMISSION_SHED
+from src.models.user import db
+
+@pytest.fixture
+def make_app(monkeypatch):
+    """Application avec les variables ADMISSION_* données"""
+    def make(**env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        app = create_app()
+        app.config.update({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"})
+        with app.app_context():
+            db.create_all()
+        return app
+    return make
+
+def test_limiter_admits_up_to_limit_then_times_out():
+    limiter = ConcurrencyLimiter(2)
+    assert limiter.acquire(0) == 0.0
+    assert limiter.acquire(0) == 0.0
+    assert limiter.acquire(0.01) is None
+    threading.Timer(0.05, limiter.release).start()
+    waited = limiter.acquire(1)
+    assert waited is not None and waited >= 0.04
+    assert limiter.in_flight == 2 and limiter.waiting == 0
+
+def test_limiter_sheds_when_queue_is_full():
+    limiter = ConcurrencyLimiter(1, max_queue=0)
+    limiter.acquire(0)
+    assert limiter.acquire(5) is None
+
+def test_token_bucket_refills_per_key():
+    now = [0.0]
+    bucket = TokenBucket(rate=2, burst=2, clock=lambda: now[0])
+    assert bucket.take("a") == 0 and bucket.take("a") == 0
+    assert bucket.take("a") == pytest.approx(0.5)
+    assert bucket.take("b") == 0
+    now[0] = 0.5
+    assert bucket.take("a") == 0
+
+def test_token_bucket_is_bounded():
+    bucket = TokenBucket(rate=1, burst=1, maxsize=2)
+    for key in "abc":
+        bucket.take(key)
+    assert list(bucket._buckets) == ["b", "c"]
+
+def test_parse_route_limits():
+    assert parse_route_limits("user.get_users=8, user.import_users=1") == {"user.get_users": 8, "user.import_users": 1}
+    assert parse_route_limits(None) == {}
+
+def test_overloaded_requests_fail_fast_but_health_answers(make_app):
+    app = make_app(ADMISSION_MAX_INFLIGHT=1, ADMISSION_QUEUE_TIMEOUT_MS=50)
+    entered, release = threading.Event(), threading.Event()
+
+    @app.route("/api/slow")
+    def slow():
+        entered.set()
+        release.wait(5)
+        return "done"
+
+    shed_before = ADMISSION_SHED.labels("user.get_users", "overloaded")._value.get()
+    worker = threading.Thread(target=lambda: app.test_client().get("/api/slow"))
+    worker.start()
+    assert entered.wait(5)
+    client = app.test_client()
+
+    response = client.get("/api/users")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert ADMISSION_SHED.labels("user.get_users", "overloaded")._value.get() == shed_before + 1
+    assert client.get("/health").status_code == 200
+
+    release.set()
+    worker.join()
+    assert ADMISSION_IN_FLIGHT.labels("slow")._value.get() == 0
+    admitted = ADMISSION_ADMITTED.labels("user.get_users")._value.get()
+    assert client.get("/api/users").status_code == 200
+    assert ADMISSION_ADMITTED.labels("user.get_users")._value.get() == admitted + 1
+
+def test_waiters_are_capped_so_health_keeps_a_thread(make_app):
+    app = make_app(ADMISSION_MAX_INFLIGHT=1, ADMISSION_MAX_QUEUE=1, ADMISSION_QUEUE_TIMEOUT_MS=5000)
+    queue = app.extensions["admission"].queue
+    entered, release = threading.Event(), threading.Event()
+
+    @app.route("/api/slow")
+    def slow():
+        entered.set()
+        release.wait(5)
+        return "done"
+
+    running = threading.Thread(target=lambda: app.test_client().get("/api/slow"))
+    running.start()
+    assert entered.wait(5)
+    waiter = threading.Thread(target=lambda: app.test_client().get("/api/users"))
+    waiter.start()
+    for _ in range(500):
+        if queue.waiting:
+            break
+        threading.Event().wait(0.01)
+    assert queue.waiting == 1
+
+    client = app.test_client()
+    response = client.get("/api/users/search?q=a")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert client.get("/health").status_code == 200
+
+    release.set()
+    running.join()
+    waiter.join()
+    assert queue.waiting == 0
+    assert client.get("/api/users").status_code == 200
+
+def test_route_limit_only_applies_to_its_route(make_app):
+    app = make_app(ADMISSION_ROUTE_LIMITS="user.get_users=1", ADMISSION_QUEUE_TIMEOUT_MS=10)
+    limiter = app.extensions["admission"].route_limiters["user.get_users"]
+    limiter.acquire(0)
+    client = app.test_client()
+    assert client.get("/api/users").status_code == 503
+    assert client.get("/api/users/search?q=a").status_code == 200
+    limiter.release()
+    assert client.get("/api/users").status_code == 200
+
+def test_rate_limit_per_client(make_app):
+    app = make_app(ADMISSION_RATE_LIMIT=0.5, ADMISSION_RATE_BURST=2)
+    client = app.test_client()
+    assert [client.get("/api/users").status_code for _ in range(2)] == [200, 200]
+    response = client.get("/api/users")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+    # Sans proxy de confiance, X-Forwarded-For est ignoré
+    assert client.get("/api/users", headers={"X-Forwarded-For": "10.0.0.2"}).status_code == 429
+    assert client.get("/health").status_code == 200
+
+def test_rate_limit_keys_on_trusted_proxy_hop(make_app):
+    app = make_app(ADMISSION_RATE_LIMIT=0.5, ADMISSION_RATE_BURST=1, TRUSTED_PROXY_HOPS=1)
+    client = app.test_client()
+    # Le proxy ajoute l'adresse réelle à droite ; les entrées de gauche viennent du client
+    assert client.get("/api/users", headers={"X-Forwarded-For": "1.1.1.1, 10.0.0.1"}).status_code == 200
+    assert client.get("/api/users", headers={"X-Forwarded-For": "2.2.2.2, 10.0.0.1"}).status_code == 429
+    assert client.get("/api/users", headers={"X-Forwarded-For": "1.1.1.1, 10.0.0.2"}).status_code == 200
+
+def test_admission_control_can_be_disabled(make_app):
+    app = make_app(ADMISSION_CONTROL="0", ADMISSION_RATE_LIMIT=0.001, ADMISSION_RATE_BURST=1)
+    assert "admission" not in app.extensions
+    client = app.test_client()
+    assert [client.get("/api/users").status_code for _ in range(3)] == [200] * 3
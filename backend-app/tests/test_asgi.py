@@ -0,0 +1,144 @@
+import pytest
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from starlette.testclient import TestClient
+from src.asgi import async_database_url, create_asgi_app, create_engine_for
+from src.changes import prune_changes
+from src.models.user import db
+from src.sql_metrics import InstrumentedAsyncAdaptedQueuePool
+from src.stats import utcnow
+
+@pytest.fixture
+def asgi_client(tmp_path):
+    """Client de test de l'application ASGI, sur une base SQLite fichier"""
+    database_url = f"sqlite:///{tmp_path / 'asgi.db'}"
+    engine = create_engine(database_url)
+    db.metadata.create_all(engine)
+    engine.dispose()
+    with TestClient(create_asgi_app(database_url)) as client:
+        yield client
+
+def test_async_database_url():
+    assert async_database_url("postgresql://u:p@db/app").drivername == "postgresql+asyncpg"
+    assert async_database_url("postgresql+psycopg2://u:p@db/app").drivername == "postgresql+asyncpg"
+    assert async_database_url("sqlite:///app.db").drivername == "sqlite+aiosqlite"
+
+def test_crud_contract(asgi_client):
+    response = asgi_client.post("/api/users", json={"username": "Bilal", "email": "bilal@example.com"})
+    assert response.status_code == 201
+    user = response.json()
+    assert user == {"id": user["id"], "username": "Bilal", "email": "bilal@example.com"}
+
+    response = asgi_client.get(f"/api/users/{user['id']}")
+    assert response.status_code == 200
+    assert response.json() == user
+
+    response = asgi_client.put(f"/api/users/{user['id']}", json={"username": "renamed"})
+    assert response.status_code == 200
+    assert response.json()["username"] == "renamed"
+    assert asgi_client.get(f"/api/users/{user['id']}").json()["username"] == "renamed"
+
+    assert asgi_client.get("/api/users").json() == [{**user, "username": "renamed"}]
+
+    response = asgi_client.delete(f"/api/users/{user['id']}")
+    assert response.status_code == 204
+    assert response.content == b""
+    assert asgi_client.get(f"/api/users/{user['id']}").status_code == 404
+
+def test_errors_match_sync_app(asgi_client):
+    response = asgi_client.post("/api/users", json={"username": "Bilal"})
+    assert response.status_code == 400
+    assert "Missing required fields" in response.text
+    response = asgi_client.post("/api/users", json={"username": "x" * 500, "email": "long@example.com"})
+    assert response.status_code == 400
+    assert "Field too long" in response.text
+
+    asgi_client.post("/api/users", json={"username": "a", "email": "dup@example.com"})
+    response = asgi_client.post("/api/users", json={"username": "b", "email": "dup@example.com"})
+    assert response.status_code == 409
+    assert "Email already exists" in response.text
+
+    assert asgi_client.post("/api/users", content="x").status_code == 400
+    assert "User not found" in asgi_client.get("/api/users/999").text
+    assert asgi_client.put("/api/users/999", json={"username": "x"}).status_code == 404
+    assert asgi_client.delete("/api/users/999").status_code == 404
+
+def test_pagination_and_etag(asgi_client):
+    for i in range(3):
+        asgi_client.post("/api/users", json={"username": f"u{i}", "email": f"u{i}@example.com"})
+
+    first = asgi_client.get("/api/users?limit=2&fields=username")
+    assert first.json() == [{"username": "u0"}, {"username": "u1"}]
+    assert 'rel="next"' in first.headers["link"]
+    rest = asgi_client.get(f"/api/users?limit=2&fields=username&after={first.headers['x-next-cursor']}")
+    assert rest.json() == [{"username": "u2"}]
+    assert "link" not in rest.headers
+
+    etag = asgi_client.get("/api/users/1").headers["etag"]
+    assert asgi_client.get("/api/users/1", headers={"If-None-Match": etag}).status_code == 304
+
+def test_if_match_optimistic_locking(asgi_client):
+    created = asgi_client.post("/api/users", json={"username": "Bilal", "email": "bilal@example.com"})
+    user_id, etag = created.json()["id"], created.headers["etag"]
+    assert asgi_client.get(f"/api/users/{user_id}").headers["etag"] == etag
+
+    updated = asgi_client.put(f"/api/users/{user_id}", json={"username": "renamed"}, headers={"If-Match": etag})
+    assert updated.status_code == 200
+    assert updated.headers["etag"] != etag
+    stale = asgi_client.put(f"/api/users/{user_id}", json={"username": "late"}, headers={"If-Match": etag})
+    assert stale.status_code == 412
+    huge = asgi_client.put(f"/api/users/{user_id}", json={"username": "late"},
+                           headers={"If-Match": '"v99999999999999999999"'})
+    assert huge.status_code == 412
+    assert asgi_client.post("/api/users", json={"username": "renamed", "email": "x@example.com"}).status_code == 409
+
+def test_change_feed_and_stream(asgi_client):
+    kept = asgi_client.post("/api/users", json={"username": "kept", "email": "kept@example.com"}).json()["id"]
+    gone = asgi_client.post("/api/users", json={"username": "gone", "email": "gone@example.com"}).json()["id"]
+    cursor = asgi_client.get("/api/users/changes").json()["cursor"]
+    asgi_client.put(f"/api/users/{kept}", json={"username": "renamed"})
+    asgi_client.delete(f"/api/users/{gone}")
+
+    feed = asgi_client.get("/api/users/changes", params={"since": cursor}).json()
+    assert feed["changes"] == [
+        {"op": "upsert", "id": kept, "user": {"id": kept, "username": "renamed", "email": "kept@example.com"}},
+        {"op": "delete", "id": gone},
+    ]
+
+    asgi_client.app.state.change_feed.update(poll_interval=0.01, stream_seconds=0.2)
+    response = asgi_client.get("/api/users/changes/stream", headers={"Last-Event-ID": cursor})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert f"id: {feed['cursor']}\nevent: changes\n" in response.text
+
+def test_pruned_cursor_is_gone(asgi_client, tmp_path):
+    user_id = asgi_client.post("/api/users", json={"username": "p", "email": "p@example.com"}).json()["id"]
+    cursor = asgi_client.get("/api/users/changes").json()["cursor"]
+    asgi_client.delete(f"/api/users/{user_id}")
+    engine = create_engine(f"sqlite:///{tmp_path / 'asgi.db'}")
+    with Session(engine) as session:
+        prune_changes(session, datetime(9999, 1, 1), "sqlite")
+        session.commit()
+    engine.dispose()
+    assert asgi_client.get("/api/users/changes", params={"since": cursor}).status_code == 410
+    assert asgi_client.get("/api/users/changes/stream", headers={"Last-Event-ID": cursor}).status_code == 410
+    assert asgi_client.get("/api/users/changes").json()["changes"] == []
+
+def test_user_stats_follow_writes(asgi_client, monkeypatch):
+    ids = [asgi_client.post("/api/users", json={"username": f"s{i}", "email": f"s{i}@example.com"}).json()["id"]
+           for i in range(3)]
+    asgi_client.delete(f"/api/users/{ids[0]}")
+    # Horloge figée après les écritures : la lecture ne peut pas changer d'heure
+    now = utcnow()
+    monkeypatch.setattr("src.asgi.utcnow", lambda: now)
+    stats = asgi_client.get("/api/stats/users", params={"days": 2, "hours": 3}).json()
+    assert stats["total"] == 2
+    assert [len(stats["signups"]["day"]), len(stats["signups"]["hour"])] == [2, 3]
+    assert sum(point["signups"] for point in stats["signups"]["hour"]) == 2
+
+def test_postgres_engine_keeps_instrumented_pool(monkeypatch):
+    pytest.importorskip("asyncpg")
+    monkeypatch.setenv("SQL_INSTRUMENTATION", "1")
+    engine = create_engine_for("postgresql://u:p@db/app")
+    assert isinstance(engine.pool, InstrumentedAsyncAdaptedQueuePool)
+    assert engine.url.drivername == "postgresql+asyncpg"
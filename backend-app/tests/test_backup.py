@@ -0,0 +1,128 @@
+import json
+import os
+import shutil
+import pytest
+from sqlalchemy import create_engine, text
+from src import backup
+
+def _write_backup(root, name, created_at, files, compression="gzip"):
+    """Sauvegarde factice (fichiers compressés + manifeste), sans pg_dump"""
+    path = root / name
+    path.mkdir()
+    entries = []
+    for filename, content in files.items():
+        raw = root / filename
+        raw.write_bytes(content)
+        extension = backup.COMPRESSORS[compression][0]
+        entries.append(backup.compress_file(raw, path / (filename + extension), compression, remove_source=True))
+    (path / backup.MANIFEST).write_text(json.dumps({
+        "version": backup.MANIFEST_VERSION, "backup": name, "created_at": created_at,
+        "compression": compression, "raw_bytes": sum(e["size"] for e in entries), "files": entries,
+    }))
+    return path
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd", "lz4", "none"])
+def test_compress_roundtrip_in_small_chunks(tmp_path, compression):
+    if compression not in backup.available_compressors():
+        pytest.skip(f"{compression} not installed")
+    content = os.urandom(5000) + b"users" * 20000
+    (tmp_path / "3001.dat").write_bytes(content)
+    entry = backup.compress_file(tmp_path / "3001.dat", tmp_path / "3001.dat.c", compression, chunk_size=1000)
+    assert entry["size"] == len(content)
+    if compression != "none":
+        assert entry["compressed_size"] < len(content)
+    backup.decompress_file(tmp_path / "3001.dat.c", tmp_path / "out.dat", entry, compression, chunk_size=1000)
+    assert (tmp_path / "out.dat").read_bytes() == content
+
+def test_missing_optional_compressor_is_reported(monkeypatch, tmp_path):
+    monkeypatch.setattr(backup, "zstandard", None)
+    (tmp_path / "toc.dat").write_bytes(b"toc")
+    with pytest.raises(RuntimeError, match="zstandard"):
+        backup.compress_file(tmp_path / "toc.dat", tmp_path / "toc.dat.zst", "zstd")
+    assert "zstd" not in backup.available_compressors()
+
+def test_verify_detects_corruption(tmp_path):
+    path = _write_backup(tmp_path, "postgres_backup_20250101_020000", "2025-01-01T02:00:00+00:00",
+                         {"toc.dat": b"toc", "3001.dat": b"1\tbilal\n" * 1000})
+    assert backup.verify(str(path))["ok"]
+    data = path / "3001.dat.gz"
+    corrupted = bytearray(data.read_bytes())
+    corrupted[-12] ^= 0xFF
+    data.write_bytes(bytes(corrupted))
+    with pytest.raises(Exception):
+        backup.verify(str(path))
+    assert not any(entry.name.startswith(".verify") for entry in tmp_path.iterdir())
+
+def test_retention_keeps_recent_and_latest(tmp_path):
+    old = _write_backup(tmp_path, "postgres_backup_20240101_020000", "2024-01-01T02:00:00+00:00", {"toc.dat": b"a"})
+    recent = _write_backup(tmp_path, "postgres_backup_20250301_020000", "2025-03-01T02:00:00+00:00", {"toc.dat": b"b"})
+    legacy = tmp_path / "postgres_backup_20231201_020000.sql.gz"
+    legacy.write_bytes(b"")
+    os.utime(legacy, (0, 0))
+    unrelated = tmp_path / "notes.txt"
+    unrelated.write_text("keep")
+    now = backup.datetime.datetime(2025, 3, 10, tzinfo=backup.datetime.timezone.utc).timestamp()
+
+    removed = backup.prune(str(tmp_path), 30, now=now)
+    assert sorted(removed) == [legacy.name, old.name]
+    assert recent.exists() and unrelated.exists()
+    assert backup.latest_backup(str(tmp_path)) == str(recent)
+    # La dernière sauvegarde n'est jamais supprimée, même expirée
+    assert backup.prune(str(tmp_path), 1, now=now + 365 * 86400) == []
+
+def test_table_timer_parses_parallel_and_serial_logs():
+    clock = iter([0.0, 1.0, 3.0, 4.0]).__next__
+    timer = backup.TableTimer(parallel=True, clock=clock)
+    timer.feed('pg_dump: dumping contents of table "public.users"\n')
+    timer.feed('pg_dump: dumping contents of table "public.user_changes"\n')
+    assert timer.feed("pg_dump: finished item 3350 TABLE DATA users\n") == 3350
+    timer.feed("pg_dump: finished item 3351 TABLE DATA user_changes\n")
+    assert timer.seconds == {"public.users": 3.0, "public.user_changes": 3.0}
+
+    clock = iter([0.0, 2.0, 5.0]).__next__
+    timer = backup.TableTimer(parallel=False, clock=clock)
+    timer.feed('pg_restore: processing data for table "public.users"\n')
+    timer.feed('pg_restore: processing data for table "public.stats"\n')
+    timer.close()
+    assert timer.seconds == {"public.users": 2.0, "public.stats": 3.0}
+
+def test_conninfo_from_args():
+    args = backup.argparse.Namespace(database_url="postgresql+psycopg2://u:p@db:5432/app",
+                                     host=None, port=None, user=None, dbname=None)
+    assert backup.conninfo_from_args(args) == "postgresql://u:p@db:5432/app"
+    args = backup.argparse.Namespace(database_url=None, host="postgres", port=None, user="wp_user", dbname="prod")
+    assert backup.conninfo_from_args(args) == "host=postgres user=wp_user dbname=prod"
+
+def test_password_is_kept_out_of_argv(monkeypatch):
+    assert backup.split_password("postgresql://u:p%40ss@db:5432/app") == ("postgresql://u@db:5432/app", "p@ss")
+    assert backup.split_password("postgresql://u@db/app") == ("postgresql://u@db/app", None)
+    assert backup.split_password("host=db user=u") == ("host=db user=u", None)
+
+    monkeypatch.setenv("PGPASSWORD", "from-environment")
+    args = backup.argparse.Namespace(database_url="postgresql+psycopg2://u:secret@db/app",
+                                     host=None, port=None, user=None, dbname=None)
+    assert backup.connect_from_args(args) == "postgresql://u@db/app"
+    assert backup.os.environ["PGPASSWORD"] == "secret"
+
+@pytest.mark.skipif(not os.environ.get("TEST_POSTGRES_URL") or not shutil.which("pg_dump"),
+                    reason="TEST_POSTGRES_URL and pg_dump/pg_restore required")
+def test_backup_and_restore_roundtrip_postgres(tmp_path):
+    url = os.environ["TEST_POSTGRES_URL"]
+    conninfo = url.replace("postgresql+psycopg2://", "postgresql://")
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS backup_roundtrip"))
+        conn.execute(text("CREATE TABLE backup_roundtrip (id serial PRIMARY KEY, payload text)"))
+        conn.execute(text("INSERT INTO backup_roundtrip (payload) SELECT md5(i::text) FROM generate_series(1, 5000) i"))
+
+    report = backup.backup(conninfo, str(tmp_path), jobs=2, retention_days=30)
+    assert any(table["table"] == "public.backup_roundtrip" and table["bytes"] > 0 for table in report["tables"])
+    assert backup.verify(report["path"])["ok"]
+
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE backup_roundtrip"))
+    backup.restore(conninfo, report["path"], jobs=2, clean=True)
+    with engine.begin() as conn:
+        assert conn.execute(text("SELECT count(*) FROM backup_roundtrip")).scalar() == 5000
+        conn.execute(text("DROP TABLE backup_roundtrip"))
+    engine.dispose()
@@ -0,0 +1,113 @@
+import threading
+import time
+from sqlalchemy import event, text
+from sqlalchemy.pool import NullPool
+from src.database import create_probe_engine
+from src.health import HealthChecker
+from src.metrics import DEPENDENCY_LAST_CHECK, DEPENDENCY_PROBE_LATENCY, DEPENDENCY_UP
+from src.models.user import db
+
+def _failing():
+    raise ConnectionError("connection refused")
+
+def _wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_checker_records_results_and_gauges():
+    checker = HealthChecker(interval=60)
+    checker.add_probe("ok", lambda: None)
+    checker.add_probe("broken", _failing)
+    snapshot = checker.check_now()
+    assert snapshot["ok"].healthy and snapshot["ok"].error is None
+    assert not snapshot["broken"].healthy
+    assert "connection refused" in snapshot["broken"].error
+    assert DEPENDENCY_UP.labels(dependency="ok")._value.get() == 1
+    assert DEPENDENCY_UP.labels(dependency="broken")._value.get() == 0
+    assert not checker.is_ready()
+
+def test_probe_gauges_ignore_dead_workers():
+    # Sous gunicorn, la valeur d'un worker recyclé ne doit pas rester exportée
+    assert [gauge._multiprocess_mode for gauge in (DEPENDENCY_UP, DEPENDENCY_PROBE_LATENCY, DEPENDENCY_LAST_CHECK)] == [
+        "livemin", "livemax", "livemax"
+    ]
+
+def test_checker_thread_lifecycle():
+    checker = HealthChecker(interval=60)
+    checker.add_probe("ok", lambda: None)
+    assert not checker.is_alive()
+    checker.ensure_started()
+    thread = checker._thread
+    checker.ensure_started()
+    assert checker._thread is thread
+    assert checker.is_alive()
+    _wait_for(checker.snapshot)
+    assert checker.is_ready()
+    checker.stop()
+    thread.join(timeout=1)
+    assert not checker.is_alive()
+
+def test_status_served_from_snapshot(client, app):
+    app.extensions["health"].check_now()
+    assert client.get("/api/status").get_json()["services"]["database"] == "connected"
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        for _ in range(5):
+            response = client.get("/api/status")
+            assert response.status_code == 200
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+    assert statements == []
+    check = response.get_json()["checks"]["database"]
+    assert check["healthy"] is True
+    assert check["latency_ms"] >= 0
+
+def test_status_reports_failed_dependency(client, app):
+    checker = app.extensions["health"]
+    checker.add_probe("database", _failing)
+    client.get("/health")
+    checker.check_now()
+    response = client.get("/api/status")
+    assert response.status_code == 503
+    data = response.get_json()
+    assert data["status"] == "degraded"
+    assert data["services"]["database"] == "disconnected"
+    # la liveness ne dépend pas des dépendances externes
+    assert client.get("/health").status_code == 200
+
+def test_health_fails_when_checker_is_dead(client, app):
+    checker = app.extensions["health"]
+    assert client.get("/health").get_json() == {"status": "healthy"}
+    checker.stop()
+    checker._thread.join(timeout=1)
+    assert client.get("/health").status_code == 503
+
+def test_hung_database_does_not_block_liveness(client, app):
+    checker = app.extensions["health"]
+    entered, release = threading.Event(), threading.Event()
+
+    def hung():
+        entered.set()
+        release.wait(5)
+    checker.add_probe("database", hung)
+    try:
+        started = time.monotonic()
+        assert client.get("/health").status_code == 200
+        assert time.monotonic() - started < 1
+        assert entered.wait(2)
+        # La sonde est bloquée : le pod reste vivant mais n'est pas prêt
+        assert client.get("/health").status_code == 200
+        assert client.get("/api/status").status_code == 503
+    finally:
+        release.set()
+
+def test_probe_engine_has_no_pool_wait(tmp_path):
+    engine = create_probe_engine(f"sqlite:///{tmp_path / 'probe.db'}", timeout=2)
+    assert isinstance(engine.pool, NullPool)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT 1")).scalar() == 1
@@ -0,0 +1,57 @@
+import datetime
+import uuid
+import pytest
+from flask.json.provider import DefaultJSONProvider
+from src.json_provider import OrjsonProvider
+from src.models.user import db, User
+
+pytest.importorskip("orjson")
+
+@pytest.fixture
+def providers(app):
+    return OrjsonProvider(app), DefaultJSONProvider(app)
+
+@pytest.mark.parametrize("obj", [
+    [{"id": 1, "username": "bilal", "email": "bilal@example.com"}],
+    {"b": [1, 2, None, True], "a": {"z": "x", "y": 1.5}},
+    {"name": "Élodie", "emoji": "🚀"},
+    {"control": "\x1f\x7f", "quote": "\"</script>"},
+    {"when": datetime.datetime(2024, 5, 1, 12, 30), "day": datetime.date(2024, 5, 1)},
+    {"id": uuid.UUID("12345678-1234-5678-1234-567812345678")},
+    {1: "int key", 2: "other"},
+])
+def test_same_bytes_as_default_provider(providers, obj):
+    fast, default = providers
+    assert fast.dumps(obj) == default.dumps(obj, separators=(",", ":"))
+    assert fast.response(obj).data == default.response(obj).data
+
+def test_app_uses_orjson_provider(app):
+    assert isinstance(app.json, OrjsonProvider)
+    assert app.json.loads('{"a": [1, 2]}') == {"a": [1, 2]}
+
+def _seed(app):
+    db.session.add_all([
+        User(username="bilal", email="bilal@example.com"),
+        User(username="Zoé", email="zoe@example.com"),
+    ])
+    db.session.commit()
+
+def test_list_endpoint_matches_to_dict_bytes(app, client):
+    _seed(app)
+    expected = DefaultJSONProvider(app).response(
+        [user.to_dict() for user in db.session.query(User).order_by(User.id)]
+    ).data
+    assert client.get("/api/users").data == expected
+
+def test_projection_matches_to_dict_bytes(app, client):
+    _seed(app)
+    expected = DefaultJSONProvider(app).response(
+        [{"email": user.email} for user in db.session.query(User).order_by(User.id)]
+    ).data
+    assert client.get("/api/users?fields=email").data == expected
+
+def test_detail_endpoint_matches_to_dict_bytes(app, client):
+    _seed(app)
+    user = db.session.get(User, 2)
+    expected = DefaultJSONProvider(app).response(user.to_dict()).data
+    assert client.get("/api/users/2").data == expected
@@ -0,0 +1,63 @@
+import json
+import argparse
+import pytest
+from benchmarks.loadtest import compare, main, parse_mix, percentile
+
+def test_parse_mix():
+    assert parse_mix("list=3,get=1") == {"list": 3.0, "get": 1.0}
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_mix("list=1,explode=2")
+
+def test_percentile_nearest_rank():
+    values = [i / 1000 for i in range(1, 101)]
+    assert percentile(values, 0.50) == 50.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile([], 0.5) is None
+
+def _report(p95, rps, errors=0, **workload):
+    level = {"concurrency": 4, "p50_ms": 1, "p95_ms": p95, "p99_ms": p95, "throughput_rps": rps, "errors": errors}
+    report = {"database": "sqlite", "users": 100, "requests": 2000, "mix": {"list": 1.0},
+              "runner": {"cpus": 2, "machine": "x86_64"}, "runs": [{"mode": "inprocess-asgi", "levels": [level]}]}
+    report.update(workload)
+    return report
+
+def test_compare_flags_regressions():
+    baseline = _report(10, 1000)
+    assert compare(_report(12, 900), baseline, 0.25) == []
+    problems = compare(_report(20, 500), baseline, 0.25)
+    assert len(problems) == 3
+    assert compare(_report(20, 500), baseline, 0.25, gates=("throughput_rps",)) == [
+        "inprocess-asgi c=4: throughput 500 < baseline 1000"
+    ]
+    assert compare(_report(10, 1000, errors=2), {}, 0.25) == ["inprocess-asgi c=4: 2 errors"]
+
+def test_compare_rejects_mismatched_baseline():
+    baseline = _report(10, 1000)
+    assert compare(_report(10, 1000, requests=3000), baseline, 0.25) == [
+        "baseline mismatch: requests 3000 != baseline 2000"
+    ]
+    problems = compare(_report(10, 1000, runner={"cpus": 4, "machine": "x86_64"}), baseline, 0.25)
+    assert problems == ["baseline mismatch: runner {'cpus': 4, 'machine': 'x86_64'} != baseline "
+                        "{'cpus': 2, 'machine': 'x86_64'}"]
+    other = _report(10, 1000)
+    other["runs"][0]["mode"] = "inprocess-wsgi"
+    assert compare(other, baseline, 0.25) == ["inprocess-wsgi c=4: missing from baseline"]
+
+def test_inprocess_run_and_baseline(tmp_path, monkeypatch):
+    monkeypatch.setenv("USER_CACHE_TTL", "30")
+    output, baseline = tmp_path / "report.json", tmp_path / "baseline.json"
+    args = ["--mode", "inprocess-asgi", "--concurrency", "1", "4", "--requests", "60", "--users", "50",
+            "--database-url", f"sqlite:///{tmp_path / 'load.db'}", "--output", str(output)]
+    assert main(args + ["--save-baseline", str(baseline)]) == 0
+    report = json.loads(output.read_text())
+    assert report["runner"]["cpus"] >= 1 and report["runner"]["machine"]
+    levels = report["runs"][0]["levels"]
+    assert [level["concurrency"] for level in levels] == [1, 4]
+    assert all(level["count"] == 60 and level["errors"] == 0 for level in levels)
+    assert set(levels[0]["operations"]) <= {"list", "get", "create", "update", "delete"}
+
+    slower = json.loads(baseline.read_text())
+    for level in slower["runs"][0]["levels"]:
+        level["throughput_rps"] *= 1000
+    baseline.write_text(json.dumps(slower))
+    assert main(args + ["--baseline", str(baseline), "--gate", "throughput_rps"]) == 1
@@ -4,7 +4,8 @@ from unittest.mock import patch
 import pytest
 from src.main import create_app
 
-def test_status_route(client):
+def test_status_route(client, app):
+    app.extensions["health"].check_now()
     response = client.get("/api/status")
     assert response.status_code == 200
     data = response.get_json()
@@ -0,0 +1,150 @@
+import os
+import uuid
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from src import migrations
+from src.models.user import db
+from src.routes.user import user_search_statement
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    yield engine
+    engine.dispose()
+
+def _plan(engine, stmt, params=None):
+    """EXPLAIN QUERY PLAN de SQLite, concaténé en une chaîne"""
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN {stmt}"), params or {}).all()
+    return " | ".join(row[-1] for row in rows)
+
+def _index_names(engine):
+    # inspect() ignore les index sur expression avec SQLite
+    with engine.connect() as conn:
+        return set(conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'users'")).scalars())
+
+def _compiled(engine, stmt):
+    compiled = stmt.compile(dialect=engine.dialect)
+    return str(compiled), compiled.params
+
+def test_upgrade_applies_all_versions_once(engine):
+    applied = migrations.upgrade(engine)
+    assert [m.version for m in applied] == [m.version for m in migrations.discover()]
+    assert migrations.upgrade(engine) == []
+    assert migrations.pending(engine) == []
+    with engine.connect() as conn:
+        assert migrations.applied_versions(conn) == {m.version for m in applied}
+
+def test_schema_matches_model(engine):
+    migrations.upgrade(engine)
+    inspector = inspect(engine)
+    columns = {c["name"]: c for c in inspector.get_columns("users")}
+    assert set(columns) == set(db.metadata.tables["users"].columns.keys())
+    assert columns["username"]["type"].length == 100
+    assert columns["email"]["type"].length == 255
+    assert _index_names(engine) >= {"uq_users_username", "ix_users_email_lower", "ix_users_username_prefix"}
+
+def test_model_declares_the_same_indexes(engine, tmp_path):
+    migrations.upgrade(engine)
+    created = create_engine(f"sqlite:///{tmp_path / 'create_all.db'}")
+    db.metadata.create_all(created)
+    named = lambda names: {name for name in names if not name.startswith("sqlite_autoindex")}
+    assert named(_index_names(created)) == named(_index_names(engine))
+    with created.connect() as conn:
+        assert "AUTOINCREMENT" in conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'users'")).scalar()
+    created.dispose()
+
+def test_legacy_user_table_is_copied(engine):
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE "user" (id INTEGER PRIMARY KEY, username VARCHAR(80), email VARCHAR(120))'))
+        conn.execute(text("INSERT INTO \"user\" VALUES (7, 'bilal', 'bilal@example.com')"))
+    migrations.upgrade(engine)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT id, username, email FROM users")).all() == [(7, "bilal", "bilal@example.com")]
+
+def _insert_user(conn, name):
+    conn.execute(text("INSERT INTO users (username, email) VALUES (:n, :n || '@example.com')"), {"n": name})
+    return conn.execute(text("SELECT id FROM users WHERE username = :n"), {"n": name}).scalar()
+
+def test_deleted_user_id_is_not_reused(engine):
+    migrations.upgrade(engine)
+    with engine.begin() as conn:
+        deleted = _insert_user(conn, "a")
+        conn.execute(text("DELETE FROM users WHERE id = :id"), {"id": deleted})
+        assert _insert_user(conn, "b") > deleted
+
+def test_v0007_rebuilds_users_with_autoincrement(engine):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(100) NOT NULL, "
+                          "email VARCHAR(255) UNIQUE NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"))
+    migrations.upgrade(engine, target=6)
+    with engine.begin() as conn:
+        _insert_user(conn, "a")
+        deleted = _insert_user(conn, "b")
+        conn.execute(text("DELETE FROM users WHERE id = :id"), {"id": deleted})
+        conn.execute(text("INSERT INTO user_changes (user_id, op) VALUES (:id, 'delete')"), {"id": deleted})
+    migrations.upgrade(engine)
+    assert _index_names(engine) >= {"uq_users_username", "ix_users_email_lower", "ix_users_username_prefix"}
+    with engine.begin() as conn:
+        assert conn.execute(text("SELECT username FROM users")).scalars().all() == ["a"]
+        assert _insert_user(conn, "c") > deleted
+    with pytest.raises(Exception):
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO users (username, email) VALUES ('d', 'c@example.com')"))
+
+def test_case_insensitive_email_is_unique(engine):
+    migrations.upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (username, email) VALUES ('a', 'Bilal@Example.com')"))
+    with pytest.raises(Exception):
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO users (username, email) VALUES ('b', 'bilal@example.com')"))
+
+def test_v0002_lookups_use_indexes(engine):
+    migrations.upgrade(engine, target=2)
+    assert "ix_users_email_lower" in _plan(engine, "SELECT id FROM users WHERE lower(email) = :e", {"e": "x"})
+    assert "uq_users_username" in _plan(engine, "SELECT id FROM users WHERE username = :u", {"u": "x"})
+
+def test_v0003_search_uses_prefix_indexes(engine):
+    migrations.upgrade(engine)
+    sql, params = _compiled(engine, user_search_statement({"q": "bil"}, "sqlite")[0])
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", tuple(params.values())).all()
+    plan = " | ".join(row[-1] for row in rows)
+    assert "ix_users_username_prefix" in plan
+    assert "ix_users_email_lower" in plan
+    assert "SCAN users" not in plan
+
+@pytest.fixture
+def pg_engine():
+    url = os.environ.get("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL not set")
+    schema = f"test_migrations_{uuid.uuid4().hex[:8]}"
+    admin = create_engine(url)
+    with admin.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+    engine = create_engine(url, connect_args={"options": f"-csearch_path={schema},public"})
+    yield engine
+    engine.dispose()
+    with admin.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+    admin.dispose()
+
+def _pg_plan(engine, stmt):
+    with engine.connect() as conn:
+        conn.execute(text("SET enable_seqscan = off"))
+        return "\n".join(row[0] for row in conn.execute(text(f"EXPLAIN {stmt}")))
+
+def _pg_literal(engine, stmt):
+    return str(stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+
+def test_postgres_indexes_are_used(pg_engine):
+    migrations.upgrade(pg_engine)
+    assert "ix_users_email_lower" in _pg_plan(pg_engine, "SELECT id FROM users WHERE lower(email) = 'x'")
+    prefix = _pg_literal(pg_engine, user_search_statement({"q": "bil"}, "postgresql")[0])
+    plan = _pg_plan(pg_engine, prefix)
+    assert "ix_users_username_prefix" in plan and "ix_users_email_prefix" in plan
+    contains = _pg_literal(pg_engine, user_search_statement({"q": "lal", "mode": "contains"}, "postgresql")[0])
+    plan = _pg_plan(pg_engine, contains)
+    assert "ix_users_username_trgm" in plan and "ix_users_email_trgm" in plan
@@ -0,0 +1,114 @@
+import pytest
+from sqlalchemy import create_engine, text
+from src import migrations
+from src.main import create_app
+from src.metrics import DB_POOL_SIZE, DB_READ_ROUTING, DB_REPLICA_LAG
+from src.models.user import db
+from src.replicas import STICKY_COOKIE, Replica, ReplicaRouter
+
+@pytest.fixture
+def replicated(tmp_path, monkeypatch):
+    """Application sur deux fichiers SQLite : primaire et réplica (contenus volontairement différents)"""
+    urls = {name: f"sqlite:///{tmp_path / f'{name}.db'}" for name in ("primary", "replica")}
+    for name, url in urls.items():
+        engine = create_engine(url)
+        migrations.upgrade(engine)
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO users (username, email) VALUES (:name, :email)"),
+                         {"name": f"on-{name}", "email": f"{name}@example.com"})
+        engine.dispose()
+    monkeypatch.setenv("DATABASE_URL", urls["primary"])
+    monkeypatch.setenv("DATABASE_REPLICA_URLS", urls["replica"])
+    monkeypatch.setenv("DB_REPLICA_STICKY_SECONDS", "30")
+    app = create_app()
+    app.config["TESTING"] = True
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+    for replica in app.extensions["db_router"].replicas:
+        replica.engine.dispose()
+
+def _usernames(response):
+    return [user["username"] for user in response.get_json()]
+
+def test_reads_go_to_replica_and_writes_to_primary(replicated):
+    client = replicated.test_client(use_cookies=False)
+    assert _usernames(client.get("/api/users")) == ["on-replica"]
+
+    created = client.post("/api/users", json={"username": "new", "email": "new@example.com"})
+    assert created.status_code == 201
+    with replicated.app_context():
+        primary = db.session.execute(text("SELECT username FROM users ORDER BY id")).scalars().all()
+    assert primary == ["on-primary", "new"]
+    # Le réplica (jamais alimenté ici) ne voit pas l'écriture
+    assert _usernames(client.get("/api/users")) == ["on-replica"]
+
+def test_client_reads_its_own_writes_after_writing(replicated):
+    client = replicated.test_client()
+    response = client.post("/api/users", json={"username": "mine", "email": "mine@example.com"})
+    assert STICKY_COOKIE in response.headers["Set-Cookie"]
+    assert _usernames(client.get("/api/users")) == ["on-primary", "mine"]
+
+    client.set_cookie(STICKY_COOKIE, "0")
+    assert _usernames(client.get("/api/users")) == ["on-replica"]
+
+def test_preflight_does_not_pin_client_to_primary(replicated):
+    client = replicated.test_client()
+    response = client.options("/api/users")
+    assert response.status_code == 200
+    assert "Set-Cookie" not in response.headers
+    assert _usernames(client.get("/api/users")) == ["on-replica"]
+
+def test_lagging_or_failed_replica_is_ejected(replicated):
+    router = replicated.extensions["db_router"]
+    checker = replicated.extensions["health"]
+    client = replicated.test_client(use_cookies=False)
+
+    router.lag_fn = lambda conn: 60.0
+    checker.check_now()
+    assert not router.replicas[0].healthy
+    assert _usernames(client.get("/api/users")) == ["on-primary"]
+    # Un réplica écarté ne rend pas le pod indisponible
+    assert checker.is_ready()
+
+    router.lag_fn = lambda conn: 0.5
+    checker.check_now()
+    assert router.replicas[0].lag == 0.5
+    assert DB_REPLICA_LAG._multiprocess_mode == "livemax"
+    assert _usernames(client.get("/api/users")) == ["on-replica"]
+
+    def unreachable(conn):
+        raise ConnectionError("replica down")
+    router.lag_fn = unreachable
+    checker.check_now()
+    assert not checker.snapshot()["replica_0"].healthy
+    assert _usernames(client.get("/api/users")) == ["on-primary"]
+
+def test_replica_pool_is_labelled_for_sql_metrics(replicated):
+    before = DB_READ_ROUTING.labels("replica_0")._value.get()
+    replicated.test_client(use_cookies=False).get("/api/users")
+    assert DB_READ_ROUTING.labels("replica_0")._value.get() == before + 1
+    assert DB_POOL_SIZE.labels("replica_0")._value.get() == 5
+
+def test_round_robin_and_least_connections():
+    a, b = Replica("a", None), Replica("b", None)
+    router = ReplicaRouter([a, b])
+    assert [router.acquire().name for _ in range(4)] == ["a", "b", "a", "b"]
+
+    a.in_flight, b.in_flight = 0, 0
+    router = ReplicaRouter([a, b], balancing="least_connections")
+    first = router.acquire()
+    second = router.acquire()
+    assert {first.name, second.name} == {"a", "b"}
+    router.release(first)
+    assert router.acquire() is first
+
+    b.healthy = False
+    router = ReplicaRouter([a, b], balancing="least_connections")
+    assert router.acquire() is a
+    a.healthy = False
+    assert router.acquire() is None
+
+def test_unknown_balancing_is_rejected():
+    with pytest.raises(ValueError):
+        ReplicaRouter([], balancing="random")
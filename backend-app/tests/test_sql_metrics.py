@@ -0,0 +1,82 @@
+import logging
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+from src.main import create_app
+from src.models.user import db, User
+from src.sql_metrics import InstrumentedQueuePool, instrument_engine, normalize_sql
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+@pytest.mark.parametrize("statement, expected", [
+    ("SELECT users.id FROM users WHERE users.id = ?", "SELECT users.id FROM users WHERE users.id = ?"),
+    ("SELECT  *\n FROM users WHERE email = 'a@b.c' AND id > 42", "SELECT * FROM users WHERE email = ? AND id > ?"),
+    ("SELECT id FROM users WHERE id IN (%(id_1_1)s, %(id_1_2)s, %(id_1_3)s)", "SELECT id FROM users WHERE id IN (?)"),
+    ("SELECT anon_1.x::text FROM t WHERE y = $1", "SELECT anon_1.x::text FROM t WHERE y = ?"),
+])
+def test_normalize_sql(statement, expected):
+    assert normalize_sql(statement) == expected
+
+def test_request_counts_queries(app, client):
+    before = _sample("backend_sql_queries_per_request_count", endpoint="user.get_users")
+    response = client.get("/api/users")
+    assert response.status_code == 200
+    assert 'desc="1 queries"' in response.headers["Server-Timing"]
+    assert _sample("backend_sql_queries_per_request_count", endpoint="user.get_users") == before + 1
+
+def test_repeated_statements_are_flagged(app, client, caplog):
+    db.session.add(User(username="bilal", email="bilal@example.com"))
+    db.session.commit()
+
+    def n_plus_one():
+        for _ in range(6):
+            db.session.execute(text("SELECT username FROM users WHERE id = :id"), {"id": 1}).scalar()
+        return "ok"
+
+    app.add_url_rule("/n-plus-one", "n_plus_one", n_plus_one)
+    before = _sample("backend_sql_repeated_statements_total", endpoint="n_plus_one")
+    with caplog.at_level(logging.WARNING, logger="src.sql_metrics"):
+        client.get("/n-plus-one")
+    assert _sample("backend_sql_repeated_statements_total", endpoint="n_plus_one") == before + 1
+    assert "Possible N+1 on n_plus_one: 6 executions of SELECT username FROM users WHERE id = ?" in caplog.text
+
+def test_slow_queries_are_logged(tmp_path, caplog):
+    engine = create_engine(f"sqlite:///{tmp_path / 'slow.db'}")
+    instrument_engine(engine, "slow", slow_query_ms=0.000001)
+    with caplog.at_level(logging.WARNING, logger="src.sql_metrics"):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 'secret', 12"))
+    engine.dispose()
+    assert "on background: SELECT ?, ?" in caplog.text
+    assert "secret" not in caplog.text
+
+def test_pool_metrics(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=1
+    )
+    instrument_engine(engine, "pool-test")
+    waits = _sample("backend_db_pool_checkout_wait_seconds_count", pool="pool-test")
+    with engine.connect(), engine.connect():
+        assert _sample("backend_db_pool_checked_out", pool="pool-test") == 2
+        assert _sample("backend_db_pool_overflow", pool="pool-test") == 1
+        assert _sample("backend_db_pool_size", pool="pool-test") == 1
+    assert _sample("backend_db_pool_checked_out", pool="pool-test") == 0
+    assert _sample("backend_db_pool_overflow", pool="pool-test") == 0
+    assert _sample("backend_db_pool_checkout_wait_seconds_count", pool="pool-test") == waits + 2
+    # Le pool recréé par dispose() garde son nom
+    engine.dispose()
+    with engine.connect():
+        pass
+    assert _sample("backend_db_pool_checkout_wait_seconds_count", pool="pool-test") == waits + 3
+    engine.dispose()
+
+def test_instrumentation_can_be_disabled(monkeypatch):
+    monkeypatch.setenv("SQL_INSTRUMENTATION", "0")
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        response = app.test_client().get("/api/users")
+        db.drop_all()
+    assert response.status_code == 200
+    assert "Server-Timing" not in response.headers
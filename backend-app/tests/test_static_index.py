@@ -0,0 +1,67 @@
+import gzip
+import pytest
+from src.static_index import IMMUTABLE_CACHE, StaticIndex
+
+INDEX_HTML = "<html><body>" + "Accueil " * 200 + "</body></html>"
+APP_JS = "console.log('app');\n" * 200
+
+@pytest.fixture
+def spa(app, tmp_path):
+    """Frontend compilé façon Vite dans un static_folder temporaire"""
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "index.html").write_text(INDEX_HTML)
+    (tmp_path / "assets" / "index-Bx3kd9aZ.js").write_text(APP_JS)
+    (tmp_path / "assets" / "index-Bx3kd9aZ.js.br").write_bytes(b"fake-brotli")
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG" + b"\0" * 2048)
+    app.static_folder = str(tmp_path)
+    return app.test_client()
+
+def test_index_is_built_once(tmp_path):
+    (tmp_path / "a.txt").write_text("a")
+    index = StaticIndex(str(tmp_path))
+    assert set(index.files) == {"a.txt"}
+    assert StaticIndex(None).files == {}
+    assert StaticIndex(str(tmp_path / "missing")).files == {}
+
+def test_hashed_assets_are_immutable(spa):
+    response = spa.get("/assets/index-Bx3kd9aZ.js")
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == IMMUTABLE_CACHE
+    assert response.data.decode() == APP_JS
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert spa.get("/").headers["Cache-Control"] == "no-cache"
+
+def test_precompressed_variants(spa):
+    response = spa.get("/assets/index-Bx3kd9aZ.js", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["Content-Encoding"] == "br"
+    assert response.data == b"fake-brotli"
+
+    response = spa.get("/assets/index-Bx3kd9aZ.js", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.data).decode() == APP_JS
+
+    response = spa.get("/logo.png", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+
+def test_conditional_requests(spa):
+    first = spa.get("/index.html", headers={"Accept-Encoding": "gzip"})
+    etag = first.headers["ETag"]
+    second = spa.get("/index.html", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert second.status_code == 304
+    identity = spa.get("/index.html", headers={"If-None-Match": etag})
+    assert identity.status_code == 200
+
+def test_client_routes_fall_back_without_filesystem_calls(spa, monkeypatch):
+    def forbidden(path):
+        raise AssertionError("os.path.exists called during a request")
+
+    monkeypatch.setattr("os.path.exists", forbidden)
+    response = spa.get("/dashboard/settings")
+    assert response.status_code == 200
+    assert b"Accueil" in response.data
+
+def test_api_paths_do_not_fall_back(spa):
+    response = spa.get("/api/unknown")
+    assert response.status_code == 404
+    assert b"Accueil" not in response.data
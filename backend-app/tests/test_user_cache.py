@@ -0,0 +1,169 @@
+import pytest
+from sqlalchemy import event, update
+from src.cache import LRUCache, SharedCacheBackend, UserCache, init_user_cache
+from src.changes import UPDATE, record_changes
+from src.metrics import USER_CACHE_EVICTIONS, USER_CACHE_HITS, USER_CACHE_MISSES
+from src.models.user import db, User
+
+class FakeRedis:
+    """Stand-in local d'un client Redis partagé entre réplicas"""
+
+    def __init__(self):
+        self.store = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value, ex=None):
+        assert ex is None or ex >= 1
+        self.store[key] = value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
+
+@pytest.fixture
+def user_id(app):
+    user = User(username="cached", email="cached@example.com")
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+@pytest.fixture
+def queries(app):
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    yield statements
+    event.remove(db.engine, "before_cursor_execute", count)
+
+def test_lru_evicts_least_recently_used():
+    before = USER_CACHE_EVICTIONS.labels(reason="capacity")._value.get()
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set(1, "a")
+    cache.set(2, "b")
+    cache.get(1)
+    cache.set(3, "c")
+    assert cache.get(2) is None
+    assert cache.get(1) == "a"
+    assert USER_CACHE_EVICTIONS.labels(reason="capacity")._value.get() == before + 1
+
+def test_lru_expires_entries():
+    now = [0.0]
+    cache = LRUCache(maxsize=10, ttl=5, clock=lambda: now[0])
+    cache.set(1, "a")
+    now[0] = 4.9
+    assert cache.get(1) == "a"
+    now[0] = 5.0
+    assert cache.get(1) is None
+    assert len(cache) == 0
+
+def test_zero_ttl_disables_caching():
+    redis = FakeRedis()
+    cache = UserCache(LRUCache(ttl=0), SharedCacheBackend(redis, ttl=0))
+    cache.set(1, {"id": 1})
+    assert cache.get(1) is None
+    assert redis.store == {}
+
+    SharedCacheBackend(redis, ttl=0.5).set(1, ("data", "etag"))
+    assert list(redis.store) == ["backend:user:1"]
+
+def test_get_user_is_served_from_cache(client, user_id, queries):
+    first = client.get(f"/api/users/{user_id}")
+    assert first.status_code == 200
+    assert first.headers["ETag"]
+    hits = USER_CACHE_HITS.labels(tier="local")._value.get()
+
+    queries.clear()
+    second = client.get(f"/api/users/{user_id}")
+    assert second.get_json() == first.get_json()
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert queries == []
+    assert USER_CACHE_HITS.labels(tier="local")._value.get() == hits + 1
+
+def test_if_none_match_returns_304_without_db(client, user_id, queries):
+    etag = client.get(f"/api/users/{user_id}").headers["ETag"]
+    queries.clear()
+    response = client.get(f"/api/users/{user_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert response.headers["ETag"] == etag
+    assert queries == []
+
+def test_stale_if_none_match_returns_body(client, user_id):
+    response = client.get(f"/api/users/{user_id}", headers={"If-None-Match": '"stale"'})
+    assert response.status_code == 200
+    assert response.get_json()["username"] == "cached"
+
+def test_update_invalidates_cache(client, user_id):
+    etag = client.get(f"/api/users/{user_id}").headers["ETag"]
+    client.put(f"/api/users/{user_id}", json={"username": "renamed"})
+    response = client.get(f"/api/users/{user_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()["username"] == "renamed"
+    assert response.headers["ETag"] != etag
+
+def test_delete_invalidates_cache(client, user_id):
+    client.get(f"/api/users/{user_id}")
+    assert client.delete(f"/api/users/{user_id}").status_code == 204
+    assert client.get(f"/api/users/{user_id}").status_code == 404
+
+def test_shared_backend_is_shared_between_replicas(app, user_id):
+    redis = FakeRedis()
+    replica_a = init_user_cache(app, shared_client=redis)
+    with app.test_client() as client:
+        etag = client.get(f"/api/users/{user_id}").headers["ETag"]
+    assert len(redis.store) == 1
+
+    replica_b = UserCache(LRUCache(), SharedCacheBackend(redis))
+    misses = USER_CACHE_MISSES._value.get()
+    entry = replica_b.get(user_id)
+    assert entry.etag.strip('"') == etag.strip('"')
+    assert USER_CACHE_MISSES._value.get() == misses
+
+    replica_a.invalidate(user_id)
+    assert redis.store == {}
+
+def test_writes_from_other_workers_evict_local_copy(app, client, user_id):
+    cache = app.extensions["user_cache"]
+    etag = client.get(f"/api/users/{user_id}").headers["ETag"]
+
+    # Écriture d'un autre worker : ce processus n'a rien invalidé lui-même
+    db.session.execute(update(User).where(User.id == user_id).values(username="elsewhere", version=User.version + 1))
+    record_changes(db.session, UPDATE, [user_id])
+    db.session.commit()
+    assert client.get(f"/api/users/{user_id}").get_json()["username"] == "cached"
+
+    cache._next_sync = 0
+    response = client.get(f"/api/users/{user_id}")
+    assert response.get_json()["username"] == "elsewhere"
+    assert response.headers["ETag"] != etag
+
+def test_apply_changes_cursor_and_overflow():
+    cache = UserCache(LRUCache(), sync_interval=1)
+    for user_id in (1, 2, 3):
+        cache.local.set(user_id, "x")
+    cache.sync_cursor = 10
+    # seq 12 appartient à une transaction encore ouverte : le curseur s'arrête avant
+    cache.apply_changes([(11, 1, True), (12, 2, False), (13, 3, True)])
+    assert (cache.local.get(1), cache.local.get(2), cache.local.get(3)) == (None, None, None)
+    assert cache.sync_cursor == 11
+
+    cache.local.set(4, "x")
+    cache.apply_changes([(14, 5, True), (15, 6, True)], limit=1)
+    assert len(cache.local) == 0
+    assert cache.sync_cursor == 14
+
+def test_sync_purges_the_shared_tier():
+    redis = FakeRedis()
+    cache = UserCache(LRUCache(), SharedCacheBackend(redis), sync_interval=1)
+    # Version périmée déposée dans le backend partagé après l'invalidation de l'écriture
+    cache.set(1, {"id": 1, "username": "stale"})
+    cache.set(2, {"id": 2})
+    cache.sync_cursor = 10
+    cache.apply_changes([(11, 1, True)])
+    assert cache.get(1) is None
+    assert list(redis.store) == ["backend:user:2"]
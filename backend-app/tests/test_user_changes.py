@@ -0,0 +1,173 @@
+import json
+from datetime import datetime
+from sqlalchemy import create_engine, create_mock_engine, select, text
+from src import migrations
+from src.changes import changes_payload, prune_changes
+from src.models.user import db, User, UserChange
+from src.pagination import decode_cursor
+
+def _changes(client, since=None, **params):
+    if since is not None:
+        params["since"] = since
+    response = client.get("/api/users/changes", query_string=params)
+    assert response.status_code == 200
+    return response.get_json()
+
+def _sse_events(body):
+    """Événements `changes` d'un corps text/event-stream"""
+    events = []
+    for block in body.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line and not line.startswith(":"))
+        if fields.get("event") == "changes":
+            events.append((fields["id"], json.loads(fields["data"])))
+    return events
+
+def test_feed_starts_with_every_user(client):
+    ids = [client.post("/api/users", json={"username": f"u{i}", "email": f"u{i}@example.com"}).get_json()["id"]
+           for i in range(3)]
+    feed = _changes(client)
+    assert [change["op"] for change in feed["changes"]] == ["upsert"] * 3
+    assert [change["user"] for change in feed["changes"]] == [
+        {"id": user_id, "username": f"u{i}", "email": f"u{i}@example.com"} for i, user_id in enumerate(ids)
+    ]
+    assert feed["has_more"] is False
+    assert _changes(client, feed["cursor"]) == {"changes": [], "cursor": feed["cursor"], "has_more": False}
+
+def test_only_deltas_since_cursor_with_tombstones(client):
+    kept = client.post("/api/users", json={"username": "kept", "email": "kept@example.com"}).get_json()["id"]
+    gone = client.post("/api/users", json={"username": "gone", "email": "gone@example.com"}).get_json()["id"]
+    cursor = _changes(client)["cursor"]
+
+    client.put(f"/api/users/{kept}", json={"username": "renamed"})
+    client.put(f"/api/users/{kept}", json={"email": "renamed@example.com"})
+    client.put(f"/api/users/{gone}", json={"username": "doomed"})
+    client.delete(f"/api/users/{gone}")
+
+    feed = _changes(client, cursor)
+    # Une entrée par utilisateur : son état courant, ou sa suppression
+    assert feed["changes"] == [
+        {"op": "upsert", "id": kept, "user": {"id": kept, "username": "renamed", "email": "renamed@example.com"}},
+        {"op": "delete", "id": gone},
+    ]
+
+def test_failed_writes_are_not_journaled(client):
+    client.post("/api/users", json={"username": "a", "email": "a@example.com"})
+    cursor = _changes(client)["cursor"]
+    assert client.post("/api/users", json={"username": "b", "email": "A@example.com"}).status_code == 409
+    assert client.put("/api/users/999", json={"username": "x"}).status_code == 404
+    assert client.delete("/api/users/999").status_code == 404
+    assert _changes(client, cursor)["changes"] == []
+
+def test_feed_pages_with_limit(client):
+    for i in range(5):
+        client.post("/api/users", json={"username": f"p{i}", "email": f"p{i}@example.com"})
+    first = _changes(client, limit=2)
+    assert len(first["changes"]) == 2 and first["has_more"]
+    rest = _changes(client, first["cursor"], limit=10)
+    assert [c["user"]["username"] for c in rest["changes"]] == ["p2", "p3", "p4"]
+    assert not rest["has_more"]
+
+def test_invalid_cursor(client):
+    assert client.get("/api/users/changes?since=not-a-cursor").status_code == 400
+
+def test_batch_import_is_journaled(client):
+    cursor = _changes(client)["cursor"]
+    response = client.post("/api/users:batch", json=[
+        {"username": "b1", "email": "b1@example.com"},
+        {"username": "b2", "email": "b2@example.com"},
+        {"username": "b1", "email": "dup@example.com"},
+    ])
+    assert response.get_json()["summary"]["created"] == 2
+    assert [c["user"]["username"] for c in _changes(client, cursor)["changes"]] == ["b1", "b2"]
+
+def test_updated_at_follows_updates(app, client):
+    user_id = client.post("/api/users", json={"username": "t", "email": "t@example.com"}).get_json()["id"]
+    db.session.execute(text("UPDATE users SET updated_at = '2000-01-01 00:00:00' WHERE id = :id"), {"id": user_id})
+    db.session.commit()
+    client.put(f"/api/users/{user_id}", json={"username": "t2"})
+    db.session.expire_all()
+    assert db.session.get(User, user_id).updated_at.year > 2000
+
+def test_stream_pushes_changes_and_resumes(app, client):
+    app.config.update(CHANGE_FEED_POLL_INTERVAL=0.01, CHANGE_FEED_STREAM_SECONDS=0.2)
+    client.post("/api/users", json={"username": "s1", "email": "s1@example.com"})
+    response = client.get("/api/users/changes/stream")
+    assert response.mimetype == "text/event-stream"
+    body = response.get_data(as_text=True)
+    assert body.startswith("retry: 10\n\n")
+    [(event_id, payload)] = _sse_events(body)
+    assert payload["changes"][0]["user"]["username"] == "s1"
+    assert event_id == payload["cursor"]
+
+    client.post("/api/users", json={"username": "s2", "email": "s2@example.com"})
+    resumed = _sse_events(client.get("/api/users/changes/stream", headers={"Last-Event-ID": event_id}).get_data(as_text=True))
+    assert [c["user"]["username"] for _, payload in resumed for c in payload["changes"]] == ["s2"]
+    assert app.extensions["change_feed"].streams == 0
+
+def test_stream_limit_and_admission_exemption(app, client):
+    feed = app.extensions["change_feed"]
+    feed.max_streams = 0
+    response = client.get("/api/users/changes/stream")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert "/api/users/changes/stream" in app.config["ADMISSION_EXEMPT_PATHS"]
+
+def test_prune_keeps_current_state_and_expires_older_cursors(app, client):
+    kept = client.post("/api/users", json={"username": "kept", "email": "kept@example.com"}).get_json()["id"]
+    gone = client.post("/api/users", json={"username": "gone", "email": "gone@example.com"}).get_json()["id"]
+    old = _changes(client)["cursor"]
+    client.put(f"/api/users/{kept}", json={"username": "renamed"})
+    client.delete(f"/api/users/{gone}")
+    head = _changes(client, old)["cursor"]
+
+    floor, deleted = prune_changes(db.session, datetime(9999, 1, 1), "sqlite")
+    db.session.commit()
+    assert (floor, deleted) == (decode_cursor(head), 3)
+    assert db.session.execute(select(UserChange.user_id, UserChange.op)).all() == [(kept, "update")]
+
+    # Sans curseur, la table entière reste lisible ; un curseur d'avant le plancher a perdu des suppressions
+    assert [change["id"] for change in _changes(client)["changes"]] == [kept]
+    assert client.get("/api/users/changes", query_string={"since": old}).status_code == 410
+    assert client.get("/api/users/changes/stream", headers={"Last-Event-ID": old}).status_code == 410
+    assert _changes(client, head)["changes"] == []
+
+def test_prune_command_keeps_recent_changes(app, client):
+    client.post("/api/users", json={"username": "a", "email": "a@example.com"})
+    client.put("/api/users/1", json={"username": "b"})
+    cursor = _changes(client)["cursor"]
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=["changes-prune"]).output == "Pruned 0 changes, change log floor 0\n"
+
+    db.session.execute(text("UPDATE user_changes SET changed_at = '2000-01-01 00:00:00'"))
+    db.session.commit()
+    assert runner.invoke(args=["changes-prune"]).output == f"Pruned 1 changes, change log floor {decode_cursor(cursor)}\n"
+    assert _changes(client, cursor)["changes"] == []
+
+def test_migration_backfills_existing_users(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'changes.db'}")
+    four = [m for m in migrations.discover() if m.version <= 4]
+    migrations.upgrade(engine, target=four[-1].version)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (username, email, created_at) VALUES ('old', 'old@example.com', '2020-05-01 00:00:00')"))
+    migrations.upgrade(engine)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT user_id, op FROM user_changes")).all() == [(1, "create")]
+        assert conn.execute(text("SELECT updated_at FROM users")).scalar().startswith("2020-05-01")
+    engine.dispose()
+
+def test_page_stops_before_unfinished_transaction():
+    # (seq, user_id, id, username, email, settled) : seq 2 peut encore être validé
+    rows = [(1, 10, 10, "a", "a@example.com", True), (2, 11, None, None, None, False),
+            (3, 12, 12, "c", "c@example.com", True)]
+    payload = changes_payload(rows, since=0, limit=2)
+    assert [change["id"] for change in payload["changes"]] == [10]
+    assert decode_cursor(payload["cursor"]) == 1
+    assert payload["has_more"] is False
+
+def test_create_all_sets_txid_default_on_postgres():
+    statements = []
+    def executor(sql, *args, **kwargs):
+        statements.append(str(sql.compile(dialect=engine.dialect)))
+    engine = create_mock_engine("postgresql://", executor)
+    UserChange.__table__.create(engine)
+    assert any("SET DEFAULT txid_current()" in statement for statement in statements)
@@ -0,0 +1,99 @@
+import threading
+import pytest
+from src import migrations
+from src.main import create_app
+from src.models.user import db, User
+
+@pytest.fixture
+def file_app(tmp_path, monkeypatch):
+    """Application sur une base SQLite fichier partagée entre threads"""
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'race.db'}")
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        migrations.upgrade(db.engine)
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+def _race(app, requests):
+    """Envoie les requêtes depuis des threads démarrés ensemble, renvoie les réponses"""
+    barrier = threading.Barrier(len(requests))
+    responses = [None] * len(requests)
+
+    def send(index, method, path, kwargs):
+        client = app.test_client()
+        barrier.wait()
+        responses[index] = client.open(path, method=method, **kwargs)
+
+    threads = [threading.Thread(target=send, args=(i, *request)) for i, request in enumerate(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return responses
+
+def test_duplicate_email_race_yields_one_201_and_409s(file_app):
+    responses = _race(file_app, [
+        ("POST", "/api/users", {"json": {"username": f"racer{i}", "email": "same@example.com"}})
+        for i in range(8)
+    ])
+    assert sorted(r.status_code for r in responses) == [201] + [409] * 7
+    assert all(b"Email already exists" in r.data for r in responses if r.status_code == 409)
+    with file_app.app_context():
+        assert db.session.query(User).count() == 1
+
+def test_concurrent_editors_cannot_lose_updates(file_app):
+    client = file_app.test_client()
+    user_id = client.post("/api/users", json={"username": "shared", "email": "shared@example.com"}).get_json()["id"]
+    etag = client.get(f"/api/users/{user_id}").headers["ETag"]
+
+    responses = _race(file_app, [
+        ("PUT", f"/api/users/{user_id}", {"json": {"username": f"editor{i}"}, "headers": {"If-Match": etag}})
+        for i in range(2)
+    ])
+    statuses = sorted(r.status_code for r in responses)
+    assert statuses == [200, 412]
+    winner = next(r for r in responses if r.status_code == 200)
+
+    current = client.get(f"/api/users/{user_id}")
+    assert current.get_json() == winner.get_json()
+    assert current.headers["ETag"] == winner.headers["ETag"] != etag
+
+def test_if_match_preconditions(client):
+    created = client.post("/api/users", json={"username": "bilal", "email": "bilal@example.com"})
+    user_id, etag = created.get_json()["id"], created.headers["ETag"]
+    assert client.get(f"/api/users/{user_id}").headers["ETag"] == etag
+
+    weak = client.put(f"/api/users/{user_id}", json={"username": "x"}, headers={"If-Match": f"W/{etag}"})
+    assert weak.status_code == 412
+    assert client.put(f"/api/users/{user_id}", json={"username": "x"}, headers={"If-Match": '"other"'}).status_code == 412
+    for tag in ('"v99999999999999999999"', '"v\u00b2"'):
+        assert client.put(f"/api/users/{user_id}", json={"username": "x"}, headers={"If-Match": tag}).status_code == 412
+
+    updated = client.put(f"/api/users/{user_id}", json={"username": "renamed"}, headers={"If-Match": etag})
+    assert updated.status_code == 200
+    stale = client.put(f"/api/users/{user_id}", json={"username": "late"}, headers={"If-Match": etag})
+    assert stale.status_code == 412
+    assert b"modified by another request" in stale.data
+    assert client.put(f"/api/users/{user_id}", json={"username": "any"}, headers={"If-Match": "*"}).status_code == 200
+    assert client.put("/api/users/999", json={"username": "x"}, headers={"If-Match": etag}).status_code == 404
+
+def test_if_match_can_be_required(app, client):
+    app.config["USER_UPDATE_REQUIRE_IF_MATCH"] = True
+    user_id = client.post("/api/users", json={"username": "bilal", "email": "bilal@example.com"}).get_json()["id"]
+    assert client.put(f"/api/users/{user_id}", json={"username": "x"}).status_code == 428
+
+def test_username_conflicts_are_409(client):
+    client.post("/api/users", json={"username": "taken", "email": "a@example.com"})
+    response = client.post("/api/users", json={"username": "taken", "email": "b@example.com"})
+    assert response.status_code == 409
+    assert b"Username already exists" in response.data
+
+    user_id = client.post("/api/users", json={"username": "other", "email": "c@example.com"}).get_json()["id"]
+    response = client.put(f"/api/users/{user_id}", json={"email": "A@example.com"})
+    assert response.status_code == 409
+    assert b"Email already in use by another user" in response.data
+    response = client.put(f"/api/users/{user_id}", json={"username": "taken"})
+    assert response.status_code == 409
+    assert b"Username already in use by another user" in response.data
@@ -13,7 +13,7 @@ def test_create_user_existing_email(client):
     
     payload = {"username": "new", "email": "email@example.com"}
     response = client.post("/api/users", json=payload)
-    assert response.status_code == 400
+    assert response.status_code == 409
     assert b"Email already exists" in response.data
 
 def test_update_user_not_found(client):
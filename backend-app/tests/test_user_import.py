@@ -0,0 +1,65 @@
+import json
+from src.models.user import db, User
+
+def test_batch_import_json_array(client):
+    payload = [
+        {"username": "alice", "email": "alice@example.com"},
+        {"username": "bob", "email": "bob@example.com"},
+    ]
+    response = client.post("/api/users:batch", json=payload)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["summary"] == {"created": 2, "duplicate": 0, "invalid": 0}
+    assert [row["status"] for row in data["results"]] == ["created", "created"]
+    assert client.get(f"/api/users/{data['results'][1]['id']}").get_json()["username"] == "bob"
+
+def test_batch_import_reports_each_row(client):
+    with client.application.app_context():
+        db.session.add(User(username="existing", email="taken@example.com"))
+        db.session.commit()
+
+    payload = [
+        {"username": "new", "email": "new@example.com"},
+        {"username": "dup", "email": "taken@example.com"},
+        {"username": "missing-email"},
+        {"username": "again", "email": "new@example.com"},
+        "not-an-object",
+    ]
+    data = client.post("/api/users:batch?batch_size=2", json=payload).get_json()
+    assert [row["status"] for row in data["results"]] == [
+        "created", "duplicate", "invalid", "duplicate", "invalid",
+    ]
+    assert [row["index"] for row in data["results"]] == [0, 1, 2, 3, 4]
+    assert data["summary"] == {"created": 1, "duplicate": 2, "invalid": 2}
+
+def test_batch_import_ndjson_stream(client):
+    lines = [json.dumps({"username": f"u{i}", "email": f"u{i}@example.com"}) for i in range(5)]
+    body = "\n".join(lines[:3] + ["{broken"] + lines[3:]) + "\n"
+    response = client.post(
+        "/api/users:batch?batch_size=2", data=body, content_type="application/x-ndjson"
+    )
+    data = response.get_json()
+    assert data["summary"] == {"created": 5, "duplicate": 0, "invalid": 1}
+    assert data["results"][3]["status"] == "invalid"
+    with client.application.app_context():
+        assert db.session.query(User).count() == 5
+
+def test_batch_import_rejects_non_array(client):
+    response = client.post("/api/users:batch", json={"username": "x", "email": "x@example.com"})
+    assert response.status_code == 400
+    assert client.post("/api/users:batch?batch_size=0", json=[]).status_code == 400
+
+def test_single_create_validates_like_the_batch(client):
+    rows = [
+        {"username": "x" * 500, "email": "long@example.com"},
+        {"username": "noat", "email": "example.com"},
+        {"username": "", "email": "empty@example.com"},
+    ]
+    batch = client.post("/api/users:batch", json=rows).get_json()
+    assert [row["status"] for row in batch["results"]] == ["invalid"] * 3
+    for row, result in zip(rows, batch["results"]):
+        response = client.post("/api/users", json=row)
+        assert response.status_code == 400
+        assert result["error"].encode() in response.data
+    with client.application.app_context():
+        assert db.session.query(User).count() == 0
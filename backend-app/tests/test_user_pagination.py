@@ -0,0 +1,75 @@
+import pytest
+from src.models.user import db, User
+from src.pagination import decode_cursor, encode_cursor
+
+def _seed(app, count):
+    with app.app_context():
+        db.session.add_all([
+            User(username=f"user{i:03d}", email=f"user{i:03d}@example.com")
+            for i in range(count)
+        ])
+        db.session.commit()
+
+def test_cursor_roundtrip():
+    assert decode_cursor(encode_cursor(42)) == 42
+    assert decode_cursor(None) is None
+
+def test_invalid_cursor(client):
+    response = client.get("/api/users?after=not-a-cursor")
+    assert response.status_code == 400
+    assert b"Invalid cursor" in response.data
+
+@pytest.mark.parametrize("last_id", [10**30, 2**63, -1])
+def test_out_of_range_cursor(client, last_id):
+    cursor = encode_cursor(last_id)
+    for url in (f"/api/users?after={cursor}", f"/api/users/changes?since={cursor}"):
+        response = client.get(url)
+        assert response.status_code == 400
+        assert b"Invalid cursor" in response.data
+    assert decode_cursor(encode_cursor(2**63 - 1)) == 2**63 - 1
+
+def test_invalid_limit(client):
+    assert client.get("/api/users?limit=abc").status_code == 400
+    assert client.get("/api/users?limit=0").status_code == 400
+
+def test_paginate_through_all_users(app, client):
+    _seed(app, 25)
+    seen = []
+    url = "/api/users?limit=10"
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        seen.extend(user["id"] for user in response.get_json())
+        cursor = response.headers.get("X-Next-Cursor")
+        url = f"/api/users?limit=10&after={cursor}" if cursor else None
+    assert len(seen) == 25
+    assert seen == sorted(seen)
+
+def test_next_link_header(app, client):
+    _seed(app, 3)
+    response = client.get("/api/users?limit=2&username=user")
+    assert 'rel="next"' in response.headers["Link"]
+    assert "username=user" in response.headers["Link"]
+    last = client.get(f"/api/users?limit=2&after={response.headers['X-Next-Cursor']}")
+    assert len(last.get_json()) == 1
+    assert "Link" not in last.headers
+
+def test_fields_projection(app, client):
+    _seed(app, 2)
+    users = client.get("/api/users?fields=username").get_json()
+    assert users == [{"username": "user000"}, {"username": "user001"}]
+
+def test_unknown_field(client):
+    response = client.get("/api/users?fields=password")
+    assert response.status_code == 400
+    assert b"Unknown fields" in response.data
+
+def test_prefix_filters(app, client):
+    _seed(app, 12)
+    with app.app_context():
+        db.session.add(User(username="us%er", email="other@example.org"))
+        db.session.commit()
+    users = client.get("/api/users?username=user01").get_json()
+    assert [user["username"] for user in users] == ["user010", "user011"]
+    assert client.get("/api/users?email=other@").get_json()[0]["username"] == "us%er"
+    assert client.get("/api/users?username=us%25").get_json()[0]["username"] == "us%er"
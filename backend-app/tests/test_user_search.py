@@ -0,0 +1,54 @@
+import pytest
+from src.models.user import db, User
+
+@pytest.fixture
+def users(app):
+    db.session.add_all([
+        User(username="Bilal", email="bilal@example.com"),
+        User(username="billy", email="b.kid@example.org"),
+        User(username="zoe", email="Billing@corp.example"),
+        User(username="a_b", email="under%score@example.com"),
+    ])
+    db.session.commit()
+
+def _names(response):
+    return [user["username"] for user in response.get_json()]
+
+def test_prefix_search_is_case_insensitive(client, users):
+    response = client.get("/api/users/search?q=BIL")
+    assert response.status_code == 200
+    assert _names(response) == ["Bilal", "billy", "zoe"]
+    assert response.get_json()[0] == {"id": 1, "username": "Bilal", "email": "bilal@example.com"}
+
+def test_prefix_search_matches_email(client, users):
+    assert _names(client.get("/api/users/search?q=b.k")) == ["billy"]
+
+def test_wildcards_are_literal(client, users):
+    assert _names(client.get("/api/users/search?q=a_")) == ["a_b"]
+    assert _names(client.get("/api/users/search?q=a%")) == []
+    assert _names(client.get("/api/users/search?q=score&mode=contains")) == ["a_b"]
+    assert _names(client.get("/api/users/search?q=%25score&mode=contains")) == ["a_b"]
+
+@pytest.mark.parametrize("suffix", ["\U0010ffff", "\ud7ff"])
+def test_prefix_search_at_the_end_of_unicode(client, suffix):
+    db.session.add_all([User(username=f"a{suffix}b", email="max@example.com"),
+                        User(username="b", email="other@example.com")])
+    db.session.commit()
+    assert _names(client.get("/api/users/search", query_string={"q": f"a{suffix}"})) == [f"a{suffix}b"]
+    assert _names(client.get("/api/users/search", query_string={"q": suffix})) == []
+
+def test_contains_mode(client, users):
+    assert _names(client.get("/api/users/search?q=ill&mode=contains")) == ["billy", "zoe"]
+
+def test_limit_and_fields(client, users):
+    response = client.get("/api/users/search?q=b&limit=1&fields=email")
+    assert response.get_json() == [{"email": "bilal@example.com"}]
+
+@pytest.mark.parametrize("query", ["", "q=", "q=bil&mode=fuzzy", "q=bil&limit=0"])
+def test_invalid_queries(client, query):
+    assert client.get(f"/api/users/search?{query}").status_code == 400
+
+def test_email_uniqueness_ignores_case(client, users):
+    response = client.post("/api/users", json={"username": "other", "email": "BILAL@example.com"})
+    assert response.status_code == 409
+    assert b"Email already exists" in response.data
@@ -0,0 +1,115 @@
+from datetime import datetime
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.orm import Session
+from src import migrations
+from src.changes import DELETE
+from src.metrics import USER_SIGNUPS, USERS_TOTAL
+from src.models.user import db, User, UserStat
+from src.stats import DAY, HOUR, TOTAL, reconcile, record_stats
+
+def _stats(client, **params):
+    response = client.get("/api/stats/users", query_string=params)
+    assert response.status_code == 200
+    return response.get_json()
+
+def _create(client, name):
+    return client.post("/api/users", json={"username": name, "email": f"{name}@example.com"}).get_json()["id"]
+
+def _freeze_at_last_signup(monkeypatch):
+    """Fige l'horloge des statistiques sur la dernière inscription : aucun changement d'heure entre écriture et lecture"""
+    now = db.session.execute(select(func.max(User.created_at))).scalar()
+    monkeypatch.setattr("src.stats.utcnow", lambda: now)
+
+def test_stats_follow_creates_deletes_and_imports(client, monkeypatch):
+    assert _stats(client)["total"] == 0
+    ids = [_create(client, f"u{i}") for i in range(3)]
+    client.delete(f"/api/users/{ids[0]}")
+    client.post("/api/users:batch", json=[
+        {"username": "b1", "email": "b1@example.com"},
+        {"username": "b2", "email": "b2@example.com"},
+        {"username": "u1", "email": "dup@example.com"},
+    ])
+    # Les écritures refusées ne comptent pas
+    assert client.post("/api/users", json={"username": "x", "email": "U1@example.com"}).status_code == 409
+    assert client.delete("/api/users/999").status_code == 404
+
+    _freeze_at_last_signup(monkeypatch)
+    stats = _stats(client)
+    assert stats["total"] == 4
+    assert sum(point["signups"] for point in stats["signups"]["day"]) == 4
+    assert sum(point["signups"] for point in stats["signups"]["hour"]) == 4
+
+def test_series_are_dense_and_bounded(client, monkeypatch):
+    _create(client, "a")
+    _freeze_at_last_signup(monkeypatch)
+    stats = _stats(client, days=3, hours=5)
+    days, hours = stats["signups"]["day"], stats["signups"]["hour"]
+    assert [len(days), len(hours)] == [3, 5]
+    assert [point["signups"] for point in days] == [0, 0, 1]
+    periods = [datetime.fromisoformat(point["period"]) for point in hours]
+    assert all((later - earlier).total_seconds() == 3600 for earlier, later in zip(periods, periods[1:]))
+
+    assert len(_stats(client, days=10000)["signups"]["day"]) == 366
+    assert client.get("/api/stats/users?hours=0").status_code == 400
+    assert client.get("/api/stats/users?days=x").status_code == 400
+
+def test_endpoint_sets_gauges(client, monkeypatch):
+    _create(client, "g")
+    _freeze_at_last_signup(monkeypatch)
+    _stats(client)
+    assert USERS_TOTAL._value.get() == 1
+    assert USER_SIGNUPS.labels("hour")._value.get() == 1
+
+def test_reconcile_corrects_drift(app, client):
+    for name in ("r1", "r2"):
+        _create(client, name)
+    db.session.execute(text("UPDATE user_stats SET users = users + 5 WHERE granularity IN ('total', 'day')"))
+    db.session.execute(text("INSERT INTO users (username, email, created_at) VALUES ('old', 'old@example.com', '2020-05-01 10:30:00')"))
+    db.session.commit()
+    assert _stats(client)["total"] == 7
+
+    assert reconcile(db.session) == {"total": 3, "drift": -4, "buckets": 4}
+    db.session.commit()
+    stats = _stats(client)
+    assert stats["total"] == 3
+    assert stats["signups"]["day"][-1]["signups"] == 2
+    assert stats["reconciled_at"] is not None
+    assert db.session.get(UserStat, (HOUR, datetime(2020, 5, 1, 10))).users == 1
+
+    # Un recalcul trop proche du précédent est ignoré
+    assert reconcile(db.session, min_interval=3600) is None
+
+def test_reconcile_command(app, client):
+    _create(client, "c")
+    result = app.test_cli_runner().invoke(args=["stats-reconcile"])
+    assert result.exit_code == 0
+    assert "1 users" in result.output
+
+def test_migration_backfill_matches_application_keys(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'stats.db'}")
+    five = [m for m in migrations.discover() if m.version <= 5]
+    migrations.upgrade(engine, target=five[-1].version)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (username, email, created_at) VALUES "
+                          "('a', 'a@example.com', '2020-05-01 10:30:00'), ('b', 'b@example.com', '2020-05-01 11:05:00')"))
+    migrations.upgrade(engine)
+    with Session(engine) as session:
+        assert session.get(UserStat, (TOTAL, datetime(1970, 1, 1))).users == 2
+        assert session.get(UserStat, (DAY, datetime(2020, 5, 1))).users == 2
+        # Les UPSERT de l'application retrouvent les lignes de la migration
+        record_stats(session, DELETE, [datetime(2020, 5, 1, 10, 30)])
+        session.commit()
+        assert session.get(UserStat, (HOUR, datetime(2020, 5, 1, 10))).users == 0
+        assert session.get(UserStat, (DAY, datetime(2020, 5, 1))).users == 1
+        assert session.query(UserStat).count() == 4
+    engine.dispose()
+
+def test_scheduler_reconciles_when_due(app, client):
+    _create(client, "s")
+    db.session.execute(text("UPDATE user_stats SET users = 9 WHERE granularity = 'total'"))
+    db.session.commit()
+    scheduler = app.extensions["user_stats"]
+    scheduler._next_reconcile = 0
+    scheduler.run_once()
+    assert _stats(client)["total"] == 1
+    assert USERS_TOTAL._value.get() == 1
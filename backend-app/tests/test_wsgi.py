@@ -0,0 +1,78 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+from src.database import engine_options_from_env
+from src.sql_metrics import InstrumentedQueuePool
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_engine_options_for_postgres(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "20")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "5")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+    monkeypatch.setenv("DB_STATEMENT_TIMEOUT_MS", "2500")
+    options = engine_options_from_env("postgresql://u:p@db/app")
+    assert options["pool_size"] == 20
+    assert options["max_overflow"] == 5
+    assert options["pool_pre_ping"] is False
+    assert options["pool_recycle"] == 1800
+    assert options["connect_args"] == {"options": "-c statement_timeout=2500"}
+    assert options["poolclass"] is InstrumentedQueuePool
+
+def test_engine_options_leave_sqlite_alone(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "20")
+    assert engine_options_from_env("sqlite:///:memory:") == {}
+    assert engine_options_from_env(None) == {}
+
+def test_serve_command_is_registered(app):
+    assert "serve" in app.cli.commands
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _wait_for(url, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            return urllib.request.urlopen(url, timeout=1).read()
+        except OSError:
+            time.sleep(0.1)
+    raise AssertionError(f"{url} did not come up")
+
+def test_serve_aggregates_metrics_across_workers(tmp_path):
+    pytest.importorskip("gunicorn")
+    port = _free_port()
+    env = dict(
+        os.environ,
+        SECRET_KEY="test",
+        DATABASE_URL=f"sqlite:///{tmp_path / 'app.db'}",
+        PROMETHEUS_MULTIPROC_DIR=str(tmp_path / "metrics"),
+        GUNICORN_ACCESSLOG="",
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "flask", "--app", "src.main", "serve",
+         "--bind", f"127.0.0.1:{port}", "--workers", "2", "--threads", "2"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        base = f"http://127.0.0.1:{port}"
+        _wait_for(f"{base}/api/infrastructure")
+        for _ in range(19):
+            urllib.request.urlopen(f"{base}/api/infrastructure").read()
+        metrics = urllib.request.urlopen(f"{base}/metrics").read().decode()
+        total = sum(
+            float(line.rsplit(" ", 1)[1]) for line in metrics.splitlines()
+            if line.startswith("flask_http_request_total{") and 'status="200"' in line
+        )
+        assert total >= 20
+    finally:
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(timeout=30) == 0
@@ -1,5 +1,7 @@
 #!/bin/sh
 # Script de sauvegarde PostgreSQL
+# Dump parallèle au format répertoire (pg_dump -Fd -j N), compressé en flux
+# et vérifiable par sommes sha256 : voir backend-app/src/backup.py
 
 # Variables
 BACKUP_DIR="/backup"
@@ -7,46 +9,53 @@ DB_HOST="${DB_HOST:-postgres}"
 DB_NAME="${DB_NAME:-wordpress_prod}"
 DB_USER="${DB_USER:-wp_user}"
 RETENTION_DAYS="${BACKUP_RETENTION_DAYS:-30}"
+BACKUP_JOBS="${BACKUP_JOBS:-4}"
+# gzip, zstd (paquet zstandard) ou lz4 (paquet lz4)
+BACKUP_COMPRESSION="${BACKUP_COMPRESSION:-gzip}"
+# Répertoire de backend-app (code de l'outil de sauvegarde)
+BACKUP_TOOL_DIR="${BACKUP_TOOL_DIR:-/app}"
 
 # Créer le répertoire de sauvegarde
 mkdir -p "${BACKUP_DIR}"
 
 # Fonction de sauvegarde
 backup_database() {
-    TIMESTAMP=$(date +"%Y%m%d_%H%M%S")
-    BACKUP_FILE="${BACKUP_DIR}/postgres_backup_${TIMESTAMP}.sql.gz"
-
     echo "$(date): Début de la sauvegarde de ${DB_NAME}"
 
-    # Sauvegarde avec compression
-    pg_dump -h "$DB_HOST" -U "$DB_USER" "$DB_NAME" | gzip > "$BACKUP_FILE"
-
-    if [ $? -eq 0 ]; then
-        echo "$(date): Sauvegarde réussie: ${BACKUP_FILE}"
-        # Suppression des anciennes sauvegardes
-        find "$BACKUP_DIR" -name "postgres_backup_*.sql.gz" -mtime +$RETENTION_DAYS -exec rm {} \;
+    # Sauvegarde parallèle, rapport JSON (durées et débits par table) sur la sortie standard
+    # puis suppression des sauvegardes de plus de RETENTION_DAYS jours
+    if (cd "$BACKUP_TOOL_DIR" && python3 -m src.backup backup \
+        --host "$DB_HOST" --user "$DB_USER" --dbname "$DB_NAME" \
+        --output-dir "$BACKUP_DIR" --jobs "$BACKUP_JOBS" \
+        --compression "$BACKUP_COMPRESSION" --retention-days "$RETENTION_DAYS"); then
+        echo "$(date): Sauvegarde réussie dans ${BACKUP_DIR}"
         echo "$(date): Nettoyage des sauvegardes de plus de $RETENTION_DAYS jours terminé"
     else
         echo "$(date): Erreur lors de la sauvegarde de la base de données"
-        exit 1
+        return 1
     fi
 }
 
-# Création du fichier de cron si inexistant
-if [ ! -f /etc/crontabs/root ]; then
-    touch /etc/crontabs/root
-fi
-
-# Ajouter tâche cron (à 2h chaque jour)
-echo "0 2 * * * /backup.sh backup >> /var/log/backup.log 2>&1" > /etc/crontabs/root
-
-# Démarrer cron si pas encore lancé (utile en conteneur)
-crond
-
 # Exécution immédiate si demandé
 if [ "$1" = "backup" ]; then
     backup_database
+    exit $?
+fi
+
+# Planification quotidienne à 2h : cron s'il est disponible, sinon boucle
+if command -v crond >/dev/null 2>&1; then
+    mkdir -p /etc/crontabs
+    echo "0 2 * * * /backup.sh backup >> /var/log/backup.log 2>&1" > /etc/crontabs/root
+    exec crond -f
 fi
 
-# Garde le conteneur actif si besoin
-tail -f /dev/null
+while true; do
+    # Secondes jusqu'au prochain 2h00
+    NOW=$(date +%s)
+    NEXT=$(date -d "tomorrow 02:00" +%s)
+    if [ "$(date +%H)" -lt 2 ]; then
+        NEXT=$(date -d "today 02:00" +%s)
+    fi
+    sleep $((NEXT - NOW))
+    backup_database || echo "$(date): Nouvelle tentative au prochain créneau"
+done
@@ -14,6 +14,10 @@ YELLOW='\033[1;33m'
 BLUE='\033[0;34m'
 NC='\033[0m'
 
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+BACKEND_DIR="$SCRIPT_DIR/../backend-app"
+REPORT_DIR="${REPORT_DIR:-$(mktemp -d)}"
+
 # Fonction pour tester les performances d'un service
 performance_test() {
     local service_name="$1"
@@ -29,40 +33,15 @@ performance_test() {
     PF_PID=$!
     sleep 5
     
-    # Test avec curl (simulation de charge légère)
-    echo "Exécution de $requests requêtes vers $service_name..."
-    
-    start_time=$(date +%s)
-    success_count=0
-    total_time=0
-    
-    for i in $(seq 1 $requests); do
-        response_time=$(curl -s -w "%{time_total}" -o /dev/null "http://localhost:$port$endpoint" 2>/dev/null || echo "999")
-        if [ "$response_time" != "999" ]; then
-            success_count=$((success_count + 1))
-            total_time=$(echo "$total_time + $response_time" | bc -l)
-        fi
-        
-        if [ $((i % 10)) -eq 0 ]; then
-            echo -n "."
-        fi
-    done
-    echo ""
-    
-    end_time=$(date +%s)
-    duration=$((end_time - start_time))
-    
-    if [ "$success_count" -gt 0 ]; then
-        avg_response_time=$(echo "scale=3; $total_time / $success_count" | bc -l)
-        success_rate=$(echo "scale=2; $success_count * 100 / $requests" | bc -l)
-        
-        echo -e "${GREEN}Résultats:${NC}"
-        echo "  - Requêtes réussies: $success_count/$requests ($success_rate%)"
-        echo "  - Temps de réponse moyen: ${avg_response_time}s"
-        echo "  - Durée totale: ${duration}s"
-        echo "  - Débit: $(echo "scale=2; $success_count / $duration" | bc -l) req/s"
+    # Charge concurrente via le banc Python (latences p50/p95/p99, débit, erreurs)
+    echo "Exécution de $requests requêtes vers $service_name (concurrence 1 et 8)..."
+    if (cd "$BACKEND_DIR" && python3 -m benchmarks.loadtest --mode external \
+            --target "http://localhost:$port" --path "$endpoint" \
+            --requests "$requests" --concurrency 1 8 \
+            --output "$REPORT_DIR/$service_name.json"); then
+        echo -e "${GREEN}Résultats:${NC} $REPORT_DIR/$service_name.json"
     else
-        echo -e "${RED}Aucune requête réussie${NC}"
+        echo -e "${RED}Erreurs pendant le test de $service_name${NC}"
     fi
     
     kill $PF_PID 2>/dev/null || true
@@ -139,14 +118,30 @@ generate_health_report() {
     kubectl get certificates --all-namespaces 2>/dev/null | grep "True" | wc -l | xargs echo "Certificats valides:" || echo "Cert-manager non configuré"
 }
 
-if ! command -v bc &> /dev/null; then
-    echo "Installation de bc pour les calculs..."
-    sudo apt-get update && sudo apt-get install -y bc
-fi
+# Banc local du backend (sans cluster) comparé à une référence mesurée sur cette
+# machine (non versionnée) : enregistrée au premier passage, ou avec REFRESH_BASELINE=1
+test_backend_local() {
+    echo -e "${BLUE}=== BANC LOCAL DU BACKEND (WSGI/ASGI en processus) ===${NC}"
+    local baseline="benchmarks/baseline-local.json"
+    if [ ! -f "$BACKEND_DIR/$baseline" ] || [ "${REFRESH_BASELINE:-0}" = "1" ]; then
+        (cd "$BACKEND_DIR" && python3 -m benchmarks.loadtest \
+            --save-baseline "$baseline" --output "$REPORT_DIR/backend-local.json") \
+            && echo -e "${YELLOW}Référence locale enregistrée dans backend-app/$baseline${NC}" \
+            || echo -e "${RED}Erreurs pendant le banc (voir $REPORT_DIR/backend-local.json)${NC}"
+    else
+        (cd "$BACKEND_DIR" && python3 -m benchmarks.loadtest \
+            --baseline "$baseline" --max-regression 0.5 \
+            --output "$REPORT_DIR/backend-local.json") \
+            || echo -e "${RED}Régression détectée (voir $REPORT_DIR/backend-local.json ; REFRESH_BASELINE=1 après un changement de machine)${NC}"
+    fi
+    echo ""
+}
 
 echo -e "${YELLOW}Début des tests de performance...${NC}"
 echo ""
 
+test_backend_local
+
 echo -e "${BLUE}=== TESTS DE PERFORMANCE DES SERVICES ===${NC}"
 performance_test "frontend-service" "default" "80" "/" "50"
 performance_test "backend-service" "default" "5000" "/health" "30"
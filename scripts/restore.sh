@@ -1,28 +1,38 @@
 #!/bin/sh
 # Script de restauration PostgreSQL
+# Vérifie les sommes sha256, décompresse puis restaure en parallèle
+# (pg_restore -j N) : voir backend-app/src/backup.py.
+# Usage : ./scripts/restore.sh [chemin de sauvegarde] (la plus récente par défaut)
 
 # Variables
-BACKUP_DIR="./postgres/backup"
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+BACKUP_DIR="${BACKUP_DIR:-$SCRIPT_DIR/../postgres/backup}"
 DB_HOST="${DB_HOST:-localhost}"
 DB_NAME="${DB_NAME:-wordpress_prod}"
 DB_USER="${DB_USER:-wp_user}"
+BACKUP_JOBS="${BACKUP_JOBS:-4}"
+BACKUP_TOOL_DIR="${BACKUP_TOOL_DIR:-$SCRIPT_DIR/../backend-app}"
+# Mot de passe : PGPASSWORD (ou ~/.pgpass), jamais dans la ligne de commande (visible dans ps)
 
-# Détecter le dernier fichier de sauvegarde
-LATEST_BACKUP=$(ls -t "$BACKUP_DIR"/postgres_backup_*.sql.gz 2>/dev/null | head -n1)
+# Chemins relatifs résolus avant le cd vers BACKUP_TOOL_DIR
+case "$1" in
+  ""|/*) ;;
+  *) set -- "$(pwd)/$1" ;;
+esac
+case "$BACKUP_DIR" in
+  /*) ;;
+  *) BACKUP_DIR="$(pwd)/$BACKUP_DIR" ;;
+esac
 
-if [ -z "$LATEST_BACKUP" ]; then
-  echo " Aucun fichier de sauvegarde trouvé dans $BACKUP_DIR"
-  exit 1
-fi
-
-echo " Dernière sauvegarde trouvée : $LATEST_BACKUP"
-echo " Décompression et restauration en cours..."
+echo " Restauration depuis ${1:-la dernière sauvegarde de $BACKUP_DIR}"
+echo " Vérification, décompression et restauration en cours..."
 
-# Décompression et restauration dans PostgreSQL
-gunzip -c "$LATEST_BACKUP" | psql -h "$DB_HOST" -U "$DB_USER" "$DB_NAME"
-
-if [ $? -eq 0 ]; then
+# Les anciennes sauvegardes .sql.gz sont rejouées avec psql
+if (cd "$BACKUP_TOOL_DIR" && python3 -m src.backup restore ${1:+"$1"} \
+    --backup-dir "$BACKUP_DIR" --host "$DB_HOST" --user "$DB_USER" --dbname "$DB_NAME" \
+    --jobs "$BACKUP_JOBS"); then
   echo " Restauration terminée avec succès"
 else
   echo " Erreur lors de la restauration"
+  exit 1
 fi